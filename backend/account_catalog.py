@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+from database import execute_query
+
+# Seconds a catalog may go without checking the version
+ACCOUNT_CATALOG_MAX_AGE = float(os.getenv('ACCOUNT_CATALOG_MAX_AGE', '1'))
+
+_FIELDS = ('id', 'code', 'name', 'type', 'description', 'is_active')
+
+class AccountCatalog:
+    """
+    In-memory chart of accounts, keyed by id and by code
+
+    Loaded once per worker and reloaded only when the 'accounts' counter in
+    cache_versions moves (triggers bump it on any account change), so every
+    worker sees a change on its next version check. Readers check the version
+    at most every ACCOUNT_CATALOG_MAX_AGE seconds; a lookup that misses checks
+    again at once, so an account just created by another worker is found.
+    Posting validation and report generation check on every call
+    (ensure_fresh(max_age=0)), so they never act on a stale account.
+    Balances are not part of the catalog since postings change them constantly.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+        self._by_id = {}
+        self._by_code = {}
+        self._ordered = ()
+
+    def _read_version(self):
+        row = execute_query(
+            "SELECT version FROM cache_versions WHERE name = 'accounts'",
+            fetchone=True
+        )
+        return row['version'] if row else 0
+
+    def _load(self, version):
+        accounts = execute_query(
+            f"SELECT {', '.join(_FIELDS)} FROM accounts ORDER BY type, code",
+            fetchall=True
+        )
+        # Swap in complete structures so readers never see a partial load
+        self._by_id = {a['id']: a for a in accounts}
+        self._by_code = {a['code']: a for a in accounts}
+        self._ordered = tuple(accounts)
+        self._version = version
+
+    def ensure_fresh(self, max_age=ACCOUNT_CATALOG_MAX_AGE):
+        """Reload if the database version moved; checks at most every max_age seconds"""
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < max_age:
+            return self
+        with self._lock:
+            if self._version is not None and now - self._checked_at < max_age:
+                return self
+            version = self._read_version()
+            if version != self._version:
+                self._load(version)
+            self._checked_at = now
+        return self
+
+    def invalidate(self):
+        """Force a reload on next use (write-through after local account changes)"""
+        with self._lock:
+            self._version = None
+
+    def get(self, account_id):
+        """Account dict for an id (int or numeric string), or None"""
+        try:
+            account_id = int(account_id)
+        except (TypeError, ValueError):
+            return None
+        account = self.ensure_fresh()._by_id.get(account_id)
+        if account is None:
+            account = self.ensure_fresh(max_age=0)._by_id.get(account_id)
+        return account
+
+    def by_code(self, code):
+        account = self.ensure_fresh()._by_code.get(str(code))
+        if account is None:
+            account = self.ensure_fresh(max_age=0)._by_code.get(str(code))
+        return account
+
+    def accounts(self, types=None, active_only=False):
+        """Accounts ordered by type and code, optionally filtered"""
+        self.ensure_fresh()
+        return [
+            a for a in self._ordered
+            if (types is None or a['type'] in types) and (not active_only or a['is_active'])
+        ]
+
+_catalog = AccountCatalog()
+
+def get_account_catalog():
+    """The worker's shared account catalog"""
+    return _catalog
@@ -4,8 +4,13 @@ import sys
 from dotenv import load_dotenv
 from flask_cors import CORS
 from flask import Flask, jsonify, send_from_directory, render_template, g, request
+import database
+from database import get_pool, ITER_BATCH_SIZE
+from migrate import migrate
 import os
+import time
 import traceback
+import query_stats
 
 # Get the absolute path to the frontend directory
 frontend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'frontend'))
@@ -25,59 +30,64 @@ app.config.update(
 )
 
 def get_db():
-    """Get a database connection with request context"""
+    """Get a pooled database connection for the current request context"""
     if 'db' not in g:
         try:
-            g.db = sqlite3.connect(app.config['DATABASE'])
-            g.db.row_factory = sqlite3.Row
-            # Enable foreign key constraints
-            g.db.execute('PRAGMA foreign_keys = ON')
-        except sqlite3.Error as e:
+            g.db = get_pool(app.config['DATABASE']).acquire()
+        except Exception as e:
             app.logger.error(f"Database connection error: {str(e)}")
-            raise Exception(f"Failed to connect to database: {str(e)}")
+            raise
     return g.db
 
 def close_db(e=None):
-    """Close the database connection"""
+    """Return the request's database connection to the pool"""
     db = g.pop('db', None)
     if db is not None:
         db.close()
 
+app.teardown_appcontext(close_db)
+
 def init_db():
-    """Initialize the database with schema"""
+    """Create or upgrade the database schema by applying pending migrations"""
     try:
-        with app.app_context():
-            db = get_db()
-            schema_path = os.path.join(os.path.dirname(__file__), 'schema.sql')
-            with open(schema_path, 'r', encoding='utf-8') as f:
-                db.executescript(f.read())
-            db.commit()
-            app.logger.info("Database initialized successfully")
+        applied = migrate(app.config['DATABASE'])
+        for version, name in applied:
+            app.logger.info(f"Applied migration {version:04d}_{name}")
+        app.logger.info("Database initialized successfully")
     except Exception as e:
         app.logger.error(f"Failed to initialize database: {str(e)}")
         raise Exception(f"Failed to initialize database: {str(e)}")
 
+# Bring the schema up to date before serving (every worker may do this safely)
+if os.getenv('AUTO_MIGRATE', '1') == '1':
+    init_db()
+
 def execute_query(query, args=(), fetchone=False, fetchall=False, commit=False):
     """Execute a SQL query with options"""
     db = get_db()
     cursor = None
+    started = time.perf_counter()
     try:
         cursor = db.cursor()
         cursor.execute(query, args)
         
         if commit:
             db.commit()
+            query_stats.record(query, args, time.perf_counter() - started, cursor.rowcount, db)
             return cursor.lastrowid if 'INSERT' in query.upper() else cursor.rowcount
         
         if fetchone:
             result = cursor.fetchone()
+            query_stats.record(query, args, time.perf_counter() - started, 1 if result else 0, db)
             if result is None:
                 return None
             return dict(zip([d[0] for d in cursor.description], result))
         elif fetchall:
             results = cursor.fetchall()
+            query_stats.record(query, args, time.perf_counter() - started, len(results), db)
             return [dict(zip([d[0] for d in cursor.description], row)) for row in results]
             
+        query_stats.record(query, args, time.perf_counter() - started, max(cursor.rowcount, 0), db)
         return None
     except sqlite3.Error as e:
         app.logger.error(f"Database error: {str(e)}")
@@ -88,8 +98,12 @@ def execute_query(query, args=(), fetchone=False, fetchall=False, commit=False):
         if cursor:
             cursor.close()
 
+def iter_query(query, args=(), batch_size=ITER_BATCH_SIZE, as_dict=True):
+    """Stream query rows from the app database (see database.iter_query)"""
+    return database.iter_query(query, args, batch_size, as_dict, path=app.config['DATABASE'])
+
 # Import and register blueprints
-from routes import auth_bp, account_bp, report_bp, transaction_bp, invoices_bp
+from routes import auth_bp, account_bp, report_bp, transaction_bp, invoices_bp, admin_bp
 
 # Register blueprints with URL prefixes
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
@@ -97,6 +111,7 @@ app.register_blueprint(account_bp, url_prefix='/api/accounts')
 app.register_blueprint(transaction_bp, url_prefix='/api/transactions')
 app.register_blueprint(invoices_bp, url_prefix='/api/invoices')
 app.register_blueprint(report_bp, url_prefix='/api/reports')
+app.register_blueprint(admin_bp, url_prefix='/api/admin')
 
 @app.errorhandler(Exception)
 def handle_error(error):
@@ -0,0 +1,356 @@
+import argparse
+import csv
+import hashlib
+import html
+import io
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from account_catalog import get_account_catalog
+from posting import POSTING_TIMEOUT
+import models
+
+# Statement lines posted per commit
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '5000'))
+# Characters read at a time from OFX files, which may be a single huge line
+IMPORT_READ_CHUNK = 64 * 1024
+# Rejected lines reported back individually; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+FORMATS = ('csv', 'ofx')
+
+DEFAULT_COLUMNS = {
+    'date': 'date',
+    'description': 'description',
+    'reference': 'reference',
+    'amount': 'amount',
+}
+
+class ImportRules:
+    """
+    How statement lines map onto ledger accounts
+
+    Built from a dict (usually a JSON file) such as:
+
+        {
+            "bank_account": "1000",
+            "default_account": "9999",
+            "date_format": "%m/%d/%Y",
+            "columns": {"date": "Posted", "description": "Payee", "amount": "Amount"},
+            "rules": [
+                {"pattern": "(?i)landlord|rent", "account": "5000", "direction": "out"},
+                {"pattern": "^INV-", "field": "reference", "account": "1100"}
+            ]
+        }
+
+    Accounts are given by code or id. Money coming into the bank debits
+    bank_account and credits the matched account; money going out does the
+    reverse. Rules are tried in order against "field" (description by
+    default), optionally limited to one "direction" ("in" or "out"). Lines
+    no rule matches go to default_account, or are rejected without one.
+    CSV files may give separate "debit" (withdrawal) and "credit" (deposit)
+    columns instead of a signed "amount".
+    """
+
+    def __init__(self, config):
+        if not isinstance(config, dict):
+            raise ValueError("Import rules must be an object")
+        if not config.get('bank_account'):
+            raise ValueError("Import rules need a bank_account")
+
+        self.bank_account = self._resolve(config['bank_account'])
+        self.default_account = (
+            self._resolve(config['default_account']) if config.get('default_account') else None
+        )
+        self.date_format = config.get('date_format', '%Y-%m-%d')
+        self.columns = {**DEFAULT_COLUMNS, **config.get('columns', {})}
+
+        self.rules = []
+        for rule in config.get('rules', []):
+            try:
+                pattern = re.compile(rule['pattern'])
+            except (KeyError, TypeError, re.error) as e:
+                raise ValueError(f"Invalid rule pattern: {str(e)}")
+            direction = rule.get('direction')
+            if direction not in (None, 'in', 'out'):
+                raise ValueError("Rule direction must be 'in' or 'out'")
+            self.rules.append((
+                pattern, rule.get('field', 'description'), direction, self._resolve(rule.get('account'))
+            ))
+
+    @staticmethod
+    def _resolve(account):
+        catalog = get_account_catalog()
+        found = catalog.by_code(account) or catalog.get(account)
+        if not found:
+            raise ValueError(f"Unknown account: {account}")
+        if not found['is_active']:
+            raise ValueError(f"Cannot use inactive account: {account}")
+        return found['id']
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def counter_account(self, line, direction):
+        """Account on the other side of the bank for a line, or None"""
+        for pattern, field, rule_direction, account_id in self.rules:
+            if rule_direction in (None, direction) and pattern.search(line.get(field) or ''):
+                return account_id
+        return self.default_account
+
+def parse_csv(stream, rules):
+    """Yield statement lines from a CSV file with a header row"""
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        return
+    positions = {name.strip().lower(): i for i, name in enumerate(header)}
+    columns = {
+        field: positions.get(str(column).strip().lower())
+        for field, column in rules.columns.items()
+    }
+    if columns['date'] is None:
+        raise ValueError(f"CSV has no '{rules.columns['date']}' column")
+    if columns['amount'] is None and columns.get('debit') is None and columns.get('credit') is None:
+        raise ValueError("CSV needs an amount column, or debit/credit columns")
+
+    for number, record in enumerate(reader, start=2):
+        if not any(record):
+            continue
+        line = {'line': number}
+        for field, position in columns.items():
+            line[field] = record[position].strip() if position is not None and position < len(record) else ''
+        yield line
+
+def _ofx_tokens(stream):
+    """Yield the text after each '<' without reading the whole file"""
+    buffer = ''
+    while True:
+        chunk = stream.read(IMPORT_READ_CHUNK)
+        if not chunk:
+            break
+        parts = (buffer + chunk).split('<')
+        buffer = parts.pop()
+        yield from parts
+    if buffer:
+        yield buffer
+
+def parse_ofx(stream, rules):
+    """Yield statement lines from the STMTTRN blocks of an OFX/QFX file (SGML or XML)"""
+    transaction = None
+    number = 0
+    for token in _ofx_tokens(stream):
+        tag, _, value = token.partition('>')
+        tag = tag.strip().upper()
+        if tag == 'STMTTRN':
+            transaction = {}
+        elif tag == '/STMTTRN' and transaction is not None:
+            number += 1
+            yield {
+                'line': number,
+                # DTPOSTED is YYYYMMDD, optionally followed by a time and zone
+                'date': transaction.get('DTPOSTED', '')[:8],
+                'date_format': '%Y%m%d',
+                'amount': transaction.get('TRNAMT', ''),
+                'reference': transaction.get('FITID') or transaction.get('CHECKNUM', ''),
+                'description': ' '.join(
+                    part for part in (transaction.get('NAME'), transaction.get('MEMO')) if part
+                ),
+            }
+            transaction = None
+        elif transaction is not None and not tag.startswith('/'):
+            transaction[tag] = html.unescape(value.strip())
+
+PARSERS = {
+    'csv': parse_csv,
+    'ofx': parse_ofx,
+}
+
+def _parse_amount(value):
+    """Signed Decimal from '1,234.50', '$-12', '(12.00)' and similar"""
+    text = (value or '').strip().replace(',', '').replace('$', '')
+    negative = text.startswith('(') and text.endswith(')')
+    if negative:
+        text = text[1:-1]
+    amount = Decimal(text)
+    return -amount if negative else amount
+
+def _line_amount(line):
+    if line.get('amount'):
+        return _parse_amount(line['amount'])
+    withdrawal = _parse_amount(line['debit']) if line.get('debit') else Decimal(0)
+    deposit = _parse_amount(line['credit']) if line.get('credit') else Decimal(0)
+    return deposit - abs(withdrawal)
+
+def import_hash(bank_account, date, amount, reference, description, occurrence=1):
+    """
+    Content hash identifying a statement line for deduplication
+
+    occurrence numbers identical lines within one statement (two equal card
+    payments on a day, say), so each gets its own hash. The first keeps the
+    plain content hash, so lines imported before numbering still match.
+    """
+    key = f"{bank_account}|{date}|{amount:.2f}|{reference}|{description}"
+    if occurrence > 1:
+        key += f"|{occurrence}"
+    # 128 bits is plenty to tell lines apart and keeps the unique index small
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+def ledger_rows(lines, rules, stats):
+    """Turn statement lines into posting rows, counting and skipping bad lines"""
+    # Times each line content was seen so far, for import_hash's occurrence
+    occurrences = Counter()
+    for line in lines:
+        stats['read'] += 1
+        try:
+            date_format = line.get('date_format', rules.date_format)
+            try:
+                date = datetime.strptime(line.get('date', ''), date_format).strftime('%Y-%m-%d')
+            except ValueError:
+                raise ValueError(f"Invalid date, expected {date_format}")
+
+            try:
+                amount = _line_amount(line).quantize(Decimal('0.01'))
+            except (InvalidOperation, KeyError):
+                raise ValueError("Invalid amount")
+            if not amount:
+                raise ValueError("Amount is zero")
+
+            direction = 'in' if amount > 0 else 'out'
+            counter_account = rules.counter_account(line, direction)
+            if counter_account is None:
+                raise ValueError("No rule matches and no default_account is set")
+            if counter_account == rules.bank_account:
+                raise ValueError("Rule maps the line onto the bank account itself")
+
+            reference = line.get('reference') or ''
+            description = line.get('description') or reference or 'Bank import'
+            if direction == 'in':
+                debit_id, credit_id = rules.bank_account, counter_account
+            else:
+                debit_id, credit_id = counter_account, rules.bank_account
+
+            content = (date, amount, reference, description)
+            occurrences[content] += 1
+            yield (
+                date, reference, description, debit_id, credit_id, float(abs(amount)),
+                import_hash(rules.bank_account, date, amount, reference, description, occurrences[content])
+            )
+        except ValueError as e:
+            stats['rejected'] += 1
+            if len(stats['errors']) < MAX_REPORTED_ERRORS:
+                stats['errors'].append({'line': line.get('line'), 'error': str(e)})
+
+def _batches(rows, size):
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+def import_statement(stream, rules, created_by, fmt='csv', batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """
+    Import a bank statement from a text stream
+
+    The file is parsed, mapped and hashed lazily, and posted one batch per
+    commit, so beyond a counter per distinct line memory stays flat whatever
+    the file size. Lines whose hash is already in the ledger are skipped,
+    which makes re-importing a statement (or an overlapping one) safe;
+    identical lines within a statement are numbered, so each is posted once.
+    A failed batch stops the import; batches already committed stay, and
+    running it again picks up where it left off.
+
+    Args:
+        stream: Text file object positioned at the start of the statement
+        rules: ImportRules for the bank account
+        created_by: ID of the user running the import
+        fmt: 'csv' or 'ofx'
+        batch_size: Lines per commit
+        progress: Optional callable given the running stats after each batch
+
+    Returns:
+        Stats dict: read, imported, duplicates, rejected, errors,
+        elapsed_seconds, rows_per_second
+    """
+    if fmt not in PARSERS:
+        raise ValueError(f"Invalid format. Must be one of {list(FORMATS)}")
+
+    stats = {'read': 0, 'imported': 0, 'duplicates': 0, 'rejected': 0, 'errors': []}
+    started = time.perf_counter()
+    rows = ledger_rows(PARSERS[fmt](stream, rules), rules, stats)
+
+    def collect(future):
+        try:
+            inserted, duplicates = future.result(timeout=POSTING_TIMEOUT)
+        except Exception as e:
+            raise ValueError(f"Failed to import transactions: {str(e)}")
+        stats['imported'] += inserted
+        stats['duplicates'] += duplicates
+        if progress:
+            progress(stats, time.perf_counter() - started)
+
+    # Keep one batch in flight so parsing overlaps with the writer's commit
+    pending = None
+    for batch in _batches(rows, batch_size):
+        future = models.submit_import_batch(batch, created_by)
+        if pending:
+            collect(pending)
+        pending = future
+    if pending:
+        collect(pending)
+
+    elapsed = time.perf_counter() - started
+    stats['elapsed_seconds'] = round(elapsed, 3)
+    stats['rows_per_second'] = round(stats['read'] / elapsed) if elapsed else 0
+    return stats
+
+def detect_format(filename):
+    return 'ofx' if filename.lower().endswith(('.ofx', '.qfx')) else 'csv'
+
+def open_statement(binary_stream):
+    """Text view of an uploaded or opened binary file"""
+    return io.TextIOWrapper(binary_stream, encoding='utf-8-sig', errors='replace', newline='')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import a CSV or OFX bank statement")
+    parser.add_argument('statement', help="Path to the statement file")
+    parser.add_argument('rules', help="Path to the JSON mapping rules")
+    parser.add_argument('--user', required=True, help="Username recorded as the creator")
+    parser.add_argument('--format', choices=FORMATS, help="Defaults to the file extension")
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    try:
+        user = models.get_user_by_username(args.user)
+        if not user:
+            raise ValueError(f"Unknown user: {args.user}")
+        rules = ImportRules.from_file(args.rules)
+
+        def report(stats, elapsed):
+            print(f"  {stats['read']:>10} read  {stats['imported']:>10} imported  "
+                  f"{stats['read'] / elapsed:>9.0f} rows/s", file=sys.stderr)
+
+        with open(args.statement, 'rb') as f:
+            stats = import_statement(
+                open_statement(f), rules, user['id'],
+                fmt=args.format or detect_format(args.statement),
+                batch_size=args.batch_size, progress=report
+            )
+    except ValueError as e:
+        print(f"Import failed: {str(e)}")
+        sys.exit(1)
+
+    print(f"Read {stats['read']} lines in {stats['elapsed_seconds']:.2f}s ({stats['rows_per_second']} rows/s)")
+    print(f"  imported:   {stats['imported']}")
+    print(f"  duplicates: {stats['duplicates']}")
+    print(f"  rejected:   {stats['rejected']}")
+    for error in stats['errors']:
+        print(f"    line {error['line']}: {error['error']}")
@@ -0,0 +1,137 @@
+"""
+Benchmark the hot-path indexes added by migration 0003
+
+Builds a throwaway ledger, runs the model queries against the schema as it
+was before the indexes (version 2) and again after upgrading, and prints
+each query's plan and timing side by side.
+
+Usage: python bench_indexes.py [transactions] [db_path]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+DB_PATH = sys.argv[2] if len(sys.argv) > 2 else os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+# Capture every query plan through the slow-query log
+os.environ['DATABASE_PATH'] = DB_PATH
+os.environ['SLOW_QUERY_MS'] = '0'
+os.environ['QUERY_STATS_SAMPLE_RATE'] = '1'
+
+import logging
+import models
+import query_stats
+from database import open_connection
+from migrate import migrate
+
+logging.getLogger('slow_query').setLevel(logging.ERROR)
+
+ACCOUNTS = 200
+CLIENTS = 5000
+START = date(2020, 1, 1)
+DAYS = 5 * 365
+
+def populate(rows):
+    random.seed(42)
+    conn = open_connection(DB_PATH)
+    types = ['Asset', 'Liability', 'Equity', 'Revenue', 'Expense']
+    conn.execute("INSERT INTO users (username, email, password_hash) VALUES ('bench', 'bench@example.com', 'x')")
+    conn.executemany(
+        "INSERT INTO accounts (code, name, type) VALUES (?, ?, ?)",
+        [(str(1000 + i), f"Account {i}", types[i % 5]) for i in range(ACCOUNTS)]
+    )
+    conn.executemany(
+        "INSERT INTO clients (name) VALUES (?)",
+        [(f"Client {i}",) for i in range(CLIENTS)]
+    )
+
+    def transactions():
+        for i in range(rows):
+            debit = random.randint(1, ACCOUNTS)
+            credit = random.randint(1, ACCOUNTS - 1)
+            if credit >= debit:
+                credit += 1
+            day = (START + timedelta(days=random.randrange(DAYS))).isoformat()
+            yield (day, f"REF{i}", f"Bench posting {i}", debit, credit, round(random.uniform(1, 5000), 2), 'posted', 1)
+
+    conn.executemany(
+        """
+        INSERT INTO transactions
+        (date, reference, description, debit_account, credit_account, amount, status, created_by)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        transactions()
+    )
+
+    statuses = ['draft', 'sent', 'paid', 'overdue', 'cancelled']
+    invoices = max(rows // 10, 1)
+    conn.executemany(
+        """
+        INSERT INTO invoices (invoice_number, client_id, date, due_date, subtotal, total, status, created_by)
+        VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+        """,
+        (
+            (f"INV{i:08d}", random.randint(1, CLIENTS),
+             (START + timedelta(days=d)).isoformat(), (START + timedelta(days=d + 30)).isoformat(),
+             amount, amount, random.choice(statuses))
+            for i in range(invoices)
+            for d, amount in [(random.randrange(DAYS), round(random.uniform(50, 10000), 2))]
+        )
+    )
+    conn.executemany(
+        "INSERT INTO payments (invoice_id, date, amount, status) VALUES (?, '2024-01-01', ?, 'completed')",
+        ((random.randint(1, invoices), round(random.uniform(10, 500), 2)) for _ in range(invoices // 2))
+    )
+    conn.commit()
+    conn.close()
+
+PROBES = [
+    ('get_transactions(account)', lambda: models.get_transactions(account_id=17)),
+    ('get_transactions(dates)', lambda: models.get_transactions(start_date='2023-03-01', end_date='2023-03-31')),
+    ('get_transactions(account+dates)', lambda: models.get_transactions(account_id=17, start_date='2023-01-01', end_date='2023-12-31')),
+    ('generate_trial_balance(month)', lambda: models.generate_trial_balance('2023-03-01', '2023-03-31')),
+    ('generate_income_statement(month)', lambda: models.generate_income_statement('2023-03-01', '2023-03-31')),
+    ('get_invoices(status)', lambda: models.get_invoices(status='overdue', start_date='2023-01-01', end_date='2023-01-31')),
+    ('get_invoices(client)', lambda: models.get_invoices(client_id=42)),
+]
+
+def run_probes():
+    results = {}
+    for name, probe in PROBES:
+        query_stats.reset()
+        started = time.perf_counter()
+        probe()
+        elapsed = time.perf_counter() - started
+        plans = [step for entry in query_stats.snapshot()['slow_queries'] for step in (entry['plan'] or [])]
+        results[name] = (elapsed, plans)
+    return results
+
+def main():
+    print(f"Database: {DB_PATH}")
+    migrate(DB_PATH, target=2)
+    started = time.perf_counter()
+    populate(ROWS)
+    print(f"Loaded {ROWS:,} transactions in {time.perf_counter() - started:.1f}s\n")
+
+    before = run_probes()
+    started = time.perf_counter()
+    migrate(DB_PATH)
+    print(f"Applied index migrations in {time.perf_counter() - started:.1f}s\n")
+    after = run_probes()
+
+    print(f"{'query':<36} {'before':>10} {'after':>10} {'speedup':>9}")
+    for name, _ in PROBES:
+        b, a = before[name][0], after[name][0]
+        print(f"{name:<36} {b * 1000:>8.1f}ms {a * 1000:>8.1f}ms {b / a if a else 0:>8.1f}x")
+
+    for name, _ in PROBES:
+        print(f"\n=== {name} ===")
+        print("  before: " + "; ".join(before[name][1]))
+        print("  after:  " + "; ".join(after[name][1]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Benchmark the NumPy report engine (ledger_arrays.py) against the SQL path
+
+Builds a throwaway ledger, produces the same reports with REPORT_ENGINE=sql
+and REPORT_ENGINE=numpy, checks that every figure agrees to the cent and
+prints the timings side by side.
+
+Usage: python bench_reports.py [transactions] [db_path]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+DB_PATH = sys.argv[2] if len(sys.argv) > 2 else os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+os.environ['DATABASE_PATH'] = DB_PATH
+os.environ['QUERY_STATS_ENABLED'] = '0'
+
+import ledger_arrays
+import models
+from database import open_connection
+from migrate import migrate
+
+ACCOUNTS = 2000
+START = date(2020, 1, 1)
+DAYS = 5 * 365
+
+def populate(rows):
+    random.seed(42)
+    conn = open_connection(DB_PATH)
+    types = ['Asset', 'Liability', 'Equity', 'Revenue', 'Expense']
+    conn.execute("INSERT INTO users (username, email, password_hash) VALUES ('bench', 'bench@example.com', 'x')")
+    conn.executemany(
+        "INSERT INTO accounts (code, name, type) VALUES (?, ?, ?)",
+        [(str(10000 + i), f"Account {i}", types[i % 5]) for i in range(ACCOUNTS)]
+    )
+    conn.execute("UPDATE accounts SET name = 'Cash at bank' WHERE id = 1")
+
+    def transactions():
+        for i in range(rows):
+            debit = random.randint(1, ACCOUNTS)
+            credit = random.randint(1, ACCOUNTS - 1)
+            if credit >= debit:
+                credit += 1
+            day = (START + timedelta(days=random.randrange(DAYS))).isoformat()
+            yield (day, f"REF{i}", f"Bench posting {i}", debit, credit, round(random.uniform(1, 5000), 2), 'posted', 1)
+
+    conn.executemany(
+        """
+        INSERT INTO transactions
+        (date, reference, description, debit_account, credit_account, amount, status, created_by)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        transactions()
+    )
+    conn.commit()
+    conn.close()
+
+def monthly_trial_balances():
+    return [
+        models.generate_trial_balance(f"2023-{month:02d}-01", f"2023-{month:02d}-28")
+        for month in range(1, 13)
+    ]
+
+PROBES = [
+    ('trial balance, 4 years (ragged)', lambda: models.generate_trial_balance('2020-02-17', '2024-03-09')),
+    ('trial balance, year to date', lambda: models.generate_trial_balance('2024-01-01', '2024-10-17')),
+    ('income statement, 3 years', lambda: models.generate_income_statement('2021-01-05', '2023-12-20')),
+    ('cash flow, 1 year', lambda: models.generate_cash_flow_statement('2023-03-03', '2024-03-02')),
+    ('12 monthly trial balances', monthly_trial_balances),
+    ('general ledger opening balances', lambda: models._account_totals_before('2024-06-15')),
+]
+
+def rounded(value):
+    """Round every float to the cent so the two engines can be compared exactly"""
+    if isinstance(value, float):
+        return round(value, 2) + 0.0
+    if isinstance(value, dict):
+        return {key: rounded(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [rounded(item) for item in value]
+    return value
+
+def run_probes(engine):
+    ledger_arrays.REPORT_ENGINE = engine
+    results = {}
+    for name, probe in PROBES:
+        probe()  # warm up (loads the arrays once for the numpy engine)
+        started = time.perf_counter()
+        result = probe()
+        results[name] = (time.perf_counter() - started, rounded(result))
+    return results
+
+def main():
+    if ledger_arrays.np is None:
+        print("NumPy is not installed; pip install numpy to run this benchmark")
+        sys.exit(1)
+
+    print(f"Database: {DB_PATH}")
+    migrate(DB_PATH, target=2)
+    started = time.perf_counter()
+    populate(ROWS)
+    migrate(DB_PATH)
+    print(f"Loaded {ROWS:,} transactions in {time.perf_counter() - started:.1f}s")
+
+    sql = run_probes('sql')
+    started = time.perf_counter()
+    ledger_arrays.REPORT_ENGINE = 'numpy'
+    arrays = ledger_arrays.get_ledger_arrays().ensure_fresh()
+    print(f"Loaded {len(arrays):,} posting lines into arrays in {time.perf_counter() - started:.1f}s\n")
+    vectorized = run_probes('numpy')
+
+    print(f"{'report':<34} {'sql':>10} {'numpy':>10} {'speedup':>9}  match")
+    mismatches = 0
+    for name, _ in PROBES:
+        (s, s_result), (v, v_result) = sql[name], vectorized[name]
+        match = s_result == v_result
+        mismatches += not match
+        print(f"{name:<34} {s * 1000:>8.1f}ms {v * 1000:>8.1f}ms {s / v if v else 0:>8.1f}x  {'yes' if match else 'NO'}")
+
+    # Incremental refresh: post a few transactions and time the catch-up
+    models.create_transaction('2024-06-30', 'BENCH', 'Incremental refresh', 1, 2, 123.45, 1)
+    started = time.perf_counter()
+    arrays.ensure_fresh()
+    print(f"\nIncremental refresh after one posting: {(time.perf_counter() - started) * 1000:.1f}ms")
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
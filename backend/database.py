@@ -1,61 +1,282 @@
-
 import sqlite3
 import os
+import queue
+import threading
+import time
 from dotenv import load_dotenv
+import query_stats
 
 load_dotenv()
 
 DATABASE_PATH = os.getenv('DATABASE_PATH', 'accounting.db')
 
+# Connection pool configuration
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+HEALTH_CHECK_INTERVAL = float(os.getenv('DB_HEALTH_CHECK_INTERVAL', '30'))
+BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', '5000'))
+CACHE_SIZE_KB = int(os.getenv('DB_CACHE_SIZE_KB', '20000'))
+MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', str(256 * 1024 * 1024)))
+
+# Rows fetched per round trip by iter_query
+ITER_BATCH_SIZE = int(os.getenv('DB_ITER_BATCH_SIZE', '500'))
+
+# Applied once when a pooled connection is opened, never per request
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -CACHE_SIZE_KB),  # negative value means KiB rather than pages
+    ('mmap_size', MMAP_SIZE),
+    ('foreign_keys', 'ON'),
+    ('busy_timeout', BUSY_TIMEOUT_MS),
+)
+
+def open_connection(path=None, readonly=False):
+    """Open a new, unpooled connection with the standard pragmas applied"""
+    conn = sqlite3.connect(
+        path or DATABASE_PATH,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False
+    )
+    conn.row_factory = sqlite3.Row
+    for name, value in PRAGMAS:
+        conn.execute(f"PRAGMA {name} = {value}")
+    if readonly:
+        # Any write on this connection fails with "attempt to write a readonly database"
+        conn.execute("PRAGMA query_only = ON")
+    return conn
+
+class PooledConnection:
+    """Handle to a pooled connection; close() returns it to the pool instead of closing it"""
+
+    __slots__ = ('_pool', '_conn', 'nested')
+
+    def __init__(self, pool, conn, nested=False):
+        self._pool = pool
+        self._conn = conn
+        # True when an outer handle on this thread already holds the connection
+        self.nested = nested
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return getattr(self._conn, name)
+
+    @property
+    def closed(self):
+        return self._conn is None
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections for one database file
+
+    A thread that already holds a connection gets the same one back from
+    acquire(), so nested helpers (e.g. execute_query inside an explicit
+    BEGIN) share the caller's connection and transaction. The connection
+    goes back to the pool once every handle on that thread is closed.
+    """
+
+    def __init__(self, path, size=POOL_SIZE, timeout=POOL_TIMEOUT, readonly=False):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.readonly = readonly
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._local = threading.local()
+
+    def _check_pid(self):
+        # Connections must not cross a fork (gunicorn --preload); start afresh in the child
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _connect(self):
+        return open_connection(self.path, readonly=self.readonly)
+
+    def _is_healthy(self, conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _checkout(self):
+        while True:
+            try:
+                conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - last_used < HEALTH_CHECK_INTERVAL or self._is_healthy(conn):
+                return conn
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    def acquire(self):
+        """Check out a connection for the current thread"""
+        self._check_pid()
+        local = self._local
+        if getattr(local, 'depth', 0):
+            local.depth += 1
+            return PooledConnection(self, local.conn, nested=True)
+
+        if not self._slots.acquire(timeout=self.timeout):
+            raise Exception("Failed to connect to database: connection pool exhausted")
+        try:
+            conn = self._checkout()
+        except sqlite3.Error as e:
+            self._slots.release()
+            raise Exception(f"Failed to connect to database: {str(e)}")
+
+        local.conn = conn
+        local.depth = 1
+        return PooledConnection(self, conn)
+
+    def release(self, conn):
+        """Return a connection checked out by acquire() on this thread"""
+        local = self._local
+        local.depth -= 1
+        if local.depth:
+            return
+        local.conn = None
+        try:
+            # Never hand out a connection with a half-finished transaction
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put((conn, time.monotonic()))
+        except sqlite3.Error:
+            conn.close()
+        finally:
+            self._slots.release()
+
+    def close_all(self):
+        """Close every idle connection (connections in use are left alone)"""
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
+
+_pools = {}
+_pools_lock = threading.Lock()
+_scope = threading.local()
+
+def get_pool(path=None, readonly=False):
+    """Get the connection pool for a database file (DATABASE_PATH by default)"""
+    key = (os.path.abspath(path or DATABASE_PATH), readonly)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(key[0], readonly=readonly)
+    return pool
+
+def use_read_only_connections(enabled=True):
+    """
+    Route this thread's execute_query/iter_query calls to the read-only pool
+
+    Meant for worker threads that only read (e.g. the report bundle pool),
+    so they never hold or take connections the writers need.
+    """
+    _scope.readonly = enabled
+
 def init_db():
-    """Initialize the database with schema"""
+    """Create or upgrade the database schema by applying pending migrations"""
+    from migrate import migrate
     try:
-        if not os.path.exists(DATABASE_PATH):
-            conn = get_db_connection()
-            with open('schema.sql') as f:
-                conn.executescript(f.read())
-            conn.commit()
-            conn.close()
+        return migrate(DATABASE_PATH)
     except Exception as e:
         raise Exception(f"Failed to initialize database: {str(e)}")
 
 def get_db_connection():
-    """Get a database connection"""
-    try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
-        return conn
-    except sqlite3.Error as e:
-        raise Exception(f"Failed to connect to database: {str(e)}")
+    """Get a pooled database connection; call close() to return it to the pool"""
+    return get_pool(readonly=getattr(_scope, 'readonly', False)).acquire()
 
 def execute_query(query, args=(), fetchone=False, fetchall=False, commit=False):
-    """Execute a SQL query with options"""
+    """
+    Execute a SQL query with options
+
+    Inside a transaction opened by an outer handle on the same connection,
+    commit and rollback are left to that outer owner: commit=True does not
+    commit and a failed statement does not roll back the caller's work.
+    """
     conn = get_db_connection()
     cur = conn.cursor()
+    started = time.perf_counter()
+    owns_transaction = not (conn.nested and conn.in_transaction)
     try:
         cur.execute(query, args)
         if commit:
-            conn.commit()
-            last_id = cur.lastrowid
-            cur.close()
-            conn.close()
-            return last_id
+            if owns_transaction:
+                conn.commit()
+            query_stats.record(query, args, time.perf_counter() - started, cur.rowcount, conn)
+            return cur.lastrowid
         if fetchone:
             result = cur.fetchone()
-            cur.close()
-            conn.close()
+            query_stats.record(query, args, time.perf_counter() - started, 1 if result else 0, conn)
             return dict(result) if result else None
         if fetchall:
             result = cur.fetchall()
-            cur.close()
-            conn.close()
+            query_stats.record(query, args, time.perf_counter() - started, len(result), conn)
             return [dict(row) for row in result]
+        query_stats.record(query, args, time.perf_counter() - started, max(cur.rowcount, 0), conn)
+        return None
+    except sqlite3.Error as e:
+        if owns_transaction:
+            conn.rollback()
+        raise Exception(f"Database query failed: {str(e)}")
+    finally:
         cur.close()
         conn.close()
-        return None
+
+def iter_query(query, args=(), batch_size=ITER_BATCH_SIZE, as_dict=True, path=None):
+    """
+    Stream the rows of a SELECT instead of materializing them
+
+    Rows are pulled from SQLite batch_size at a time with fetchmany, so at
+    most one batch is held in memory. With as_dict=False plain tuples are
+    yielded (in column order); otherwise each row becomes a dict built from
+    a column-name tuple computed once per query. The pooled connection is
+    held until the generator is exhausted or closed. path reads another
+    database file than DATABASE_PATH.
+    """
+    conn = get_pool(path).acquire() if path else get_db_connection()
+    cur = conn.cursor()
+    cur.row_factory = None
+    # Time spent in SQLite only, not in the consumer between batches
+    elapsed = 0.0
+    count = 0
+    try:
+        started = time.perf_counter()
+        cur.execute(query, args)
+        columns = tuple(d[0] for d in cur.description)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            elapsed += time.perf_counter() - started
+            if not rows:
+                break
+            count += len(rows)
+            if as_dict:
+                for row in rows:
+                    yield dict(zip(columns, row))
+            else:
+                yield from rows
+            started = time.perf_counter()
+        query_stats.record(query, args, elapsed, count, conn)
     except sqlite3.Error as e:
-        conn.rollback()
         raise Exception(f"Database query failed: {str(e)}")
     finally:
-        if not conn.closed:
-            conn.close()
\ No newline at end of file
+        cur.close()
+        conn.close()
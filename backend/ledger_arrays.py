@@ -0,0 +1,243 @@
+import logging
+import os
+import threading
+from database import execute_query, iter_query
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency, only needed for REPORT_ENGINE=numpy
+    np = None
+
+# 'numpy' computes report totals from in-memory arrays instead of SQL
+REPORT_ENGINE = os.getenv('REPORT_ENGINE', 'sql')
+
+if REPORT_ENGINE == 'numpy' and np is None:
+    logging.getLogger(__name__).warning("REPORT_ENGINE=numpy but NumPy is not installed; using SQL")
+
+def _day_number(date):
+    return int(np.datetime64(date, 'D').astype(np.int64))
+
+class LedgerArrays:
+    """
+    Columnar copy of every posting line, for vectorized report totals
+
+    Each debit or credit line becomes one row across three arrays: account
+    id (int32), day number since 1970-01-01 (int32) and signed amount in
+    cents (int64, debits positive). Rows stay sorted by day, so a date range
+    is two searchsorted calls and its per-account totals are two bincounts
+    over a slice.
+
+    Refreshes only happen when the 'ledger' version has moved. If new
+    transactions arrived and the ones already loaded still have the count
+    and amount total recorded at load time, only the new ids are read;
+    otherwise (an edit or delete, or a change to invoices or payments,
+    which move the same version) the ledger is read again in full. Totals
+    are handed out in whole cents, like the SQL report path.
+    """
+
+    # (transactions, their amounts, entry lines, their amounts) with id <= _max_id
+    _EMPTY_FINGERPRINT = (0, 0.0, 0, 0.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._reset()
+
+    def _reset(self):
+        self._max_id = 0
+        self._fingerprint = self._EMPTY_FINGERPRINT
+        # (accounts, days, amounts), replaced as a whole so readers never mix generations
+        self._columns = (
+            np.zeros(0, dtype=np.int32),
+            np.zeros(0, dtype=np.int32),
+            np.zeros(0, dtype=np.int64),
+        )
+
+    def __len__(self):
+        return len(self._columns[1])
+
+    def _read_version(self):
+        row = execute_query("SELECT version FROM cache_versions WHERE name = 'ledger'", fetchone=True)
+        return row['version'] if row else 0
+
+    def _read_fingerprint(self, through_id):
+        """Row counts and amount totals of transactions and entry lines with id <= through_id"""
+        row = execute_query(
+            """
+            SELECT
+                (SELECT COUNT(*) FROM transactions WHERE id <= ?) AS transactions,
+                (SELECT TOTAL(amount) FROM transactions WHERE id <= ?) AS amounts,
+                (SELECT COUNT(*) FROM transaction_entries WHERE transaction_id <= ?) AS entries,
+                (SELECT TOTAL(debit + credit) FROM transaction_entries WHERE transaction_id <= ?) AS entry_amounts
+            """,
+            (through_id,) * 4,
+            fetchone=True
+        )
+        return (row['transactions'], row['amounts'], row['entries'], row['entry_amounts'])
+
+    def _read_lines(self, after_id, through_id):
+        """Posting lines of transactions with after_id < id <= through_id, as arrays"""
+        columns = ([], [], [])  # account, date, signed amount
+        queries = [
+            ("""
+                SELECT debit_account, date, amount FROM transactions
+                WHERE id > ? AND id <= ? AND debit_account IS NOT NULL
+            """, 1),
+            ("""
+                SELECT credit_account, date, amount FROM transactions
+                WHERE id > ? AND id <= ? AND credit_account IS NOT NULL
+            """, -1),
+        ]
+        for query, sign in queries:
+            for account_id, date, amount in iter_query(query, (after_id, through_id), as_dict=False):
+                columns[0].append(account_id)
+                columns[1].append(date)
+                columns[2].append(sign * amount)
+
+        # Entry lines may carry both sides; each non-zero side is its own row
+        for account_id, date, debit, credit in iter_query(
+            """
+            SELECT e.account_id, t.date, e.debit, e.credit
+            FROM transaction_entries e
+            JOIN transactions t ON t.id = e.transaction_id
+            WHERE e.transaction_id > ? AND e.transaction_id <= ?
+            """,
+            (after_id, through_id),
+            as_dict=False
+        ):
+            for amount in (debit, -credit):
+                if amount:
+                    columns[0].append(account_id)
+                    columns[1].append(date)
+                    columns[2].append(amount)
+
+        accounts, dates, amounts = columns
+        return (
+            np.array(accounts, dtype=np.int32),
+            np.array(dates, dtype='datetime64[D]').astype(np.int32),
+            np.rint(np.array(amounts, dtype=np.float64) * 100).astype(np.int64),
+        )
+
+    def _append(self, accounts, days, amounts):
+        if not len(days):
+            return
+        order = np.argsort(days, kind='stable')
+        accounts, days, amounts = accounts[order], days[order], amounts[order]
+        # New lines usually land at the end; backdated ones are inserted in place
+        current_accounts, current_days, current_amounts = self._columns
+        positions = np.searchsorted(current_days, days, side='right')
+        self._columns = (
+            np.insert(current_accounts, positions, accounts),
+            np.insert(current_days, positions, days),
+            np.insert(current_amounts, positions, amounts),
+        )
+
+    def reload(self):
+        """Drop everything loaded and read the ledger again on next use"""
+        with self._lock:
+            self._version = None
+            self._reset()
+
+    def ensure_fresh(self):
+        """Catch up with the ledger if it moved: new transactions only, or everything"""
+        version = self._read_version()
+        if version == self._version:
+            return self
+        with self._lock:
+            if version == self._version:
+                return self
+            latest = execute_query(
+                "SELECT COALESCE(MAX(id), 0) AS max_id FROM transactions",
+                fetchone=True
+            )['max_id']
+            # Fingerprints are read before the lines: a write in between makes
+            # the next refresh reload rather than go unnoticed
+            fingerprint = self._read_fingerprint(latest)
+            if latest > self._max_id and self._read_fingerprint(self._max_id) == self._fingerprint:
+                self._append(*self._read_lines(self._max_id, latest))
+            else:
+                self._reset()
+                self._append(*self._read_lines(0, latest))
+            self._max_id = latest
+            self._fingerprint = fingerprint
+            self._version = version
+        return self
+
+    def _totals(self, first_day, last_day):
+        """(debits, credits) per account id for lines with first_day <= day <= last_day"""
+        accounts, days, amounts = self._columns
+        start = 0 if first_day is None else np.searchsorted(days, first_day, side='left')
+        end = len(days) if last_day is None else np.searchsorted(days, last_day, side='right')
+        accounts = accounts[start:end]
+        amounts = amounts[start:end]
+        if not len(accounts):
+            return {}
+        size = int(accounts.max()) + 1
+        # float64 weights hold integer cents exactly up to 2**53
+        debits = np.bincount(accounts, weights=np.where(amounts > 0, amounts, 0), minlength=size)
+        credits = np.bincount(accounts, weights=np.where(amounts < 0, -amounts, 0), minlength=size)
+        present = np.flatnonzero(np.bincount(accounts, minlength=size))
+        # Plain Python numbers from here on, for speed and for the JSON encoder
+        return dict(zip(
+            present.tolist(),
+            zip((debits[present] / 100).tolist(), (credits[present] / 100).tolist())
+        ))
+
+    def totals_by_period(self, periods):
+        """
+        (debits, credits) per account id for each (start_date, end_date), in one pass
+
+        Periods must be in date order and must not overlap. Lines in the
+        covered span are bucketed by searchsorted on the period starts and
+        summed with one bincount over (period, account) pairs.
+        """
+        self.ensure_fresh()
+        starts = np.array([_day_number(start) for start, _ in periods], dtype=np.int32)
+        ends = np.array([_day_number(end) for _, end in periods], dtype=np.int32)
+        accounts, days, amounts = self._columns
+        first = np.searchsorted(days, starts[0], side='left')
+        last = np.searchsorted(days, ends[-1], side='right')
+        accounts, days, amounts = accounts[first:last], days[first:last], amounts[first:last]
+        buckets = np.searchsorted(starts, days, side='right') - 1
+        inside = days <= ends[buckets]  # drop lines falling in gaps between periods
+        accounts, buckets, amounts = accounts[inside], buckets[inside], amounts[inside]
+
+        results = [{} for _ in periods]
+        if not len(accounts):
+            return results
+        size = int(accounts.max()) + 1
+        keys = buckets.astype(np.int64) * size + accounts
+        length = len(periods) * size
+        debits = np.bincount(keys, weights=np.where(amounts > 0, amounts, 0), minlength=length)
+        credits = np.bincount(keys, weights=np.where(amounts < 0, -amounts, 0), minlength=length)
+        present = np.flatnonzero(np.bincount(keys, minlength=length))
+        for bucket, account_id, debit, credit in zip(
+            (present // size).tolist(), (present % size).tolist(),
+            (debits[present] / 100).tolist(), (credits[present] / 100).tolist()
+        ):
+            results[bucket][account_id] = (debit, credit)
+        return results
+
+    def period_totals(self, start_date, end_date):
+        """(debits, credits) per account id for postings dated within the range"""
+        self.ensure_fresh()
+        return self._totals(_day_number(start_date), _day_number(end_date))
+
+    def totals_before(self, date):
+        """(debits, credits) per account id for postings dated before date"""
+        self.ensure_fresh()
+        return self._totals(None, _day_number(date) - 1)
+
+_arrays = None
+_arrays_lock = threading.Lock()
+
+def get_ledger_arrays():
+    """The worker's ledger arrays when REPORT_ENGINE=numpy, otherwise None"""
+    global _arrays
+    if REPORT_ENGINE != 'numpy' or np is None:
+        return None
+    if _arrays is None:
+        with _arrays_lock:
+            if _arrays is None:
+                _arrays = LedgerArrays()
+    return _arrays
@@ -0,0 +1,61 @@
+import sys
+import time
+import models
+import recurring_invoices
+
+def rebuild_activity():
+    started = time.perf_counter()
+    count = models.rebuild_account_activity()
+    print(f"Rebuilt activity for {count} accounts in {time.perf_counter() - started:.2f}s")
+
+def rebuild_period_totals():
+    started = time.perf_counter()
+    count = models.rebuild_period_totals()
+    print(f"Rebuilt {count} monthly account totals in {time.perf_counter() - started:.2f}s")
+
+def check_invoice_balances():
+    result = models.check_invoice_balances()
+    for invoice in result['invoices']:
+        print(
+            f"Invoice {invoice['id']} ({invoice['invoice_number']}): amount_paid {invoice['amount_paid']} "
+            f"should be {invoice['actual_paid']}, balance_due {invoice['balance_due']} "
+            f"should be {invoice['total'] - invoice['actual_paid']}, "
+            f"last_payment_date {invoice['last_payment_date']} should be {invoice['actual_last_payment_date']}"
+        )
+    print(f"{result['mismatched']} invoices with stale payment totals")
+    sys.exit(1 if result['mismatched'] else 0)
+
+def rebuild_invoice_balances():
+    started = time.perf_counter()
+    count = models.rebuild_invoice_balances()
+    print(f"Rebuilt payment totals for {count} invoices in {time.perf_counter() - started:.2f}s")
+
+def mark_overdue(as_of_date=None):
+    started = time.perf_counter()
+    count = models.mark_overdue_invoices(as_of_date)
+    print(f"Marked {count} invoices overdue in {time.perf_counter() - started:.2f}s")
+
+def generate_recurring_invoices(run_date=None):
+    result = recurring_invoices.generate_recurring_invoices(run_date)
+    print(
+        f"{result['created']} invoices from {result['templates']} templates for {result['run_date']} "
+        f"({result['skipped']} already made) in {result['seconds']:.2f}s with {result['workers']} workers, "
+        f"{result['invoices_per_second']} invoices/s"
+    )
+
+COMMANDS = {
+    'rebuild-activity': (rebuild_activity, "Recompute account_activity from transactions"),
+    'rebuild-period-totals': (rebuild_period_totals, "Recompute account_period_totals from transactions"),
+    'check-invoice-balances': (check_invoice_balances, "Compare invoice payment totals with payments"),
+    'rebuild-invoice-balances': (rebuild_invoice_balances, "Recompute invoice amount_paid, balance_due, last_payment_date"),
+    'mark-overdue': (mark_overdue, "Move sent invoices past their due date to overdue, as of [YYYY-MM-DD]"),
+    'generate-recurring-invoices': (generate_recurring_invoices, "Invoice recurring templates due by [YYYY-MM-DD] (today)"),
+}
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in COMMANDS:
+        print("Usage: python maintenance.py <command>\n")
+        for name, (_, help_text) in COMMANDS.items():
+            print(f"  {name:<24} {help_text}")
+        sys.exit(1)
+    COMMANDS[sys.argv[1]][0](*sys.argv[2:])
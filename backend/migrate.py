@@ -0,0 +1,112 @@
+import os
+import re
+import sqlite3
+import sys
+from database import DATABASE_PATH, open_connection
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+_FILENAME_RE = re.compile(r'^(\d+)_(\w+)\.sql$')
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """List (version, name, path) for every NNNN_name.sql file, in version order"""
+    migrations = []
+    for filename in os.listdir(directory):
+        match = _FILENAME_RE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    migrations.sort()
+    return migrations
+
+def split_statements(script):
+    """Split a SQL script into complete statements (trigger bodies stay whole)"""
+    statements = []
+    buffer = ''
+    for line in script.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            statements.append(buffer.strip())
+            buffer = ''
+    leftover = [line for line in buffer.splitlines() if line.strip() and not line.strip().startswith('--')]
+    if leftover:
+        raise ValueError(f"Incomplete SQL statement at end of script: {' '.join(leftover)[:80]}")
+    return statements
+
+def get_version(conn):
+    """Schema version recorded in PRAGMA user_version"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(path=None, target=None):
+    """
+    Apply pending migrations up to target (default: latest)
+
+    Each migration runs in its own BEGIN IMMEDIATE transaction together
+    with the user_version bump, so a failed migration leaves the database
+    at the previous version. The version is re-read after taking the write
+    lock, which makes it safe for several workers to call this at startup.
+
+    Returns the list of (version, name) applied.
+    """
+    conn = open_connection(path or DATABASE_PATH)
+    conn.isolation_level = None  # explicit transaction control below
+    applied = []
+    try:
+        # Table rebuilds drop and rename tables that others reference
+        conn.execute("PRAGMA foreign_keys = OFF")
+        for version, name, filename in load_migrations():
+            if target is not None and version > target:
+                break
+            if version <= get_version(conn):
+                continue
+
+            with open(filename, encoding='utf-8') as f:
+                statements = split_statements(f.read())
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if version <= get_version(conn):
+                    conn.execute("ROLLBACK")
+                    continue
+                for statement in statements:
+                    conn.execute(statement)
+                violations = conn.execute("PRAGMA foreign_key_check").fetchall()
+                if violations:
+                    raise ValueError(f"{len(violations)} foreign key violations, first in table {violations[0][0]}")
+                conn.execute(f"PRAGMA user_version = {version}")
+                conn.execute("COMMIT")
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise Exception(f"Migration {version:04d}_{name} failed: {str(e)}")
+            applied.append((version, name))
+        return applied
+    finally:
+        conn.close()
+
+def status(path=None):
+    """Print the current schema version and any pending migrations"""
+    conn = open_connection(path or DATABASE_PATH)
+    try:
+        current = get_version(conn)
+    finally:
+        conn.close()
+    print(f"Database: {os.path.abspath(path or DATABASE_PATH)}")
+    print(f"Schema version: {current}")
+    for version, name, _ in load_migrations():
+        state = 'applied' if version <= current else 'pending'
+        print(f"  {version:04d}_{name}: {state}")
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'upgrade'
+    if command == 'status':
+        status()
+    elif command == 'upgrade':
+        target = int(sys.argv[2]) if len(sys.argv) > 2 else None
+        applied = migrate(target=target)
+        for version, name in applied:
+            print(f"Applied {version:04d}_{name}")
+        if not applied:
+            print("Database is up to date")
+    else:
+        print("Usage: python migrate.py [status | upgrade [version]]")
+        sys.exit(1)
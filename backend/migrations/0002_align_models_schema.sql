@@ -0,0 +1,157 @@
+-- Bring the ledger and invoicing tables in line with what models.py reads and writes
+
+-- Databases made by the old reset_db.py already had an accounts table
+-- without code, description, is_active or created_at, so 0001 left it as
+-- it was. Rebuild it in the baseline layout. Columns the old table may lack
+-- are read through a subquery: when accounts has no such column the name
+-- resolves to the NULL of the same name in `missing` instead, and the row
+-- gets the default (the code falls back to the account id).
+CREATE TABLE accounts_new (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    code TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    type TEXT CHECK(type IN ('Asset', 'Liability', 'Equity', 'Revenue', 'Expense')) NOT NULL,
+    balance REAL DEFAULT 0.00,
+    description TEXT,
+    is_active BOOLEAN DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    previous_balance REAL DEFAULT 0.00,
+    UNIQUE(code, name)
+);
+
+INSERT INTO accounts_new
+    (id, code, name, type, balance, description, is_active, created_at, updated_at, previous_balance)
+SELECT a.id,
+       COALESCE((SELECT code FROM accounts WHERE id = a.id), CAST(a.id AS TEXT)),
+       a.name, a.type, a.balance,
+       (SELECT description FROM accounts WHERE id = a.id),
+       COALESCE((SELECT is_active FROM accounts WHERE id = a.id), 1),
+       COALESCE((SELECT created_at FROM accounts WHERE id = a.id), a.updated_at, CURRENT_TIMESTAMP),
+       a.updated_at, a.previous_balance
+FROM accounts a, (SELECT NULL AS code, NULL AS description, NULL AS is_active, NULL AS created_at) AS missing;
+
+-- Only the UNIQUE constraints index accounts at this version; they come with the new table
+DROP TABLE accounts;
+ALTER TABLE accounts_new RENAME TO accounts;
+
+-- Transactions gain reference/audit columns and the draft/posted/void lifecycle.
+-- debit_account/credit_account may both be NULL for compound (double-entry)
+-- transactions whose lines live in transaction_entries.
+CREATE TABLE transactions_new (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date DATE NOT NULL,
+    reference TEXT,
+    description TEXT,
+    debit_account INTEGER,
+    credit_account INTEGER,
+    amount REAL NOT NULL DEFAULT 0,
+    status TEXT CHECK(status IN ('draft', 'posted', 'void')) DEFAULT 'posted',
+    created_by INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CHECK ((debit_account IS NULL) = (credit_account IS NULL)),
+    FOREIGN KEY (debit_account) REFERENCES accounts(id) ON DELETE CASCADE,
+    FOREIGN KEY (credit_account) REFERENCES accounts(id) ON DELETE CASCADE,
+    FOREIGN KEY (created_by) REFERENCES users(id)
+);
+
+INSERT INTO transactions_new (id, date, description, debit_account, credit_account, amount, status)
+SELECT id, date, description, debit_account, credit_account, amount,
+       CASE status WHEN 'completed' THEN 'posted' ELSE 'draft' END
+FROM transactions;
+
+DROP TABLE transactions;
+ALTER TABLE transactions_new RENAME TO transactions;
+
+-- Lines of compound transactions
+CREATE TABLE IF NOT EXISTS transaction_entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    transaction_id INTEGER NOT NULL,
+    account_id INTEGER NOT NULL,
+    debit REAL DEFAULT 0,
+    credit REAL DEFAULT 0,
+    FOREIGN KEY (transaction_id) REFERENCES transactions(id) ON DELETE CASCADE,
+    FOREIGN KEY (account_id) REFERENCES accounts(id)
+);
+
+-- Clients table
+CREATE TABLE IF NOT EXISTS clients (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    email TEXT,
+    phone TEXT,
+    address TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Legacy invoices stored the client as free text; turn each name into a client row
+INSERT INTO clients (name)
+SELECT DISTINCT client FROM invoices
+WHERE client NOT IN (SELECT name FROM clients);
+
+CREATE TABLE invoices_new (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    invoice_number TEXT NOT NULL UNIQUE,
+    client_id INTEGER,
+    date DATE NOT NULL,
+    due_date DATE,
+    subtotal REAL NOT NULL DEFAULT 0,
+    tax_rate REAL DEFAULT 0,
+    tax_amount REAL DEFAULT 0,
+    discount REAL DEFAULT 0,
+    total REAL NOT NULL DEFAULT 0,
+    notes TEXT,
+    status TEXT CHECK(status IN ('draft', 'sent', 'paid', 'overdue', 'cancelled')) NOT NULL DEFAULT 'draft',
+    created_by INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (client_id) REFERENCES clients(id),
+    FOREIGN KEY (created_by) REFERENCES users(id)
+);
+
+INSERT INTO invoices_new (id, invoice_number, client_id, date, due_date, subtotal, total, status)
+SELECT i.id, i.invoice_number,
+       (SELECT MIN(c.id) FROM clients c WHERE c.name = i.client),
+       i.date, i.date, i.amount, i.amount,
+       CASE i.status WHEN 'pending' THEN 'sent' ELSE i.status END
+FROM invoices i;
+
+DROP TABLE invoices;
+ALTER TABLE invoices_new RENAME TO invoices;
+
+-- Invoice line items
+CREATE TABLE IF NOT EXISTS invoice_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    invoice_id INTEGER NOT NULL,
+    description TEXT NOT NULL,
+    quantity REAL NOT NULL DEFAULT 1,
+    unit_price REAL NOT NULL DEFAULT 0,
+    taxable BOOLEAN DEFAULT 0,
+    amount REAL NOT NULL DEFAULT 0,
+    FOREIGN KEY (invoice_id) REFERENCES invoices(id) ON DELETE CASCADE
+);
+
+-- Invoice status changes
+CREATE TABLE IF NOT EXISTS invoice_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    invoice_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    changed_by INTEGER,
+    notes TEXT,
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (invoice_id) REFERENCES invoices(id) ON DELETE CASCADE,
+    FOREIGN KEY (changed_by) REFERENCES users(id)
+);
+
+-- Payments received against invoices
+CREATE TABLE IF NOT EXISTS payments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    invoice_id INTEGER NOT NULL,
+    date DATE NOT NULL,
+    amount REAL NOT NULL,
+    method TEXT,
+    reference TEXT,
+    status TEXT CHECK(status IN ('pending', 'completed', 'failed', 'refunded')) DEFAULT 'completed',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (invoice_id) REFERENCES invoices(id) ON DELETE CASCADE
+);
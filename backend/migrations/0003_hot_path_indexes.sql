@@ -0,0 +1,38 @@
+-- Indexes for the filters and joins used by models.py
+
+-- get_transactions account filter (debit_account = ? OR credit_account = ?)
+-- plus the per-account report joins; amount is included so the SUMs are
+-- answered from the index without touching the table
+CREATE INDEX IF NOT EXISTS idx_transactions_debit_date
+    ON transactions (debit_account, date, amount);
+CREATE INDEX IF NOT EXISTS idx_transactions_credit_date
+    ON transactions (credit_account, date, amount);
+
+-- Date-range filters and the date DESC, id DESC listing order
+CREATE INDEX IF NOT EXISTS idx_transactions_date
+    ON transactions (date, id);
+
+-- Compound transaction lines by transaction and by account
+CREATE INDEX IF NOT EXISTS idx_transaction_entries_transaction
+    ON transaction_entries (transaction_id);
+CREATE INDEX IF NOT EXISTS idx_transaction_entries_account
+    ON transaction_entries (account_id, transaction_id);
+
+-- get_invoices filters, each ordered the way the listing is
+CREATE INDEX IF NOT EXISTS idx_invoices_status_date
+    ON invoices (status, date, invoice_number);
+CREATE INDEX IF NOT EXISTS idx_invoices_client_date
+    ON invoices (client_id, date, invoice_number);
+CREATE INDEX IF NOT EXISTS idx_invoices_date
+    ON invoices (date, invoice_number);
+
+-- Covering index for the correlated amount_paid subquery
+CREATE INDEX IF NOT EXISTS idx_payments_invoice_status
+    ON payments (invoice_id, status, amount);
+
+CREATE INDEX IF NOT EXISTS idx_invoice_items_invoice
+    ON invoice_items (invoice_id);
+CREATE INDEX IF NOT EXISTS idx_invoice_history_invoice
+    ON invoice_history (invoice_id);
+
+ANALYZE;
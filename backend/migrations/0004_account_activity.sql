@@ -0,0 +1,23 @@
+-- Per-account activity rollup maintained at posting time (see models._record_account_activity)
+CREATE TABLE IF NOT EXISTS account_activity (
+    account_id INTEGER PRIMARY KEY,
+    transaction_count INTEGER NOT NULL DEFAULT 0,
+    total_debits REAL NOT NULL DEFAULT 0,
+    total_credits REAL NOT NULL DEFAULT 0,
+    last_activity_date DATE,
+    FOREIGN KEY (account_id) REFERENCES accounts(id) ON DELETE CASCADE
+);
+
+INSERT INTO account_activity (account_id, transaction_count, total_debits, total_credits, last_activity_date)
+SELECT account_id, COUNT(DISTINCT transaction_id), SUM(debit), SUM(credit), MAX(date)
+FROM (
+    SELECT debit_account AS account_id, id AS transaction_id, amount AS debit, 0 AS credit, date
+    FROM transactions WHERE debit_account IS NOT NULL
+    UNION ALL
+    SELECT credit_account, id, 0, amount, date
+    FROM transactions WHERE credit_account IS NOT NULL
+    UNION ALL
+    SELECT e.account_id, e.transaction_id, e.debit, e.credit, t.date
+    FROM transaction_entries e JOIN transactions t ON t.id = e.transaction_id
+)
+GROUP BY account_id;
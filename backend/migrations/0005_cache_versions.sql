@@ -0,0 +1,25 @@
+-- Version counters that let every worker notice when a cached dataset changed
+CREATE TABLE IF NOT EXISTS cache_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO cache_versions (name, version) VALUES ('accounts', 1);
+
+-- Any change to the chart of accounts bumps its version. Balance updates
+-- made by postings do not touch these columns and leave it alone.
+CREATE TRIGGER IF NOT EXISTS accounts_version_insert AFTER INSERT ON accounts
+BEGIN
+    UPDATE cache_versions SET version = version + 1 WHERE name = 'accounts';
+END;
+
+CREATE TRIGGER IF NOT EXISTS accounts_version_update
+AFTER UPDATE OF code, name, type, description, is_active ON accounts
+BEGIN
+    UPDATE cache_versions SET version = version + 1 WHERE name = 'accounts';
+END;
+
+CREATE TRIGGER IF NOT EXISTS accounts_version_delete AFTER DELETE ON accounts
+BEGIN
+    UPDATE cache_versions SET version = version + 1 WHERE name = 'accounts';
+END;
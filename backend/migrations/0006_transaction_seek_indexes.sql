@@ -0,0 +1,6 @@
+-- Keyset pagination seeks on (date, id) within an account. The 0003 indexes
+-- order by amount ahead of the rowid, so they cannot serve that ordering.
+CREATE INDEX IF NOT EXISTS idx_transactions_debit_seek
+    ON transactions (debit_account, date, id);
+CREATE INDEX IF NOT EXISTS idx_transactions_credit_seek
+    ON transactions (credit_account, date, id);
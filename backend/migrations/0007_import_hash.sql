@@ -0,0 +1,6 @@
+-- Content hash of imported bank statement lines (see bank_import.py), so a
+-- re-imported statement skips the lines that are already in the ledger
+ALTER TABLE transactions ADD COLUMN import_hash TEXT;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_import_hash
+    ON transactions (import_hash) WHERE import_hash IS NOT NULL;
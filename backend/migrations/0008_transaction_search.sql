@@ -0,0 +1,37 @@
+-- Full-text index over transaction descriptions and references. It is an
+-- external-content table: the text lives only in transactions, and the
+-- triggers below keep the index in step with every write.
+CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+    description,
+    reference,
+    content = 'transactions',
+    content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+
+-- Matches in the description outrank matches in the reference
+INSERT INTO transactions_fts (transactions_fts, rank) VALUES ('rank', 'bm25(10.0, 5.0)');
+
+INSERT INTO transactions_fts (transactions_fts) VALUES ('rebuild');
+
+CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions
+BEGIN
+    INSERT INTO transactions_fts (rowid, description, reference)
+    VALUES (new.id, new.description, new.reference);
+END;
+
+CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions
+BEGIN
+    INSERT INTO transactions_fts (transactions_fts, rowid, description, reference)
+    VALUES ('delete', old.id, old.description, old.reference);
+END;
+
+CREATE TRIGGER IF NOT EXISTS transactions_fts_update
+AFTER UPDATE OF description, reference ON transactions
+BEGIN
+    INSERT INTO transactions_fts (transactions_fts, rowid, description, reference)
+    VALUES ('delete', old.id, old.description, old.reference);
+    INSERT INTO transactions_fts (rowid, description, reference)
+    VALUES (new.id, new.description, new.reference);
+END;
@@ -0,0 +1,78 @@
+-- Ledger version for cached reports (see report_cache.py). Every write to
+-- the tables reports read from bumps it, whichever code path made the write.
+INSERT OR IGNORE INTO cache_versions (name, version) VALUES ('ledger', 1);
+
+CREATE TRIGGER IF NOT EXISTS transactions_ledger_insert AFTER INSERT ON transactions
+BEGIN
+    UPDATE cache_versions SET version = version + 1 WHERE name = 'ledger';
+END;
+
+CREATE TRIGGER IF NOT EXISTS transactions_ledger_update AFTER UPDATE ON transactions
+BEGIN
+    UPDATE cache_versions SET version = version + 1 WHERE name = 'ledger';
+END;
+
+CREATE TRIGGER IF NOT EXISTS transactions_ledger_delete AFTER DELETE ON transactions
+BEGIN
+    UPDATE cache_versions SET version = version + 1 WHERE name = 'ledger';
+END;
+
+CREATE TRIGGER IF NOT EXISTS transaction_entries_ledger_insert AFTER INSERT ON transaction_entries
+BEGIN
+    UPDATE cache_versions SET version = version + 1 WHERE name = 'ledger';
+END;
+
+CREATE TRIGGER IF NOT EXISTS transaction_entries_ledger_update AFTER UPDATE ON transaction_entries
+BEGIN
+    UPDATE cache_versions SET version = version + 1 WHERE name = 'ledger';
+END;
+
+CREATE TRIGGER IF NOT EXISTS transaction_entries_ledger_delete AFTER DELETE ON transaction_entries
+BEGIN
+    UPDATE cache_versions SET version = version + 1 WHERE name = 'ledger';
+END;
+
+CREATE TRIGGER IF NOT EXISTS invoices_ledger_insert AFTER INSERT ON invoices
+BEGIN
+    UPDATE cache_versions SET version = version + 1 WHERE name = 'ledger';
+END;
+
+CREATE TRIGGER IF NOT EXISTS invoices_ledger_update AFTER UPDATE ON invoices
+BEGIN
+    UPDATE cache_versions SET version = version + 1 WHERE name = 'ledger';
+END;
+
+CREATE TRIGGER IF NOT EXISTS invoices_ledger_delete AFTER DELETE ON invoices
+BEGIN
+    UPDATE cache_versions SET version = version + 1 WHERE name = 'ledger';
+END;
+
+CREATE TRIGGER IF NOT EXISTS invoice_items_ledger_insert AFTER INSERT ON invoice_items
+BEGIN
+    UPDATE cache_versions SET version = version + 1 WHERE name = 'ledger';
+END;
+
+CREATE TRIGGER IF NOT EXISTS invoice_items_ledger_update AFTER UPDATE ON invoice_items
+BEGIN
+    UPDATE cache_versions SET version = version + 1 WHERE name = 'ledger';
+END;
+
+CREATE TRIGGER IF NOT EXISTS invoice_items_ledger_delete AFTER DELETE ON invoice_items
+BEGIN
+    UPDATE cache_versions SET version = version + 1 WHERE name = 'ledger';
+END;
+
+CREATE TRIGGER IF NOT EXISTS payments_ledger_insert AFTER INSERT ON payments
+BEGIN
+    UPDATE cache_versions SET version = version + 1 WHERE name = 'ledger';
+END;
+
+CREATE TRIGGER IF NOT EXISTS payments_ledger_update AFTER UPDATE ON payments
+BEGIN
+    UPDATE cache_versions SET version = version + 1 WHERE name = 'ledger';
+END;
+
+CREATE TRIGGER IF NOT EXISTS payments_ledger_delete AFTER DELETE ON payments
+BEGIN
+    UPDATE cache_versions SET version = version + 1 WHERE name = 'ledger';
+END;
@@ -0,0 +1,28 @@
+-- Monthly debit/credit totals per account, maintained at posting time (see
+-- models._record_period_totals). Period reports add up whole months here and
+-- scan the transactions table only for partial months at either end.
+CREATE TABLE IF NOT EXISTS account_period_totals (
+    account_id INTEGER NOT NULL,
+    period TEXT NOT NULL,  -- YYYY-MM
+    debits REAL NOT NULL DEFAULT 0,
+    credits REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (account_id, period),
+    FOREIGN KEY (account_id) REFERENCES accounts(id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_account_period_totals_period
+    ON account_period_totals (period, account_id, debits, credits);
+
+INSERT INTO account_period_totals (account_id, period, debits, credits)
+SELECT account_id, substr(date, 1, 7), SUM(debit), SUM(credit)
+FROM (
+    SELECT debit_account AS account_id, date, amount AS debit, 0 AS credit
+    FROM transactions WHERE debit_account IS NOT NULL
+    UNION ALL
+    SELECT credit_account, date, 0, amount
+    FROM transactions WHERE credit_account IS NOT NULL
+    UNION ALL
+    SELECT e.account_id, t.date, e.debit, e.credit
+    FROM transaction_entries e JOIN transactions t ON t.id = e.transaction_id
+)
+GROUP BY account_id, substr(date, 1, 7);
@@ -0,0 +1,39 @@
+-- Report jobs (see report_jobs.py). The reports table becomes the job queue:
+-- every requested report is a row that moves queued -> running -> done/failed,
+-- and a finished report keeps its gzipped JSON so it can be fetched again.
+-- The table is rebuilt because its CHECK constraint only allowed three types.
+CREATE TABLE reports_new (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    report_type TEXT CHECK(report_type IN (
+        'balance_sheet', 'income_statement', 'cash_flow', 'trial_balance', 'general_ledger'
+    )) NOT NULL,
+    start_date DATE NOT NULL,
+    end_date DATE NOT NULL,
+    format TEXT NOT NULL DEFAULT 'json',
+    status TEXT CHECK(status IN ('queued', 'running', 'done', 'failed')) NOT NULL DEFAULT 'queued',
+    request_key TEXT,
+    requested_by INTEGER REFERENCES users(id),
+    result BLOB,
+    result_size INTEGER,
+    etag TEXT,
+    error TEXT,
+    generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+-- Rows from before jobs never stored their output
+INSERT INTO reports_new (id, report_type, start_date, end_date, status, error, generated_at, finished_at)
+SELECT id, report_type, start_date, end_date, 'failed', 'No stored result', generated_at, generated_at
+FROM reports;
+
+DROP TABLE reports;
+ALTER TABLE reports_new RENAME TO reports;
+
+-- At most one pending job per identical request; later requests join it
+CREATE UNIQUE INDEX IF NOT EXISTS idx_reports_pending_request
+    ON reports (request_key) WHERE status IN ('queued', 'running');
+
+-- The dispatcher claims the oldest queued job
+CREATE INDEX IF NOT EXISTS idx_reports_status
+    ON reports (status, id);
@@ -0,0 +1,3 @@
+-- Comparative report jobs: the periods option as JSON ('"monthly"',
+-- '"quarterly"' or a list of boundary dates), NULL for a single period
+ALTER TABLE reports ADD COLUMN periods TEXT;
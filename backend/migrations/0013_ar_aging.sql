@@ -0,0 +1,51 @@
+-- Accounts-receivable aging report (models.generate_ar_aging).
+-- The reports table is rebuilt so report jobs accept 'ar_aging'.
+CREATE TABLE reports_new (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    report_type TEXT CHECK(report_type IN (
+        'balance_sheet', 'income_statement', 'cash_flow', 'trial_balance', 'general_ledger', 'ar_aging'
+    )) NOT NULL,
+    start_date DATE NOT NULL,
+    end_date DATE NOT NULL,
+    format TEXT NOT NULL DEFAULT 'json',
+    status TEXT CHECK(status IN ('queued', 'running', 'done', 'failed')) NOT NULL DEFAULT 'queued',
+    request_key TEXT,
+    requested_by INTEGER REFERENCES users(id),
+    result BLOB,
+    result_size INTEGER,
+    etag TEXT,
+    error TEXT,
+    generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP,
+    periods TEXT
+);
+
+INSERT INTO reports_new (
+    id, report_type, start_date, end_date, format, status, request_key, requested_by,
+    result, result_size, etag, error, generated_at, started_at, finished_at, periods
+)
+SELECT id, report_type, start_date, end_date, format, status, request_key, requested_by,
+       result, result_size, etag, error, generated_at, started_at, finished_at, periods
+FROM reports;
+
+DROP TABLE reports;
+ALTER TABLE reports_new RENAME TO reports;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_reports_pending_request
+    ON reports (request_key) WHERE status IN ('queued', 'running');
+CREATE INDEX IF NOT EXISTS idx_reports_status
+    ON reports (status, id);
+
+-- Invoices open as of a date: a range over (status, date) that carries
+-- everything the aging buckets need, so the table itself is never read
+CREATE INDEX IF NOT EXISTS idx_invoices_aging
+    ON invoices (status, date, client_id, due_date, total);
+
+-- Payments made by a date, per invoice. Replaces the (invoice_id, status,
+-- amount) index: the same prefix still answers the amount_paid subqueries
+DROP INDEX IF EXISTS idx_payments_invoice_status;
+CREATE INDEX IF NOT EXISTS idx_payments_invoice_date
+    ON payments (invoice_id, status, date, amount);
+
+ANALYZE;
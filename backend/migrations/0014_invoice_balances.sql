@@ -0,0 +1,73 @@
+-- Payment totals stored on each invoice, so listings and AR reports read
+-- them instead of summing payments per row. Triggers keep them current in
+-- the same transaction as any payment insert, update or delete (and any
+-- change to an invoice total); models.check_invoice_balances compares them
+-- with the payments table and rebuild_invoice_balances recomputes them.
+ALTER TABLE invoices ADD COLUMN amount_paid REAL NOT NULL DEFAULT 0;
+ALTER TABLE invoices ADD COLUMN balance_due REAL NOT NULL DEFAULT 0;
+ALTER TABLE invoices ADD COLUMN last_payment_date DATE;
+
+UPDATE invoices SET (amount_paid, last_payment_date) = (
+    SELECT COALESCE(SUM(p.amount), 0), MAX(p.date)
+    FROM payments p
+    WHERE p.invoice_id = invoices.id AND p.status = 'completed'
+);
+UPDATE invoices SET balance_due = total - amount_paid;
+
+-- Payments recorded against an invoice: recompute from its completed
+-- payments (an index seek on idx_payments_invoice_date) rather than adding
+-- deltas, so the stored figures never drift
+CREATE TRIGGER IF NOT EXISTS payments_balance_insert AFTER INSERT ON payments
+WHEN NEW.status = 'completed'
+BEGIN
+    UPDATE invoices SET (amount_paid, last_payment_date) = (
+        SELECT COALESCE(SUM(amount), 0), MAX(date) FROM payments
+        WHERE invoice_id = NEW.invoice_id AND status = 'completed'
+    ) WHERE id = NEW.invoice_id;
+    UPDATE invoices SET balance_due = total - amount_paid WHERE id = NEW.invoice_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS payments_balance_update AFTER UPDATE OF invoice_id, date, amount, status ON payments
+WHEN OLD.status = 'completed' OR NEW.status = 'completed'
+BEGIN
+    UPDATE invoices SET (amount_paid, last_payment_date) = (
+        SELECT COALESCE(SUM(amount), 0), MAX(date) FROM payments
+        WHERE invoice_id = invoices.id AND status = 'completed'
+    ) WHERE id IN (OLD.invoice_id, NEW.invoice_id);
+    UPDATE invoices SET balance_due = total - amount_paid WHERE id IN (OLD.invoice_id, NEW.invoice_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS payments_balance_delete AFTER DELETE ON payments
+WHEN OLD.status = 'completed'
+BEGIN
+    UPDATE invoices SET (amount_paid, last_payment_date) = (
+        SELECT COALESCE(SUM(amount), 0), MAX(date) FROM payments
+        WHERE invoice_id = OLD.invoice_id AND status = 'completed'
+    ) WHERE id = OLD.invoice_id;
+    UPDATE invoices SET balance_due = total - amount_paid WHERE id = OLD.invoice_id;
+END;
+
+-- Invoices inserted without a balance (the app writes it) or re-totalled
+CREATE TRIGGER IF NOT EXISTS invoices_balance_insert AFTER INSERT ON invoices
+WHEN NEW.balance_due != NEW.total - NEW.amount_paid
+BEGIN
+    UPDATE invoices SET balance_due = total - amount_paid WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS invoices_balance_total AFTER UPDATE OF total ON invoices
+BEGIN
+    UPDATE invoices SET balance_due = total - amount_paid WHERE id = NEW.id;
+END;
+
+-- AR aging reads open invoices straight from this partial index, in client
+-- order; paid ones are not in it at all. It replaces idx_invoices_aging.
+DROP INDEX IF EXISTS idx_invoices_aging;
+CREATE INDEX IF NOT EXISTS idx_invoices_open
+    ON invoices (client_id, status, date, due_date, balance_due)
+    WHERE balance_due > 0.005;
+
+-- Completed payments dated after an as-of date, for aging in the past
+CREATE INDEX IF NOT EXISTS idx_payments_status_date
+    ON payments (status, date, invoice_id, amount);
+
+ANALYZE;
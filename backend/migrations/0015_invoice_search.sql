@@ -0,0 +1,60 @@
+-- Invoice search (models.search_invoices): keyset pages ordered by
+-- (sort column, invoice_number) and facet counts by status and client.
+
+-- Sorted pages with and without a status filter. invoice_number is unique,
+-- so it is the tiebreaker every ordering seeks on. Client filters use
+-- idx_invoices_client_date and sort the client's few invoices instead.
+CREATE INDEX IF NOT EXISTS idx_invoices_status_number
+    ON invoices (status, invoice_number);
+CREATE INDEX IF NOT EXISTS idx_invoices_total
+    ON invoices (total, invoice_number, status, client_id);
+CREATE INDEX IF NOT EXISTS idx_invoices_status_total
+    ON invoices (status, total, invoice_number);
+CREATE INDEX IF NOT EXISTS idx_invoices_due
+    ON invoices (COALESCE(due_date, date), invoice_number);
+CREATE INDEX IF NOT EXISTS idx_invoices_status_due
+    ON invoices (status, COALESCE(due_date, date), invoice_number);
+
+-- Date-range facets are counted from this index alone; it also serves the
+-- unfiltered date ordering the old (date, invoice_number) index did
+DROP INDEX IF EXISTS idx_invoices_date;
+CREATE INDEX IF NOT EXISTS idx_invoices_date
+    ON invoices (date, invoice_number, status, client_id, total);
+
+-- Invoice counts per (status, client), for facets without a date or amount
+-- filter; client_id 0 stands for invoices without a client
+CREATE TABLE IF NOT EXISTS invoice_facet_counts (
+    status TEXT NOT NULL,
+    client_id INTEGER NOT NULL,
+    invoices INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (status, client_id)
+) WITHOUT ROWID;
+
+INSERT INTO invoice_facet_counts (status, client_id, invoices)
+SELECT status, COALESCE(client_id, 0), COUNT(*) FROM invoices
+GROUP BY status, COALESCE(client_id, 0);
+
+CREATE TRIGGER IF NOT EXISTS invoices_facet_insert AFTER INSERT ON invoices
+BEGIN
+    INSERT INTO invoice_facet_counts (status, client_id, invoices)
+    VALUES (NEW.status, COALESCE(NEW.client_id, 0), 1)
+    ON CONFLICT(status, client_id) DO UPDATE SET invoices = invoices + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS invoices_facet_update AFTER UPDATE OF status, client_id ON invoices
+WHEN OLD.status IS NOT NEW.status OR OLD.client_id IS NOT NEW.client_id
+BEGIN
+    UPDATE invoice_facet_counts SET invoices = invoices - 1
+    WHERE status = OLD.status AND client_id = COALESCE(OLD.client_id, 0);
+    INSERT INTO invoice_facet_counts (status, client_id, invoices)
+    VALUES (NEW.status, COALESCE(NEW.client_id, 0), 1)
+    ON CONFLICT(status, client_id) DO UPDATE SET invoices = invoices + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS invoices_facet_delete AFTER DELETE ON invoices
+BEGIN
+    UPDATE invoice_facet_counts SET invoices = invoices - 1
+    WHERE status = OLD.status AND client_id = COALESCE(OLD.client_id, 0);
+END;
+
+ANALYZE;
@@ -0,0 +1,36 @@
+-- Recurring invoice templates (see recurring_invoices.py). Each active
+-- template is invoiced once per period from next_run_date onwards.
+CREATE TABLE IF NOT EXISTS recurring_invoices (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    client_id INTEGER NOT NULL,
+    schedule TEXT CHECK(schedule IN ('monthly', 'quarterly', 'yearly')) NOT NULL DEFAULT 'monthly',
+    start_date DATE NOT NULL,
+    end_date DATE,
+    next_run_date DATE NOT NULL,
+    last_period TEXT,
+    due_days INTEGER NOT NULL DEFAULT 30,
+    items TEXT NOT NULL,  -- JSON list of {description, quantity, unit_price, taxable}
+    tax_rate REAL NOT NULL DEFAULT 0,
+    discount REAL NOT NULL DEFAULT 0,
+    notes TEXT,
+    invoice_status TEXT CHECK(invoice_status IN ('draft', 'sent')) NOT NULL DEFAULT 'sent',
+    is_active BOOLEAN NOT NULL DEFAULT 1,
+    created_by INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (client_id) REFERENCES clients(id),
+    FOREIGN KEY (created_by) REFERENCES users(id)
+);
+
+-- Generator workers each read the due templates of one client range
+CREATE INDEX IF NOT EXISTS idx_recurring_invoices_due
+    ON recurring_invoices (client_id, next_run_date)
+    WHERE is_active = 1;
+
+-- The template and period an invoice was generated for; at most one
+-- invoice per template per period, so a rerun cannot bill twice
+ALTER TABLE invoices ADD COLUMN recurring_id INTEGER REFERENCES recurring_invoices(id);
+ALTER TABLE invoices ADD COLUMN period TEXT;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_invoices_recurring_period
+    ON invoices (recurring_id, period)
+    WHERE recurring_id IS NOT NULL;
@@ -1,16 +1,29 @@
 
-from database import execute_query, get_db_connection
+import base64
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from itertools import chain, groupby
+from database import execute_query, iter_query, get_db_connection, use_read_only_connections
+from posting import get_posting_writer
+from account_catalog import get_account_catalog
+from report_cache import get_report_cache
+from ledger_arrays import get_ledger_arrays
+from utils.exporters import render_rows
 
 # Account model
 def get_accounts():
     """Get all accounts with their current balances"""
     return execute_query(
         """
-        SELECT id, code, name, type, balance, description, is_active,
-               (SELECT COUNT(*) FROM transactions 
-                WHERE debit_account = accounts.id OR credit_account = accounts.id) as transaction_count
-        FROM accounts 
-        ORDER BY type, code, name
+        SELECT a.id, a.code, a.name, a.type, a.balance, a.description, a.is_active,
+               COALESCE(aa.transaction_count, 0) as transaction_count,
+               aa.last_activity_date
+        FROM accounts a
+        LEFT JOIN account_activity aa ON aa.account_id = a.id
+        ORDER BY a.type, a.code, a.name
         """,
         fetchall=True
     )
@@ -19,13 +32,12 @@ def get_account(account_id):
     """Get a single account by ID with detailed information"""
     account = execute_query(
         """
-        SELECT id, code, name, type, balance, description, is_active, created_at,
-               (SELECT SUM(amount) FROM transactions 
-                WHERE debit_account = accounts.id) as total_debits,
-               (SELECT SUM(amount) FROM transactions 
-                WHERE credit_account = accounts.id) as total_credits
-        FROM accounts 
-        WHERE id = ?
+        SELECT a.id, a.code, a.name, a.type, a.balance, a.description, a.is_active, a.created_at,
+               aa.total_debits, aa.total_credits, aa.last_activity_date,
+               COALESCE(aa.transaction_count, 0) as transaction_count
+        FROM accounts a
+        LEFT JOIN account_activity aa ON aa.account_id = a.id
+        WHERE a.id = ?
         """,
         (account_id,),
         fetchone=True
@@ -34,6 +46,88 @@ def get_account(account_id):
         account['current_balance'] = (account.get('total_debits', 0) or 0) - (account.get('total_credits', 0) or 0)
     return account
 
+# Upsert used by every posting path; rows are
+# (account_id, transaction_count, debits, credits, activity_date)
+_ACTIVITY_UPSERT = """
+    INSERT INTO account_activity
+    (account_id, transaction_count, total_debits, total_credits, last_activity_date)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(account_id) DO UPDATE SET
+        transaction_count = transaction_count + excluded.transaction_count,
+        total_debits = total_debits + excluded.total_debits,
+        total_credits = total_credits + excluded.total_credits,
+        last_activity_date = MAX(COALESCE(last_activity_date, ''), excluded.last_activity_date)
+"""
+
+def _record_account_activity(cursor, rows):
+    """Fold posting activity into account_activity inside the caller's transaction"""
+    cursor.executemany(_ACTIVITY_UPSERT, rows)
+
+def _rebuild_account_activity(cursor):
+    cursor.execute("DELETE FROM account_activity")
+    cursor.execute(
+        """
+        INSERT INTO account_activity
+        (account_id, transaction_count, total_debits, total_credits, last_activity_date)
+        SELECT account_id, COUNT(DISTINCT transaction_id), SUM(debit), SUM(credit), MAX(date)
+        FROM (
+            SELECT debit_account AS account_id, id AS transaction_id, amount AS debit, 0 AS credit, date
+            FROM transactions WHERE debit_account IS NOT NULL
+            UNION ALL
+            SELECT credit_account, id, 0, amount, date
+            FROM transactions WHERE credit_account IS NOT NULL
+            UNION ALL
+            SELECT e.account_id, e.transaction_id, e.debit, e.credit, t.date
+            FROM transaction_entries e JOIN transactions t ON t.id = e.transaction_id
+        )
+        GROUP BY account_id
+        """
+    )
+    return cursor.rowcount
+
+def rebuild_account_activity():
+    """Recompute account_activity from the transactions table; returns accounts rebuilt"""
+    # Runs on the posting writer so no posting can interleave with the rebuild
+    return get_posting_writer().post(_rebuild_account_activity)
+
+# Upsert used by every posting path; rows are (account_id, 'YYYY-MM', debits, credits)
+_PERIOD_TOTALS_UPSERT = """
+    INSERT INTO account_period_totals (account_id, period, debits, credits)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(account_id, period) DO UPDATE SET
+        debits = debits + excluded.debits,
+        credits = credits + excluded.credits
+"""
+
+def _record_period_totals(cursor, rows):
+    """Fold posting amounts into account_period_totals inside the caller's transaction"""
+    cursor.executemany(_PERIOD_TOTALS_UPSERT, rows)
+
+def _rebuild_period_totals(cursor):
+    cursor.execute("DELETE FROM account_period_totals")
+    cursor.execute(
+        """
+        INSERT INTO account_period_totals (account_id, period, debits, credits)
+        SELECT account_id, substr(date, 1, 7), SUM(debit), SUM(credit)
+        FROM (
+            SELECT debit_account AS account_id, date, amount AS debit, 0 AS credit
+            FROM transactions WHERE debit_account IS NOT NULL
+            UNION ALL
+            SELECT credit_account, date, 0, amount
+            FROM transactions WHERE credit_account IS NOT NULL
+            UNION ALL
+            SELECT e.account_id, t.date, e.debit, e.credit
+            FROM transaction_entries e JOIN transactions t ON t.id = e.transaction_id
+        )
+        GROUP BY account_id, substr(date, 1, 7)
+        """
+    )
+    return cursor.rowcount
+
+def rebuild_period_totals():
+    """Recompute account_period_totals from the transactions table; returns rows rebuilt"""
+    return get_posting_writer().post(_rebuild_period_totals)
+
 def create_account(code, name, account_type, description='', initial_balance=0.0, is_active=True):
     """Create a new account with validation"""
     valid_types = ['Asset', 'Liability', 'Equity', 'Revenue', 'Expense']
@@ -48,7 +142,7 @@ def create_account(code, name, account_type, description='', initial_balance=0.0
     except ValueError:
         raise ValueError("Account code must be a number")
     
-    return execute_query(
+    account_id = execute_query(
         """
         INSERT INTO accounts (code, name, type, description, balance, is_active)
         VALUES (?, ?, ?, ?, ?, ?)
@@ -56,6 +150,9 @@ def create_account(code, name, account_type, description='', initial_balance=0.0
         (code, name, account_type, description, float(initial_balance), 1 if is_active else 0),
         commit=True
     )
+    # Other workers pick the change up through the accounts cache version
+    get_account_catalog().invalidate()
+    return account_id
 
 def update_account_balance(account_id, amount, is_debit=True):
     """Update account balance after a transaction"""
@@ -76,6 +173,40 @@ def get_account_balance(account_id):
     return account['balance'] if account else 0.0
 
 # Transaction model
+_TRANSACTION_COLUMNS = """
+            t.id, t.date, t.reference, t.description, t.amount, t.status,
+            t.debit_account, da.name AS debit_account_name, da.code AS debit_account_code,
+            t.credit_account, ca.name AS credit_account_name, ca.code AS credit_account_code,
+            t.created_at, t.updated_at, t.created_by
+"""
+
+def _transactions_query(account_id=None, start_date=None, end_date=None):
+    """Build the filtered transaction listing query shared by get/iter_transactions"""
+    params = []
+    where_clauses = ["1=1"]
+    
+    if account_id:
+        where_clauses.append("(debit_account = ? OR credit_account = ?)")
+        params.extend([account_id, account_id])
+    
+    if start_date:
+        where_clauses.append("date >= ?")
+        params.append(start_date)
+    
+    if end_date:
+        where_clauses.append("date <= ?")
+        params.append(end_date)
+    
+    query = f"""
+        SELECT {_TRANSACTION_COLUMNS}
+        FROM transactions t
+        JOIN accounts da ON t.debit_account = da.id
+        JOIN accounts ca ON t.credit_account = ca.id
+        WHERE {' AND '.join(where_clauses)}
+        ORDER BY t.date DESC, t.id DESC
+    """
+    return query, params
+
 def get_transactions(account_id=None, start_date=None, end_date=None, limit=100, offset=0):
     """
     Get transactions with optional filtering
@@ -87,13 +218,59 @@ def get_transactions(account_id=None, start_date=None, end_date=None, limit=100,
         limit: Maximum number of transactions to return
         offset: Number of transactions to skip (for pagination)
     """
+    query, params = _transactions_query(account_id, start_date, end_date)
+    query += " LIMIT ? OFFSET ?"
+    params.extend([limit, offset])
+    return execute_query(query, tuple(params), fetchall=True)
+
+def iter_transactions(account_id=None, start_date=None, end_date=None, limit=None, as_dict=True):
+    """
+    Stream transactions with the same filters as get_transactions
+    
+    Rows are yielded as they are fetched, so memory stays bounded however
+    many transactions match. limit=None streams every matching row.
+    """
+    query, params = _transactions_query(account_id, start_date, end_date)
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+    return iter_query(query, tuple(params), as_dict=as_dict)
+
+def encode_cursor(date, transaction_id):
+    """Opaque continuation token for the row (date, id)"""
+    raw = json.dumps([date, transaction_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(token):
+    """Inverse of encode_cursor; raises ValueError for a malformed token"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        date, transaction_id = json.loads(raw)
+        return str(date), int(transaction_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+def get_transactions_page(account_id=None, start_date=None, end_date=None, limit=100, cursor=None):
+    """
+    Get one page of transactions using keyset (seek) pagination
+    
+    Pages run newest first on (date, id). Instead of skipping OFFSET rows,
+    each page seeks directly past the last row of the previous one, so
+    every page costs the same however deep it is.
+    
+    Args:
+        account_id: Filter by account ID (debit or credit)
+        start_date: Filter transactions on or after this date (YYYY-MM-DD)
+        end_date: Filter transactions on or before this date (YYYY-MM-DD)
+        limit: Page size
+        cursor: next_cursor from the previous page, or None for the first page
+    
+    Returns:
+        {'data': [...], 'next_cursor': token, or None on the last page}
+    """
     params = []
     where_clauses = ["1=1"]
     
-    if account_id:
-        where_clauses.append("(debit_account = ? OR credit_account = ?)")
-        params.extend([account_id, account_id])
-    
     if start_date:
         where_clauses.append("date >= ?")
         params.append(start_date)
@@ -102,22 +279,122 @@ def get_transactions(account_id=None, start_date=None, end_date=None, limit=100,
         where_clauses.append("date <= ?")
         params.append(end_date)
     
-    query = f"""
-        SELECT 
-            t.id, t.date, t.reference, t.description, t.amount, t.status,
-            t.debit_account, da.name AS debit_account_name, da.code AS debit_account_code,
-            t.credit_account, ca.name AS credit_account_name, ca.code AS credit_account_code,
-            t.created_at, t.updated_at, t.created_by
-        FROM transactions t
+    if cursor:
+        where_clauses.append("(date, id) < (?, ?)")
+        params.extend(decode_cursor(cursor))
+    
+    where = ' AND '.join(where_clauses)
+    fetch = limit + 1  # one extra row tells us whether another page exists
+    
+    if account_id:
+        # One seek per side of the posting; each reads at most one page from
+        # its (account, date, id) index and the two are merged below
+        page_query = f"""
+            SELECT id FROM (
+                SELECT id FROM transactions WHERE debit_account = ? AND {where}
+                ORDER BY date DESC, id DESC LIMIT ?
+            )
+            UNION ALL
+            SELECT id FROM (
+                SELECT id FROM transactions WHERE credit_account = ? AND {where}
+                ORDER BY date DESC, id DESC LIMIT ?
+            )
+        """
+        page_params = [account_id, *params, fetch, account_id, *params, fetch]
+    else:
+        page_query = f"""
+            SELECT id FROM transactions WHERE {where}
+            ORDER BY date DESC, id DESC LIMIT ?
+        """
+        page_params = [*params, fetch]
+    
+    rows = execute_query(
+        f"""
+        SELECT {_TRANSACTION_COLUMNS}
+        FROM ({page_query}) page
+        JOIN transactions t ON t.id = page.id
         JOIN accounts da ON t.debit_account = da.id
         JOIN accounts ca ON t.credit_account = ca.id
-        WHERE {' AND '.join(where_clauses)}
         ORDER BY t.date DESC, t.id DESC
-        LIMIT ? OFFSET ?
+        LIMIT ?
+        """,
+        (*page_params, fetch),
+        fetchall=True
+    )
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['date'], rows[-1]['id'])
+    return {'data': rows, 'next_cursor': next_cursor}
+
+def _fts_query(text):
+    """
+    Turn free text into an FTS5 query: every word must match, as a prefix
+    
+    Words are quoted so characters FTS5 treats as syntax (quotes, colons,
+    AND/OR/NOT, parentheses) are searched for literally.
+    """
+    terms = [word.replace('"', '') for word in text.split()]
+    terms = [term for term in terms if term]
+    if not terms:
+        raise ValueError("Search query is empty")
+    return ' '.join(f'"{term}"*' for term in terms)
+
+def search_transactions(text, account_id=None, start_date=None, end_date=None, limit=50, offset=0):
+    """
+    Full-text search over transaction descriptions and references
+    
+    Args:
+        text: Words to find; each matches as a prefix ("ren" finds "rent")
+        account_id: Filter by account ID (debit, credit or any entry line)
+        start_date: Filter transactions on or after this date (YYYY-MM-DD)
+        end_date: Filter transactions on or before this date (YYYY-MM-DD)
+        limit: Maximum number of results
+        offset: Number of results to skip
+    
+    Returns:
+        Transactions best match first (equal ranks by id, so offset pages
+        neither repeat nor skip rows), each with a 'snippet' of the
+        description and the 'reference', matches wrapped in <mark></mark>,
+        and its 'rank' (lower is better)
     """
+    params = [_fts_query(text)]
+    where_clauses = ["transactions_fts MATCH ?"]
+    
+    if account_id:
+        where_clauses.append("""(
+            t.debit_account = ? OR t.credit_account = ?
+            OR EXISTS (SELECT 1 FROM transaction_entries e WHERE e.transaction_id = t.id AND e.account_id = ?)
+        )""")
+        params.extend([account_id, account_id, account_id])
+    
+    if start_date:
+        where_clauses.append("t.date >= ?")
+        params.append(start_date)
+    
+    if end_date:
+        where_clauses.append("t.date <= ?")
+        params.append(end_date)
     
     params.extend([limit, offset])
-    return execute_query(query, tuple(params), fetchall=True)
+    return execute_query(
+        f"""
+        SELECT {_TRANSACTION_COLUMNS},
+            snippet(transactions_fts, 0, '<mark>', '</mark>', '…', 16) AS snippet,
+            highlight(transactions_fts, 1, '<mark>', '</mark>') AS reference_snippet,
+            transactions_fts.rank AS rank
+        FROM transactions_fts
+        JOIN transactions t ON t.id = transactions_fts.rowid
+        LEFT JOIN accounts da ON t.debit_account = da.id
+        LEFT JOIN accounts ca ON t.credit_account = ca.id
+        WHERE {' AND '.join(where_clauses)}
+        ORDER BY transactions_fts.rank, t.id
+        LIMIT ? OFFSET ?
+        """,
+        tuple(params),
+        fetchall=True
+    )
 
 def get_transaction(transaction_id):
     """Get a single transaction by ID with full details"""
@@ -138,19 +415,22 @@ def get_transaction(transaction_id):
         fetchone=True
     )
 
-def create_transaction(date, reference, description, debit_account, credit_account, amount, created_by, status='posted'):
+def _fresh_catalog():
     """
-    Create a new accounting transaction with validation
+    The account catalog checked against the database version just now
+
+    Postings are validated against this rather than the throttled catalog,
+    so an account another worker just deactivated or retyped is seen at
+    once; the check is a single-row read of cache_versions.
+    """
+    return get_account_catalog().ensure_fresh(max_age=0)
+
+def _validate_transaction(date, reference, description, debit_account, credit_account, amount, created_by,
+                          catalog=None):
+    """
+    Validate a single debit/credit posting; returns (debit_id, credit_id, amount)
     
-    Args:
-        date: Transaction date (YYYY-MM-DD)
-        reference: Transaction reference/number
-        description: Description of the transaction
-        debit_account: ID of the account to debit
-        credit_account: ID of the account to credit
-        amount: Transaction amount (must be positive)
-        created_by: ID of the user creating the transaction
-        status: Transaction status (draft, posted, void)
+    catalog is a _fresh_catalog() already checked by the caller (once per batch).
     """
     # Input validation
     if not all([date, reference, description, debit_account, credit_account, amount, created_by]):
@@ -167,17 +447,9 @@ def create_transaction(date, reference, description, debit_account, credit_accou
         raise ValueError("Invalid amount")
     
     # Verify accounts exist and are active
-    debit_acc = execute_query(
-        "SELECT id, type, is_active FROM accounts WHERE id = ?", 
-        (debit_account,), 
-        fetchone=True
-    )
-    
-    credit_acc = execute_query(
-        "SELECT id, type, is_active FROM accounts WHERE id = ?", 
-        (credit_account,), 
-        fetchone=True
-    )
+    catalog = catalog or _fresh_catalog()
+    debit_acc = catalog.get(debit_account)
+    credit_acc = catalog.get(credit_account)
     
     if not debit_acc or not credit_acc:
         raise ValueError("Invalid debit or credit account")
@@ -185,70 +457,401 @@ def create_transaction(date, reference, description, debit_account, credit_accou
     if not debit_acc.get('is_active') or not credit_acc.get('is_active'):
         raise ValueError("Cannot use inactive accounts")
     
-    # Start transaction
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    return debit_acc['id'], credit_acc['id'], amount
+
+def create_transaction(date, reference, description, debit_account, credit_account, amount, created_by, status='posted'):
+    """
+    Create a new accounting transaction with validation
+    
+    Args:
+        date: Transaction date (YYYY-MM-DD)
+        reference: Transaction reference/number
+        description: Description of the transaction
+        debit_account: ID of the account to debit
+        credit_account: ID of the account to credit
+        amount: Transaction amount (must be positive)
+        created_by: ID of the user creating the transaction
+        status: Transaction status (draft, posted, void)
+    """
+    debit_account, credit_account, amount = _validate_transaction(
+        date, reference, description, debit_account, credit_account, amount, created_by
+    )
     
+    # Hand the write to the group-commit writer; it commits this posting
+    # atomically together with any others queued at the same time
     try:
-        cursor.execute("BEGIN TRANSACTION")
-        
-        # Insert the transaction
-        transaction_id = execute_query(
+        return get_posting_writer().post(
+            _post_transaction,
+            date, reference, description, debit_account, credit_account, amount, status, created_by
+        )
+    except Exception as e:
+        raise ValueError(f"Failed to create transaction: {str(e)}")
+
+def _post_transaction(cursor, date, reference, description, debit_account, credit_account, amount, status, created_by):
+    """Write one transaction and its balance changes (runs on the posting writer)"""
+    # Insert the transaction
+    cursor.execute(
+        """
+        INSERT INTO transactions 
+        (date, reference, description, debit_account, credit_account, amount, status, created_by)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (date, reference, description, debit_account, credit_account, amount, status, created_by)
+    )
+    transaction_id = cursor.lastrowid
+    
+    # Update account balances if transaction is posted
+    if status == 'posted':
+        # Update debit account (increases balance for assets/expenses, decreases for liabilities/equity/revenue)
+        cursor.execute(
             """
-            INSERT INTO transactions 
-            (date, reference, description, debit_account, credit_account, amount, status, created_by)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            UPDATE accounts 
+            SET balance = balance + ?,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
             """,
-            (date, reference, description, debit_account, credit_account, amount, status, created_by),
-            commit=False
+            (amount, debit_account)
         )
         
-        # Update account balances if transaction is posted
-        if status == 'posted':
-            # Update debit account (increases balance for assets/expenses, decreases for liabilities/equity/revenue)
-            cursor.execute(
-                """
-                UPDATE accounts 
-                SET balance = balance + ?,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-                """,
-                (amount, debit_account)
-            )
-            
-            # Update credit account (decreases balance for assets/expenses, increases for liabilities/equity/revenue)
-            cursor.execute(
-                """
-                UPDATE accounts 
-                SET balance = balance - ?,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-                """,
-                (amount, credit_account)
-            )
-        
-        conn.commit()
-        return transaction_id
-        
+        # Update credit account (decreases balance for assets/expenses, increases for liabilities/equity/revenue)
+        cursor.execute(
+            """
+            UPDATE accounts 
+            SET balance = balance - ?,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+            """,
+            (amount, credit_account)
+        )
+    
+    _record_account_activity(cursor, [
+        (debit_account, 1, amount, 0, date),
+        (credit_account, 1, 0, amount, date)
+    ])
+    _record_period_totals(cursor, [
+        (debit_account, date[:7], amount, 0),
+        (credit_account, date[:7], 0, amount)
+    ])
+    
+    return transaction_id
+
+def _validate_entries(entries, catalog=None):
+    """
+    Validate double-entry lines; returns [(account_id, debit, credit), ...]
+    
+    catalog as for _validate_transaction.
+    """
+    if not entries or len(entries) < 2:
+        raise ValueError("Transaction must have at least 2 entries")
+    
+    lines = []
+    try:
+        for entry in entries:
+            debit = float(entry.get('debit', 0) or 0)
+            credit = float(entry.get('credit', 0) or 0)
+            if debit < 0 or credit < 0:
+                raise ValueError("Entry amounts cannot be negative")
+            lines.append((entry['account_id'], debit, credit))
+    except KeyError:
+        raise ValueError("Every entry needs an account_id")
+    except (TypeError, AttributeError):
+        raise ValueError("Invalid entry amount")
+    
+    if round(sum(l[1] for l in lines) - sum(l[2] for l in lines), 2) != 0:
+        raise ValueError("Total debits must equal total credits")
+    
+    # Verify accounts exist and are active
+    catalog = catalog or _fresh_catalog()
+    accounts = [catalog.get(l[0]) for l in lines]
+    if not all(accounts):
+        raise ValueError("Invalid account in entries")
+    if not all(a['is_active'] for a in accounts):
+        raise ValueError("Cannot use inactive accounts")
+    return [(a['id'], debit, credit) for a, (_, debit, credit) in zip(accounts, lines)]
+
+def create_compound_transaction(date, reference, description, entries, created_by=None, status='posted'):
+    """
+    Create a double-entry transaction with two or more lines
+    
+    Args:
+        date: Transaction date (YYYY-MM-DD)
+        reference: Transaction reference/number
+        description: Description of the transaction
+        entries: List of dictionaries with 'account_id', 'debit', 'credit'
+        created_by: ID of the user creating the transaction
+        status: Transaction status (draft, posted, void)
+    """
+    lines = _validate_entries(entries)
+    
+    try:
+        return get_posting_writer().post(
+            _post_compound_transaction,
+            date, reference, description, lines, status, created_by
+        )
     except Exception as e:
-        conn.rollback()
         raise ValueError(f"Failed to create transaction: {str(e)}")
-        
-    finally:
-        cursor.close()
-        conn.close()
 
-# Invoice model
-def get_invoices(status=None, client_id=None, start_date=None, end_date=None):
+def _post_compound_transaction(cursor, date, reference, description, lines, status, created_by):
+    """Write a compound transaction, its lines and balance changes (runs on the posting writer)"""
+    cursor.execute(
+        """
+        INSERT INTO transactions (date, reference, description, amount, status, created_by)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (date, reference, description, sum(l[1] for l in lines), status, created_by)
+    )
+    transaction_id = cursor.lastrowid
+    
+    cursor.executemany(
+        """
+        INSERT INTO transaction_entries (transaction_id, account_id, debit, credit)
+        VALUES (?, ?, ?, ?)
+        """,
+        [(transaction_id, account_id, debit, credit) for account_id, debit, credit in lines]
+    )
+    
+    # One rollup row per account, however many lines it has
+    per_account = {}
+    for account_id, debit, credit in lines:
+        debits, credits = per_account.get(account_id, (0, 0))
+        per_account[account_id] = (debits + debit, credits + credit)
+    
+    if status == 'posted':
+        cursor.executemany(
+            """
+            UPDATE accounts 
+            SET balance = balance + ?,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+            """,
+            [(debits - credits, account_id) for account_id, (debits, credits) in per_account.items()]
+        )
+    
+    _record_account_activity(cursor, [
+        (account_id, 1, debits, credits, date)
+        for account_id, (debits, credits) in per_account.items()
+    ])
+    _record_period_totals(cursor, [
+        (account_id, date[:7], debits, credits)
+        for account_id, (debits, credits) in per_account.items()
+    ])
+    
+    return transaction_id
+
+BATCH_MODES = ('atomic', 'partial')
+TRANSACTION_STATUSES = ('draft', 'posted', 'void')
+
+def create_transactions_batch(transactions, created_by, mode='atomic'):
     """
-    Get invoices with optional filtering
+    Create many transactions in a single database transaction
     
     Args:
-        status: Filter by status (draft, sent, paid, overdue, cancelled)
-        client_id: Filter by client ID
-        start_date: Filter invoices on or after this date (YYYY-MM-DD)
-        end_date: Filter invoices on or before this date (YYYY-MM-DD)
+        transactions: List of transaction dictionaries, each either single
+            (date, reference, description, debit_account, credit_account, amount)
+            or double-entry (date, reference, description, entries)
+        created_by: ID of the user creating the transactions
+        mode: 'atomic' writes nothing if any item is invalid; 'partial' writes
+            the valid items and reports the invalid ones
+    
+    Returns:
+        {'ids': [new id or None, per item], 'errors': [{'index': i, 'error': message}]}
+    """
+    if mode not in BATCH_MODES:
+        raise ValueError(f"Invalid mode. Must be one of {list(BATCH_MODES)}")
+    if not isinstance(transactions, list) or not transactions:
+        raise ValueError("No transactions provided")
+    
+    singles = []
+    compounds = []
+    errors = []
+    catalog = _fresh_catalog()
+    for index, item in enumerate(transactions):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError("Transaction must be an object")
+            
+            date = item.get('date')
+            try:
+                datetime.strptime(date, '%Y-%m-%d')
+            except (TypeError, ValueError):
+                raise ValueError("Invalid date, expected YYYY-MM-DD")
+            
+            status = item.get('status', 'posted')
+            if status not in TRANSACTION_STATUSES:
+                raise ValueError(f"Invalid status. Must be one of {list(TRANSACTION_STATUSES)}")
+            
+            if 'entries' in item:
+                lines = _validate_entries(item['entries'], catalog)
+                compounds.append((
+                    index, date, item.get('reference', ''), item.get('description', ''), lines, status
+                ))
+            else:
+                debit_account, credit_account, amount = _validate_transaction(
+                    date, item.get('reference'), item.get('description'),
+                    item.get('debit_account'), item.get('credit_account'), item.get('amount'), created_by,
+                    catalog
+                )
+                singles.append((
+                    index, date, item['reference'], item['description'],
+                    debit_account, credit_account, amount, status
+                ))
+        except ValueError as e:
+            errors.append({'index': index, 'error': str(e)})
+    
+    ids = [None] * len(transactions)
+    if (errors and mode == 'atomic') or not (singles or compounds):
+        return {'ids': ids, 'errors': errors}
+    
+    try:
+        created = get_posting_writer().post(_post_transaction_batch, singles, compounds, created_by)
+    except Exception as e:
+        raise ValueError(f"Failed to create transactions: {str(e)}")
+    
+    for index, transaction_id in created:
+        ids[index] = transaction_id
+    return {'ids': ids, 'errors': errors}
+
+def _post_transaction_batch(cursor, singles, compounds, created_by, import_hashes=None):
+    """Write a validated batch with set-based balance updates (runs on the posting writer)"""
+    created = []
+    if import_hashes is None:
+        import_hashes = [None] * len(singles)
+    
+    # Single postings in one executemany. The writer holds the write lock, so
+    # AUTOINCREMENT hands out consecutive ids after the current sequence value.
+    if singles:
+        row = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'transactions'").fetchone()
+        first_id = (row[0] if row else 0) + 1
+        cursor.executemany(
+            """
+            INSERT INTO transactions 
+            (date, reference, description, debit_account, credit_account, amount, status, created_by, import_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (date, reference, description, debit_account, credit_account, amount, status, created_by, import_hash)
+                for (_, date, reference, description, debit_account, credit_account, amount, status), import_hash
+                in zip(singles, import_hashes)
+            ]
+        )
+        last_id = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'transactions'").fetchone()[0]
+        if last_id != first_id + len(singles) - 1:
+            raise ValueError("Transaction ids were not allocated consecutively")
+        created.extend((item[0], first_id + n) for n, item in enumerate(singles))
+    
+    # Compound headers need their ids for the lines, so insert them one by one
+    entry_rows = []
+    for index, date, reference, description, lines, status in compounds:
+        cursor.execute(
+            """
+            INSERT INTO transactions (date, reference, description, amount, status, created_by)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (date, reference, description, sum(l[1] for l in lines), status, created_by)
+        )
+        created.append((index, cursor.lastrowid))
+        entry_rows.extend((cursor.lastrowid, account_id, debit, credit) for account_id, debit, credit in lines)
+    if entry_rows:
+        cursor.executemany(
+            """
+            INSERT INTO transaction_entries (transaction_id, account_id, debit, credit)
+            VALUES (?, ?, ?, ?)
+            """,
+            entry_rows
+        )
+    
+    # Aggregate every line into one balance delta and one activity row per account
+    balance_deltas = {}
+    activity = {}
+    period_totals = {}
+    
+    def add(account_id, debit, credit, date, status, new_transaction):
+        if status == 'posted':
+            balance_deltas[account_id] = balance_deltas.get(account_id, 0) + debit - credit
+        count, debits, credits, last_date = activity.get(account_id, (0, 0, 0, date))
+        activity[account_id] = (
+            count + new_transaction, debits + debit, credits + credit, max(last_date, date)
+        )
+        key = (account_id, date[:7])
+        debits, credits = period_totals.get(key, (0, 0))
+        period_totals[key] = (debits + debit, credits + credit)
+    
+    for _, date, _, _, debit_account, credit_account, amount, status in singles:
+        add(debit_account, amount, 0, date, status, 1)
+        add(credit_account, 0, amount, date, status, 1)
+    for _, date, _, _, lines, status in compounds:
+        seen = set()
+        for account_id, debit, credit in lines:
+            add(account_id, debit, credit, date, status, 0 if account_id in seen else 1)
+            seen.add(account_id)
+    
+    cursor.executemany(
+        """
+        UPDATE accounts 
+        SET balance = balance + ?,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+        """,
+        [(delta, account_id) for account_id, delta in balance_deltas.items()]
+    )
+    _record_account_activity(cursor, [
+        (account_id, count, debits, credits, last_date)
+        for account_id, (count, debits, credits, last_date) in activity.items()
+    ])
+    _record_period_totals(cursor, [
+        (account_id, period, debits, credits)
+        for (account_id, period), (debits, credits) in period_totals.items()
+    ])
+    
+    return created
+
+# Hashes per IN (...) lookup, kept under SQLite's bound-parameter limit
+_HASH_LOOKUP_CHUNK = 500
+
+def submit_import_batch(rows, created_by):
+    """
+    Queue one batch of imported bank statement lines, skipping known ones
+    
+    Args:
+        rows: List of (date, reference, description, debit_id, credit_id, amount, import_hash)
+            tuples with accounts already resolved to active ids
+        created_by: ID of the user running the import
+    
+    Returns:
+        Future for (number inserted, number skipped as duplicates), so the
+        caller can prepare the next batch while this one is written
     """
+    return get_posting_writer().submit(_post_import_batch, rows, created_by)
+
+def _post_import_batch(cursor, rows, created_by):
+    """Drop lines whose hash is already posted, then write the rest as one batch"""
+    hashes = list({row[6] for row in rows})
+    existing = set()
+    for start in range(0, len(hashes), _HASH_LOOKUP_CHUNK):
+        chunk = hashes[start:start + _HASH_LOOKUP_CHUNK]
+        existing.update(
+            r[0] for r in cursor.execute(
+                f"SELECT import_hash FROM transactions WHERE import_hash IN ({', '.join('?' * len(chunk))})",
+                chunk
+            )
+        )
+    
+    singles = []
+    import_hashes = []
+    for date, reference, description, debit_id, credit_id, amount, import_hash in rows:
+        if import_hash in existing:
+            continue
+        existing.add(import_hash)  # also drops repeats within the batch
+        singles.append((len(singles), date, reference, description, debit_id, credit_id, amount, 'posted'))
+        import_hashes.append(import_hash)
+    
+    if singles:
+        _post_transaction_batch(cursor, singles, [], created_by, import_hashes)
+    return len(singles), len(rows) - len(singles)
+
+# Invoice model
+def _invoices_query(status=None, client_id=None, start_date=None, end_date=None):
+    """Build the filtered invoice listing query shared by get/iter_invoices"""
     params = []
     where_clauses = ["1=1"]
     
@@ -272,18 +875,32 @@ def get_invoices(status=None, client_id=None, start_date=None, end_date=None):
         SELECT 
             i.*,
             c.name as client_name,
-            c.email as client_email,
-            (SELECT COALESCE(SUM(p.amount), 0) 
-             FROM payments p 
-             WHERE p.invoice_id = i.id AND p.status = 'completed') as amount_paid
+            c.email as client_email
         FROM invoices i
         LEFT JOIN clients c ON i.client_id = c.id
         WHERE {' AND '.join(where_clauses)}
         ORDER BY i.date DESC, i.invoice_number DESC
     """
+    return query, params
+
+def get_invoices(status=None, client_id=None, start_date=None, end_date=None):
+    """
+    Get invoices with optional filtering
     
+    Args:
+        status: Filter by status (draft, sent, paid, overdue, cancelled)
+        client_id: Filter by client ID
+        start_date: Filter invoices on or after this date (YYYY-MM-DD)
+        end_date: Filter invoices on or before this date (YYYY-MM-DD)
+    """
+    query, params = _invoices_query(status, client_id, start_date, end_date)
     return execute_query(query, tuple(params), fetchall=True)
 
+def iter_invoices(status=None, client_id=None, start_date=None, end_date=None, as_dict=True):
+    """Stream invoices with the same filters as get_invoices"""
+    query, params = _invoices_query(status, client_id, start_date, end_date)
+    return iter_query(query, tuple(params), as_dict=as_dict)
+
 def get_invoice(invoice_id):
     """Get a single invoice with all details"""
     return execute_query(
@@ -294,9 +911,6 @@ def get_invoice(invoice_id):
             c.email as client_email,
             c.phone as client_phone,
             c.address as client_address,
-            (SELECT COALESCE(SUM(p.amount), 0) 
-             FROM payments p 
-             WHERE p.invoice_id = i.id AND p.status = 'completed') as amount_paid,
             u.username as created_by_username
         FROM invoices i
         LEFT JOIN clients c ON i.client_id = c.id
@@ -307,6 +921,288 @@ def get_invoice(invoice_id):
         fetchone=True
     )
 
+
+INVOICE_STATUSES = ('draft', 'sent', 'paid', 'overdue', 'cancelled')
+
+# sort key: column (or expression) pages are ordered by, ahead of invoice_number
+INVOICE_SORTS = {
+    'date': 'i.date',
+    'number': 'i.invoice_number',
+    'total': 'i.total',
+    'due_date': 'COALESCE(i.due_date, i.date)',
+}
+
+def _encode_invoice_cursor(sort, value, invoice_number):
+    raw = json.dumps([sort, value, invoice_number], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def _decode_invoice_cursor(token, sort):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        cursor_sort, value, invoice_number = json.loads(raw)
+        if cursor_sort != sort:
+            raise ValueError
+        return (float(value) if sort == 'total' else str(value)), str(invoice_number)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+def _invoice_facets(status, client_id, start_date, end_date, min_total, max_total, facet_limit):
+    """
+    Counts by status and by client for the invoices matching the filters
+    
+    The status counts leave out the status filter, so they show what picking
+    another status would return; the client counts leave out the client
+    filter, except that once a client is picked only that client is counted.
+    Both come from one grouped query over (status, client) pairs: the
+    maintained invoice_facet_counts when there is no date or amount filter,
+    otherwise the filtered range of an index.
+    """
+    params = []
+    where_clauses = ["1=1"]
+    if client_id:
+        where_clauses.append("client_id = ?")
+        params.append(client_id)
+    if start_date:
+        where_clauses.append("date >= ?")
+        params.append(start_date)
+    if end_date:
+        where_clauses.append("date <= ?")
+        params.append(end_date)
+    if min_total is not None:
+        where_clauses.append("total >= ?")
+        params.append(min_total)
+    if max_total is not None:
+        where_clauses.append("total <= ?")
+        params.append(max_total)
+    
+    if len(params) > (1 if client_id else 0):
+        pairs = f"""
+            SELECT status, COALESCE(client_id, 0) AS client_id, COUNT(*) AS invoices
+            FROM invoices WHERE {' AND '.join(where_clauses)}
+            GROUP BY status, COALESCE(client_id, 0)
+        """
+    else:
+        pairs = f"""
+            SELECT status, client_id, invoices FROM invoice_facet_counts
+            WHERE invoices > 0{' AND client_id = ?' if client_id else ''}
+        """
+    
+    rows = execute_query(
+        f"""
+        WITH pairs AS ({pairs})
+        SELECT 'status' AS facet, status AS value, NULL AS name, SUM(invoices) AS count
+        FROM pairs GROUP BY status
+        UNION ALL
+        SELECT * FROM (
+            SELECT 'client', p.client_id, c.name, SUM(p.invoices) AS count
+            FROM pairs p
+            LEFT JOIN clients c ON c.id = p.client_id
+            {'WHERE p.status = ?' if status else ''}
+            GROUP BY p.client_id
+            ORDER BY count DESC, p.client_id
+            LIMIT ?
+        )
+        """,
+        (*params, *([status] if status else []), facet_limit),
+        fetchall=True
+    )
+    
+    by_status = dict.fromkeys(INVOICE_STATUSES, 0)
+    clients = []
+    for row in rows:
+        if row['facet'] == 'status':
+            by_status[row['value']] = row['count']
+        else:
+            clients.append({'client_id': row['value'] or None, 'client_name': row['name'], 'count': row['count']})
+    return {
+        'status': by_status,
+        'client': clients,
+        'total': by_status.get(status, 0) if status else sum(by_status.values())
+    }
+
+def search_invoices(status=None, client_id=None, start_date=None, end_date=None,
+                    min_total=None, max_total=None, sort='date', order='desc',
+                    limit=50, cursor=None, facet_limit=20):
+    """
+    Get one page of matching invoices plus facet counts, using keyset pagination
+    
+    Pages are ordered by the sort column and then invoice_number (unique),
+    and each page seeks past the last row of the previous one, as in
+    get_transactions_page.
+    
+    Args:
+        status: Filter by status
+        client_id: Filter by client ID
+        start_date: Filter invoices on or after this date (YYYY-MM-DD)
+        end_date: Filter invoices on or before this date (YYYY-MM-DD)
+        min_total: Filter invoices with a total of at least this amount
+        max_total: Filter invoices with a total of at most this amount
+        sort: date, number, total or due_date (the invoice date when it has none)
+        order: asc or desc
+        limit: Page size
+        cursor: next_cursor from the previous page, or None for the first page
+        facet_limit: Number of clients listed in the client facet, largest first
+    
+    Returns:
+        {'data': [...], 'next_cursor': token or None, 'facets': {'status':
+        {status: count}, 'client': [{'client_id', 'client_name', 'count'}],
+        'total': invoices matching every filter}}
+    """
+    if sort not in INVOICE_SORTS:
+        raise ValueError(f"Invalid sort. Must be one of {list(INVOICE_SORTS)}")
+    if order not in ('asc', 'desc'):
+        raise ValueError("Invalid order. Must be asc or desc")
+    if status and status not in INVOICE_STATUSES:
+        raise ValueError(f"Invalid status. Must be one of {list(INVOICE_STATUSES)}")
+    for value in (start_date, end_date):
+        if value:
+            try:
+                datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                raise ValueError("Dates must be YYYY-MM-DD")
+    
+    params = []
+    where_clauses = ["1=1"]
+    
+    if status:
+        where_clauses.append("i.status = ?")
+        params.append(status)
+    
+    if client_id:
+        where_clauses.append("i.client_id = ?")
+        params.append(client_id)
+    
+    if start_date:
+        where_clauses.append("i.date >= ?")
+        params.append(start_date)
+    
+    if end_date:
+        where_clauses.append("i.date <= ?")
+        params.append(end_date)
+    
+    if min_total is not None:
+        where_clauses.append("i.total >= ?")
+        params.append(min_total)
+    
+    if max_total is not None:
+        where_clauses.append("i.total <= ?")
+        params.append(max_total)
+    
+    column = INVOICE_SORTS[sort]
+    if cursor:
+        where_clauses.append(f"({column}, i.invoice_number) {'<' if order == 'desc' else '>'} (?, ?)")
+        params.extend(_decode_invoice_cursor(cursor, sort))
+    
+    direction = order.upper()
+    rows = execute_query(
+        f"""
+        SELECT i.*, c.name as client_name, c.email as client_email, {column} AS sort_value
+        FROM invoices i
+        LEFT JOIN clients c ON i.client_id = c.id
+        WHERE {' AND '.join(where_clauses)}
+        ORDER BY {column} {direction}, i.invoice_number {direction}
+        LIMIT ?
+        """,
+        (*params, limit + 1),  # one extra row tells us whether another page exists
+        fetchall=True
+    )
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_invoice_cursor(sort, rows[-1]['sort_value'], rows[-1]['invoice_number'])
+    for row in rows:
+        del row['sort_value']
+    
+    return {
+        'data': rows,
+        'next_cursor': next_cursor,
+        'facets': _invoice_facets(status, client_id, start_date, end_date, min_total, max_total, facet_limit)
+    }
+
+def _invoice_amounts(invoices):
+    """
+    (subtotal, tax, total, item amounts) for each invoice, in one pass
+
+    Every line of every invoice is priced in a single flat pass over all
+    items; each invoice then takes its slice of the line amounts.
+    """
+    lines = [item for invoice in invoices for item in invoice['items']]
+    amounts = [item['quantity'] * item['unit_price'] for item in lines]
+    taxable = [amount if item.get('taxable', False) else 0 for item, amount in zip(lines, amounts)]
+    
+    results = []
+    offset = 0
+    for invoice in invoices:
+        count = len(invoice['items'])
+        subtotal = sum(amounts[offset:offset + count])
+        tax = sum(taxable[offset:offset + count]) * invoice['tax_rate']
+        results.append((subtotal, tax, subtotal + tax - invoice['discount'], amounts[offset:offset + count]))
+        offset += count
+    return results
+
+def validate_invoice_items(items):
+    """Normalize invoice line items (description, quantity, unit_price, taxable), or raise ValueError"""
+    if not isinstance(items, list) or not items:
+        raise ValueError("At least one item is required")
+    lines = []
+    for line in items:
+        if not isinstance(line, dict) or not line.get('description'):
+            raise ValueError("Each item needs a description")
+        try:
+            quantity = float(line.get('quantity', 1))
+            unit_price = float(line['unit_price'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Each item needs a numeric quantity and unit_price")
+        lines.append({
+            'description': line['description'],
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'taxable': bool(line.get('taxable', False))
+        })
+    return lines
+
+def _validate_invoice_terms(tax_rate, discount):
+    try:
+        return float(tax_rate or 0), float(discount or 0)
+    except (TypeError, ValueError):
+        raise ValueError("tax_rate and discount must be numbers")
+
+def _validate_invoice(item):
+    """Normalize one invoice dict for create_invoices_batch, or raise ValueError"""
+    if not isinstance(item, dict):
+        raise ValueError("Invoice must be an object")
+    
+    invoice_number = item.get('invoice_number')
+    if not isinstance(invoice_number, str) or not invoice_number.strip():
+        raise ValueError("invoice_number is required")
+    
+    for field in ('date', 'due_date'):
+        value = item.get(field)
+        if value is None and field == 'due_date':
+            continue
+        try:
+            datetime.strptime(value, '%Y-%m-%d')
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid {field}, expected YYYY-MM-DD")
+    
+    status = item.get('status', 'draft')
+    if status not in INVOICE_STATUSES:
+        raise ValueError(f"Invalid status. Must be one of {list(INVOICE_STATUSES)}")
+    
+    tax_rate, discount = _validate_invoice_terms(item.get('tax_rate'), item.get('discount'))
+    return {
+        'invoice_number': invoice_number.strip(),
+        'client_id': item.get('client_id'),
+        'date': item['date'],
+        'due_date': item.get('due_date'),
+        'items': validate_invoice_items(item.get('items')),
+        'tax_rate': tax_rate,
+        'discount': discount,
+        'notes': item.get('notes'),
+        'status': status
+    }
+
 def create_invoice(
     invoice_number, client_id, date, due_date, items, 
     tax_rate, discount, notes, status, created_by
@@ -326,74 +1222,144 @@ def create_invoice(
         status: Invoice status (draft, sent, paid, overdue, cancelled)
         created_by: ID of the user creating the invoice
     """
-    # Calculate subtotal, tax, and total
-    subtotal = sum(item['quantity'] * item['unit_price'] for item in items)
-    taxable_amount = sum(
-        item['quantity'] * item['unit_price'] 
-        for item in items 
-        if item.get('taxable', False)
+    invoice = {
+        'invoice_number': invoice_number, 'client_id': client_id, 'date': date, 'due_date': due_date,
+        'items': items, 'tax_rate': tax_rate, 'discount': discount, 'notes': notes, 'status': status
+    }
+    try:
+        return get_posting_writer().post(_post_invoice_batch, [(0, invoice)], created_by)[0][1]
+    except Exception as e:
+        raise ValueError(f"Failed to create invoice: {str(e)}")
+
+def create_invoices_batch(invoices, created_by, mode='atomic'):
+    """
+    Create many invoices with their items in a single database transaction
+    
+    Args:
+        invoices: List of invoice dictionaries (invoice_number, client_id, date,
+            due_date, items, tax_rate, discount, notes, status), items as for
+            create_invoice
+        created_by: ID of the user creating the invoices
+        mode: 'atomic' writes nothing if any invoice is invalid; 'partial'
+            writes the valid ones and reports the invalid ones
+    
+    Returns:
+        {'ids': [new id or None, per invoice], 'errors': [{'index': i, 'error': message}]}
+    """
+    if mode not in BATCH_MODES:
+        raise ValueError(f"Invalid mode. Must be one of {list(BATCH_MODES)}")
+    if not isinstance(invoices, list) or not invoices:
+        raise ValueError("No invoices provided")
+    
+    valid = []
+    errors = []
+    seen = set()
+    for index, item in enumerate(invoices):
+        try:
+            invoice = _validate_invoice(item)
+            if invoice['invoice_number'] in seen:
+                raise ValueError(f"Duplicate invoice number {invoice['invoice_number']} in batch")
+            seen.add(invoice['invoice_number'])
+            valid.append((index, invoice))
+        except ValueError as e:
+            errors.append({'index': index, 'error': str(e)})
+    
+    ids = [None] * len(invoices)
+    if (errors and mode == 'atomic') or not valid:
+        return {'ids': ids, 'errors': errors}
+    
+    try:
+        created = get_posting_writer().post(_post_invoice_batch, valid, created_by, mode == 'partial')
+    except Exception as e:
+        raise ValueError(f"Failed to create invoices: {str(e)}")
+    
+    for index, invoice_id in created:
+        if isinstance(invoice_id, int):
+            ids[index] = invoice_id
+        else:
+            errors.append({'index': index, 'error': invoice_id})
+    errors.sort(key=lambda error: error['index'])
+    return {'ids': ids, 'errors': errors}
+
+def _post_invoice_batch(cursor, invoices, created_by, skip_existing=False):
+    """
+    Write validated invoices, their items and history rows (runs on the posting writer)
+    
+    Returns (index, new id) per invoice; with skip_existing, invoices whose
+    number is already taken get (index, error message) instead of failing
+    the whole batch.
+    """
+    numbers = [invoice['invoice_number'] for _, invoice in invoices]
+    existing = set()
+    for start in range(0, len(numbers), _HASH_LOOKUP_CHUNK):
+        chunk = numbers[start:start + _HASH_LOOKUP_CHUNK]
+        existing.update(
+            r[0] for r in cursor.execute(
+                f"SELECT invoice_number FROM invoices WHERE invoice_number IN ({', '.join('?' * len(chunk))})",
+                chunk
+            )
+        )
+    if existing and not skip_existing:
+        raise ValueError(f"Invoice number already exists: {', '.join(sorted(existing))}")
+    rejected = [(index, "Invoice number already exists") for index, invoice in invoices if invoice['invoice_number'] in existing]
+    invoices = [(index, invoice) for index, invoice in invoices if invoice['invoice_number'] not in existing]
+    if not invoices:
+        return rejected
+    
+    amounts = _invoice_amounts([invoice for _, invoice in invoices])
+    
+    # Headers in one executemany. The writer holds the write lock, so
+    # AUTOINCREMENT hands out consecutive ids after the current sequence value.
+    row = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'invoices'").fetchone()
+    first_id = (row[0] if row else 0) + 1
+    cursor.executemany(
+        """
+        INSERT INTO invoices 
+        (invoice_number, client_id, date, due_date, subtotal, 
+         tax_rate, tax_amount, discount, total, balance_due, notes, status, created_by,
+         recurring_id, period)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        [
+            (
+                invoice['invoice_number'], invoice['client_id'], invoice['date'], invoice['due_date'], subtotal,
+                invoice['tax_rate'], tax, invoice['discount'], total, total, invoice['notes'], invoice['status'], created_by,
+                invoice.get('recurring_id'), invoice.get('period')
+            )
+            for (_, invoice), (subtotal, tax, total, _) in zip(invoices, amounts)
+        ]
     )
-    tax = taxable_amount * tax_rate
-    total = subtotal + tax - discount
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    last_id = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'invoices'").fetchone()[0]
+    if last_id != first_id + len(invoices) - 1:
+        raise ValueError("Invoice ids were not allocated consecutively")
     
-    try:
-        cursor.execute("BEGIN TRANSACTION")
-        
-        # Create invoice
-        invoice_id = execute_query(
-            """
-            INSERT INTO invoices 
-            (invoice_number, client_id, date, due_date, subtotal, 
-             tax_rate, tax_amount, discount, total, notes, status, created_by)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
+    cursor.executemany(
+        """
+        INSERT INTO invoice_items 
+        (invoice_id, description, quantity, unit_price, taxable, amount)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        [
             (
-                invoice_number, client_id, date, due_date, subtotal,
-                tax_rate, tax, discount, total, notes, status, created_by
-            ),
-            commit=False
-        )
-        
-        # Add invoice items
-        for item in items:
-            execute_query(
-                """
-                INSERT INTO invoice_items 
-                (invoice_id, description, quantity, unit_price, taxable, amount)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    invoice_id, item['description'], item['quantity'],
-                    item['unit_price'], 1 if item.get('taxable', False) else 0,
-                    item['quantity'] * item['unit_price']
-                ),
-                commit=False
+                first_id + n, item['description'], item['quantity'], item['unit_price'],
+                1 if item.get('taxable', False) else 0, amount
             )
-        
-        # Record initial status change
-        execute_query(
-            """
-            INSERT INTO invoice_history 
-            (invoice_id, status, changed_by, notes)
-            VALUES (?, ?, ?, ?)
-            """,
-            (invoice_id, status, created_by, "Invoice created"),
-            commit=False
-        )
-        
-        conn.commit()
-        return invoice_id
-        
-    except Exception as e:
-        conn.rollback()
-        raise ValueError(f"Failed to create invoice: {str(e)}")
-        
-    finally:
-        cursor.close()
-        conn.close()
+            for n, ((_, invoice), (_, _, _, item_amounts)) in enumerate(zip(invoices, amounts))
+            for item, amount in zip(invoice['items'], item_amounts)
+        ]
+    )
+    
+    # Record initial status change
+    cursor.executemany(
+        """
+        INSERT INTO invoice_history 
+        (invoice_id, status, changed_by, notes)
+        VALUES (?, ?, ?, ?)
+        """,
+        [(first_id + n, invoice['status'], created_by, "Invoice created") for n, (_, invoice) in enumerate(invoices)]
+    )
+    
+    return rejected + [(index, first_id + n) for n, (index, _) in enumerate(invoices)]
 
 def update_invoice_status(invoice_id, new_status, changed_by, notes=None):
     """Update invoice status and record the change"""
@@ -431,21 +1397,204 @@ def update_invoice_status(invoice_id, new_status, changed_by, notes=None):
         cursor.close()
         conn.close()
 
+# Invoices moved to overdue per write transaction; writers queue behind one batch at most
+OVERDUE_SWEEP_BATCH = int(os.getenv('OVERDUE_SWEEP_BATCH', '5000'))
+
+def _mark_overdue_batch(cursor, as_of_date, changed_by, batch_size):
+    """Move up to batch_size past-due invoices to overdue (runs on the posting writer)"""
+    last_history_id = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM invoice_history").fetchone()[0]
+    # History first: the rows it adds name exactly the invoices the UPDATE then changes
+    cursor.execute(
+        """
+        INSERT INTO invoice_history (invoice_id, status, changed_by, notes)
+        SELECT id, 'overdue', ?, 'Past due date'
+        FROM invoices
+        WHERE status = 'sent' AND COALESCE(due_date, date) < ? AND balance_due > 0.005
+        LIMIT ?
+        """,
+        (changed_by, as_of_date, batch_size)
+    )
+    if not cursor.rowcount:
+        return 0
+    cursor.execute(
+        """
+        UPDATE invoices SET status = 'overdue'
+        WHERE id IN (SELECT invoice_id FROM invoice_history WHERE id > ?)
+        """,
+        (last_history_id,)
+    )
+    return cursor.rowcount
+
+def mark_overdue_invoices(as_of_date=None, changed_by=None, batch_size=OVERDUE_SWEEP_BATCH):
+    """
+    Move every sent invoice with a balance left past its due date to overdue
+    
+    Each batch is one set-based INSERT ... SELECT into invoice_history and
+    one UPDATE, committed together on the posting writer; batches are posted
+    one after another, so other writes get in between them instead of
+    waiting for the whole sweep. Invoices without a due date are due on
+    their issue date.
+    
+    Args:
+        as_of_date: Invoices due before this date are overdue (YYYY-MM-DD, today by default)
+        changed_by: ID of the user recorded in the history, None for the scheduler
+        batch_size: Invoices changed per transaction
+    
+    Returns:
+        Number of invoices changed
+    """
+    as_of_date = as_of_date or datetime.now().strftime('%Y-%m-%d')
+    try:
+        datetime.strptime(as_of_date, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError("as_of_date must be YYYY-MM-DD")
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+    
+    writer = get_posting_writer()
+    changed = 0
+    while True:
+        try:
+            count = writer.post(_mark_overdue_batch, as_of_date, changed_by, batch_size)
+        except Exception as e:
+            raise ValueError(f"Failed to mark invoices overdue: {str(e)}")
+        changed += count
+        if count < batch_size:
+            return changed
+
+def check_invoice_balances(limit=100):
+    """
+    Compare the stored payment totals on invoices with the payments table
+    
+    Returns:
+        {'mismatched': count, 'invoices': the first `limit` mismatches, each
+        with its stored and actual amount_paid and last_payment_date}
+    """
+    rows = execute_query(
+        """
+        SELECT i.id, i.invoice_number, i.total, i.amount_paid, i.balance_due, i.last_payment_date,
+               COALESCE(p.paid, 0) AS actual_paid, p.last_date AS actual_last_payment_date
+        FROM invoices i
+        LEFT JOIN (
+            SELECT invoice_id, SUM(amount) AS paid, MAX(date) AS last_date
+            FROM payments WHERE status = 'completed'
+            GROUP BY invoice_id
+        ) p ON p.invoice_id = i.id
+        WHERE ABS(i.amount_paid - COALESCE(p.paid, 0)) > 0.005
+           OR ABS(i.balance_due - (i.total - COALESCE(p.paid, 0))) > 0.005
+           OR i.last_payment_date IS NOT p.last_date
+        ORDER BY i.id
+        """,
+        fetchall=True
+    )
+    return {'mismatched': len(rows), 'invoices': rows[:limit]}
+
+def _rebuild_invoice_balances(cursor):
+    cursor.execute(
+        """
+        UPDATE invoices SET (amount_paid, last_payment_date) = (
+            SELECT COALESCE(SUM(p.amount), 0), MAX(p.date) FROM payments p
+            WHERE p.invoice_id = invoices.id AND p.status = 'completed'
+        )
+        """
+    )
+    cursor.execute("UPDATE invoices SET balance_due = total - amount_paid")
+    return cursor.rowcount
+
+def rebuild_invoice_balances():
+    """Recompute amount_paid, balance_due and last_payment_date from payments; returns invoices rebuilt"""
+    return get_posting_writer().post(_rebuild_invoice_balances)
+
 # Report model
-def generate_report(report_type, start_date, end_date, format='json'):
+REPORT_TYPES = ['balance_sheet', 'income_statement', 'cash_flow', 'trial_balance', 'general_ledger', 'ar_aging']
+
+def generate_report(report_type, start_date, end_date, format='json', periods=None):
     """
     Generate financial reports
     
     Args:
-        report_type: Type of report (balance_sheet, income_statement, cash_flow, trial_balance)
+        report_type: Type of report (balance_sheet, income_statement, cash_flow,
+            trial_balance, general_ledger, ar_aging)
+        start_date: Start date (YYYY-MM-DD)
+        end_date: End date (YYYY-MM-DD); the as-of date for balance_sheet and ar_aging
+        format: Output format (json, csv, ndjson, xlsx); anything but json
+            returns a generator of chunks (see format_report)
+        periods: Optional 'monthly', 'quarterly' or boundary dates, for a
+            comparative report (see generate_comparative_report)
+    """
+    if report_type not in REPORT_TYPES:
+        raise ValueError(f"Invalid report type. Must be one of {REPORT_TYPES}")
+    
+    # Exports are rendered lazily as they are sent, so they bypass the cache
+    if format != 'json':
+        return _generate_report(report_type, start_date, end_date, format, periods)
+    
+    # Served from cache until the ledger changes (see report_cache.py)
+    return get_report_cache().get_or_compute(
+        (report_type, start_date, end_date, format, tuple(periods) if isinstance(periods, list) else periods),
+        lambda: _generate_report(report_type, start_date, end_date, format, periods)
+    )
+
+# Threads shared by all report bundles in this worker
+REPORT_BUNDLE_WORKERS = int(os.getenv('REPORT_BUNDLE_WORKERS', '4'))
+BUNDLE_REPORT_TYPES = ('balance_sheet', 'income_statement', 'trial_balance', 'cash_flow')
+
+_bundle_executor = None
+_bundle_executor_lock = threading.Lock()
+
+def _get_bundle_executor():
+    global _bundle_executor
+    if _bundle_executor is None:
+        with _bundle_executor_lock:
+            if _bundle_executor is None:
+                _bundle_executor = ThreadPoolExecutor(
+                    max_workers=REPORT_BUNDLE_WORKERS,
+                    thread_name_prefix='report-bundle',
+                    initializer=use_read_only_connections
+                )
+    return _bundle_executor
+
+def generate_report_bundle(report_types, start_date, end_date, format='json'):
+    """
+    Generate several reports at once, each section on its own thread
+    
+    Sections run concurrently on read-only pooled connections (SQLite
+    releases the GIL while it works), so the bundle takes about as long as
+    its slowest report rather than the sum. Each section goes through
+    generate_report and its cache.
+    
+    Args:
+        report_types: Report types to include (see generate_report)
         start_date: Start date (YYYY-MM-DD)
         end_date: End date (YYYY-MM-DD)
-        format: Output format (json, csv, pdf)
+        format: Output format passed to every report
+    
+    Returns:
+        {report_type: report} in the order requested
     """
-    valid_types = ['balance_sheet', 'income_statement', 'cash_flow', 'trial_balance', 'general_ledger']
-    if report_type not in valid_types:
-        raise ValueError(f"Invalid report type. Must be one of {valid_types}")
+    if not report_types:
+        raise ValueError("No report types requested")
+    report_types = list(dict.fromkeys(report_types))
     
+    executor = _get_bundle_executor()
+    futures = [
+        (report_type, executor.submit(generate_report, report_type, start_date, end_date, format))
+        for report_type in report_types
+    ]
+    # Wait for every section before raising, so no work outlives the request
+    errors = [future.exception() for _, future in futures]
+    for error in errors:
+        if error is not None:
+            raise error
+    return {report_type: future.result() for report_type, future in futures}
+
+def _generate_report(report_type, start_date, end_date, format, periods=None):
+    # The cache key carries the current accounts version, so the catalog
+    # must not lag behind it when the report is built
+    get_account_catalog().ensure_fresh(max_age=0)
+    
+    if periods is not None:
+        return generate_comparative_report(report_type, start_date, end_date, periods, format)
     if report_type == 'balance_sheet':
         return generate_balance_sheet(end_date, format)
     elif report_type == 'income_statement':
@@ -456,19 +1605,149 @@ def generate_report(report_type, start_date, end_date, format='json'):
         return generate_trial_balance(start_date, end_date, format)
     elif report_type == 'general_ledger':
         return generate_general_ledger(start_date, end_date, format)
+    elif report_type == 'ar_aging':
+        return generate_ar_aging(end_date, format)
 
-def generate_balance_sheet(as_of_date, format='json'):
-    """Generate a balance sheet as of a specific date"""
-    # Get all accounts with their balances
-    accounts = execute_query(
+def _report_row(account, **values):
+    """Report line for a catalog account (catalog dicts are shared and never mutated)"""
+    row = {'id': account['id'], 'code': account['code'], 'name': account['name'], 'type': account['type']}
+    row.update(values)
+    return row
+
+def _account_balances():
+    """Current balance of every active account, keyed by id"""
+    rows = execute_query("SELECT id, balance FROM accounts WHERE is_active = 1", fetchall=True)
+    return {row['id']: row['balance'] for row in rows}
+
+def _account_totals(date_condition, params):
+    """(debits, credits) per account id for postings whose date satisfies date_condition"""
+    rows = execute_query(
+        f"""
+        SELECT account_id, SUM(debit) as debits, SUM(credit) as credits
+        FROM (
+            SELECT debit_account AS account_id, amount AS debit, 0 AS credit
+            FROM transactions
+            WHERE date {date_condition} AND debit_account IS NOT NULL
+            UNION ALL
+            SELECT credit_account, 0, amount
+            FROM transactions
+            WHERE date {date_condition} AND credit_account IS NOT NULL
+            UNION ALL
+            SELECT e.account_id, e.debit, e.credit
+            FROM transaction_entries e
+            JOIN transactions t ON t.id = e.transaction_id
+            WHERE t.date {date_condition}
+        )
+        GROUP BY account_id
+        """,
+        tuple(params) * 3,
+        fetchall=True
+    )
+    return {row['account_id']: (row['debits'], row['credits']) for row in rows}
+
+def _rollup_totals(first_period, last_period):
+    """(debits, credits) per account id from account_period_totals, periods inclusive"""
+    rows = execute_query(
         """
-        SELECT id, code, name, type, balance
-        FROM accounts
-        WHERE is_active = 1
-        ORDER BY type, code
+        SELECT account_id, SUM(debits) AS debits, SUM(credits) AS credits
+        FROM account_period_totals
+        WHERE period BETWEEN ? AND ?
+        GROUP BY account_id
         """,
+        (first_period, last_period),
         fetchall=True
     )
+    return {row['account_id']: (row['debits'], row['credits']) for row in rows}
+
+def _to_cents(totals):
+    """
+    Totals rounded to the cent, as ledger_arrays hands them out
+
+    Summing float amounts leaves noise below the cent that depends on the
+    order rows were added in; rounding every engine's totals the same way
+    makes the SQL and NumPy reports equal to the last digit.
+    """
+    return {
+        account_id: (round(debits, 2), round(credits, 2))
+        for account_id, (debits, credits) in totals.items()
+    }
+
+def _merge_totals(*parts):
+    merged = {}
+    for part in parts:
+        for account_id, (debits, credits) in part.items():
+            total_debits, total_credits = merged.get(account_id, (0, 0))
+            merged[account_id] = (total_debits + debits, total_credits + credits)
+    return merged
+
+def _month_start(day):
+    return day.replace(day=1)
+
+def _next_month_start(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def _account_period_totals(start_date, end_date):
+    """
+    (debits, credits) per account id for postings dated within the range
+    
+    Whole calendar months inside the range come from account_period_totals;
+    only the partial months at either end are scanned in transactions. With
+    REPORT_ENGINE=numpy the totals come from ledger_arrays instead; both
+    round them to the cent (see _to_cents).
+    """
+    try:
+        start = datetime.strptime(start_date, '%Y-%m-%d').date()
+        end = datetime.strptime(end_date, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return _to_cents(_account_totals("BETWEEN ? AND ?", (start_date, end_date)))
+    if start > end:
+        return {}
+    
+    arrays = get_ledger_arrays()
+    if arrays is not None:
+        return arrays.period_totals(start_date, end_date)
+    
+    # First and last day of the run of whole months inside [start, end]
+    first_whole = start if start.day == 1 else _next_month_start(start)
+    end_is_month_end = _next_month_start(end) - timedelta(days=1) == end
+    after_whole = _next_month_start(end) if end_is_month_end else _month_start(end)
+    if first_whole >= after_whole:
+        return _to_cents(_account_totals("BETWEEN ? AND ?", (start_date, end_date)))
+    
+    parts = [_rollup_totals(
+        first_whole.strftime('%Y-%m'), (after_whole - timedelta(days=1)).strftime('%Y-%m')
+    )]
+    if start < first_whole:
+        parts.append(_account_totals("BETWEEN ? AND ?", (start_date, str(first_whole - timedelta(days=1)))))
+    if after_whole <= end:
+        parts.append(_account_totals("BETWEEN ? AND ?", (str(after_whole), end_date)))
+    return _to_cents(_merge_totals(*parts))
+
+def _account_totals_before(date):
+    """(debits, credits) per account id for postings dated before date"""
+    try:
+        day = datetime.strptime(date, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return _to_cents(_account_totals("< ?", (date,)))
+    
+    arrays = get_ledger_arrays()
+    if arrays is not None:
+        return arrays.totals_before(date)
+    
+    month_start = _month_start(day)
+    parts = [_rollup_totals('', (month_start - timedelta(days=1)).strftime('%Y-%m'))]
+    if month_start < day:
+        parts.append(_account_totals("BETWEEN ? AND ?", (str(month_start), str(day - timedelta(days=1)))))
+    return _to_cents(_merge_totals(*parts))
+
+def generate_balance_sheet(as_of_date, format='json'):
+    """Generate a balance sheet as of a specific date"""
+    # Get all accounts with their balances
+    balances = _account_balances()
+    accounts = [
+        _report_row(account, balance=balances.get(account['id'], 0))
+        for account in get_account_catalog().accounts(active_only=True)
+    ]
     
     # Group accounts by type
     report = {
@@ -500,27 +1779,13 @@ def generate_balance_sheet(as_of_date, format='json'):
         report['totals']['liabilities'] + report['totals']['equity']
     )
     
-    return report if format == 'json' else format_report(report, 'balance_sheet')
+    return report if format == 'json' else format_report(report, 'balance_sheet', format)
 
 def generate_income_statement(start_date, end_date, format='json'):
     """Generate an income statement for a date range"""
     # Get revenue and expense accounts with their activity
-    accounts = execute_query(
-        """
-        SELECT 
-            a.id, a.code, a.name, a.type,
-            COALESCE(SUM(CASE WHEN t.debit_account = a.id THEN t.amount ELSE 0 END), 0) as debits,
-            COALESCE(SUM(CASE WHEN t.credit_account = a.id THEN t.amount ELSE 0 END), 0) as credits
-        FROM accounts a
-        LEFT JOIN transactions t ON t.date BETWEEN ? AND ?
-            AND (t.debit_account = a.id OR t.credit_account = a.id)
-        WHERE a.type IN ('Revenue', 'Expense')
-        GROUP BY a.id, a.code, a.name, a.type
-        ORDER BY a.type, a.code
-        """,
-        (start_date, end_date),
-        fetchall=True
-    )
+    totals = _account_period_totals(start_date, end_date)
+    accounts = get_account_catalog().accounts(types=('Revenue', 'Expense'))
     
     report = {
         'start_date': start_date,
@@ -535,43 +1800,41 @@ def generate_income_statement(start_date, end_date, format='json'):
     }
     
     for account in accounts:
+        debits, credits = totals.get(account['id'], (0, 0))
         if account['type'] == 'Revenue':
-            amount = account['credits'] - account['debits']
-            account['amount'] = amount
-            report['revenue'].append(account)
+            amount = credits - debits
+            report['revenue'].append(_report_row(account, debits=debits, credits=credits, amount=amount))
             report['totals']['revenue'] += amount
         else:  # Expense
-            amount = account['debits'] - account['credits']
-            account['amount'] = amount
-            report['expenses'].append(account)
+            amount = debits - credits
+            report['expenses'].append(_report_row(account, debits=debits, credits=credits, amount=amount))
             report['totals']['expenses'] += amount
     
     report['totals']['net_income'] = (
         report['totals']['revenue'] - report['totals']['expenses']
     )
     
-    return report if format == 'json' else format_report(report, 'income_statement')
+    return report if format == 'json' else format_report(report, 'income_statement', format)
 
 def generate_cash_flow_statement(start_date, end_date, format='json'):
     """Generate a cash flow statement for a date range"""
     # Get beginning and ending cash balances
-    cash_accounts = execute_query(
-        """
-        SELECT id, code, name, balance
-        FROM accounts
-        WHERE type = 'Asset' AND name LIKE '%Cash%' AND is_active = 1
-        """,
-        fetchall=True
-    )
+    balances = _account_balances()
+    cash_accounts = [
+        _report_row(account, balance=balances.get(account['id'], 0))
+        for account in get_account_catalog().accounts(types=('Asset',), active_only=True)
+        if 'cash' in account['name'].lower()
+    ]
     
     if not cash_accounts:
         raise ValueError("No cash accounts found")
     
-    # Get cash transactions grouped by category
+    # Get cash transactions grouped by category (one scan shared by all three)
+    totals = _account_period_totals(start_date, end_date)
     cash_flows = {
-        'operating': get_cash_flows_by_activity('operating', start_date, end_date),
-        'investing': get_cash_flows_by_activity('investing', start_date, end_date),
-        'financing': get_cash_flows_by_activity('financing', start_date, end_date)
+        'operating': get_cash_flows_by_activity('operating', start_date, end_date, totals),
+        'investing': get_cash_flows_by_activity('investing', start_date, end_date, totals),
+        'financing': get_cash_flows_by_activity('financing', start_date, end_date, totals)
     }
     
     # Calculate net cash flow
@@ -589,27 +1852,16 @@ def generate_cash_flow_statement(start_date, end_date, format='json'):
         'ending_cash': sum(acc['balance'] for acc in cash_accounts)
     }
     
-    return report if format == 'json' else format_report(report, 'cash_flow')
+    return report if format == 'json' else format_report(report, 'cash_flow', format)
 
 def generate_trial_balance(start_date, end_date, format='json'):
     """Generate a trial balance for a date range"""
-    trial_balance = execute_query(
-        """
-        SELECT 
-            a.id, a.code, a.name, a.type,
-            COALESCE(SUM(CASE WHEN t.debit_account = a.id THEN t.amount ELSE 0 END), 0) as debits,
-            COALESCE(SUM(CASE WHEN t.credit_account = a.id THEN t.amount ELSE 0 END), 0) as credits
-        FROM accounts a
-        LEFT JOIN transactions t ON t.date BETWEEN ? AND ?
-            AND (t.debit_account = a.id OR t.credit_account = a.id)
-        WHERE a.is_active = 1
-        GROUP BY a.id, a.code, a.name, a.type
-        HAVING debits != 0 OR credits != 0
-        ORDER BY a.type, a.code
-        """,
-        (start_date, end_date),
-        fetchall=True
-    )
+    totals = _account_period_totals(start_date, end_date)
+    trial_balance = []
+    for account in get_account_catalog().accounts(active_only=True):
+        debits, credits = totals.get(account['id'], (0, 0))
+        if debits != 0 or credits != 0:
+            trial_balance.append(_report_row(account, debits=debits, credits=credits))
     
     # Calculate totals
     total_debits = sum(account['debits'] for account in trial_balance)
@@ -626,58 +1878,385 @@ def generate_trial_balance(start_date, end_date, format='json'):
         }
     }
     
-    return report if format == 'json' else format_report(report, 'trial_balance')
+    return report if format == 'json' else format_report(report, 'trial_balance', format)
 
-def generate_general_ledger(start_date, end_date, format='json'):
-    """Generate a general ledger for a date range"""
-    ledger = {}
+# Columns allowed in one comparative report
+MAX_REPORT_PERIODS = int(os.getenv('MAX_REPORT_PERIODS', '60'))
+COMPARATIVE_REPORT_TYPES = ('income_statement', 'trial_balance')
+
+def _add_months(month_start, months):
+    index = month_start.year * 12 + month_start.month - 1 + months
+    return month_start.replace(year=index // 12, month=index % 12 + 1)
+
+def report_periods(start_date, end_date, periods):
+    """
+    Split a date range into report columns
     
-    # Get all accounts
-    accounts = execute_query(
-        "SELECT id, code, name, type FROM accounts WHERE is_active = 1 ORDER BY code",
-        fetchall=True
-    )
+    Args:
+        start_date: Start date (YYYY-MM-DD)
+        end_date: End date (YYYY-MM-DD)
+        periods: 'monthly' or 'quarterly' (calendar periods, the first and
+            last clipped to the range), or a list of dates each starting a
+            new column after the first
     
-    # Get transactions for each account
-    for account in accounts:
-        transactions = execute_query(
-            """
-            SELECT 
-                t.id, t.date, t.reference, t.description,
-                CASE WHEN t.debit_account = ? THEN t.amount ELSE 0 END as debit,
-                CASE WHEN t.credit_account = ? THEN t.amount ELSE 0 END as credit,
-                u.username as created_by
-            FROM transactions t
-            JOIN users u ON t.created_by = u.id
-            WHERE (t.debit_account = ? OR t.credit_account = ?)
-                AND t.date BETWEEN ? AND ?
-            ORDER BY t.date, t.id
+    Returns:
+        List of {'label', 'start_date', 'end_date'}
+    """
+    try:
+        start = datetime.strptime(start_date, '%Y-%m-%d').date()
+        end = datetime.strptime(end_date, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ValueError("start_date and end_date are required as YYYY-MM-DD")
+    if start > end:
+        raise ValueError("start_date must not be after end_date")
+    
+    columns = []
+    if periods in ('monthly', 'quarterly'):
+        months = 1 if periods == 'monthly' else 3
+        period_start = _month_start(start)
+        if months == 3:
+            period_start = period_start.replace(month=(period_start.month - 1) // 3 * 3 + 1)
+        while period_start <= end:
+            next_start = _add_months(period_start, months)
+            if periods == 'monthly':
+                label = period_start.strftime('%Y-%m')
+            else:
+                label = f"{period_start.year}-Q{(period_start.month - 1) // 3 + 1}"
+            columns.append((label, max(start, period_start), min(end, next_start - timedelta(days=1))))
+            period_start = next_start
+    elif isinstance(periods, (list, tuple)) and periods:
+        try:
+            boundaries = sorted({datetime.strptime(value, '%Y-%m-%d').date() for value in periods})
+        except (TypeError, ValueError):
+            raise ValueError("Period boundaries must be dates as YYYY-MM-DD")
+        if boundaries[0] <= start or boundaries[-1] > end:
+            raise ValueError("Period boundaries must fall after start_date and on or before end_date")
+        starts = [start, *boundaries]
+        ends = [day - timedelta(days=1) for day in boundaries] + [end]
+        columns = [(str(first), first, last) for first, last in zip(starts, ends)]
+    else:
+        raise ValueError("periods must be 'monthly', 'quarterly' or a list of boundary dates")
+    
+    if len(columns) > MAX_REPORT_PERIODS:
+        raise ValueError(f"Too many periods ({len(columns)}); at most {MAX_REPORT_PERIODS} are allowed")
+    return [
+        {'label': label, 'start_date': str(first), 'end_date': str(last)}
+        for label, first, last in columns
+    ]
+
+# Date ranges per statement; each adds three SELECTs and SQLite allows 500 per compound
+_RANGES_PER_QUERY = 150
+
+def _account_totals_by_range(ranges):
+    """
+    (debits, credits) per account id for each (start_date, end_date, column)
+    
+    Each range is an index seek tagged with its column, and all of them are
+    grouped in one statement. Returns {column: {account_id: (debits, credits)}}.
+    """
+    totals = {}
+    for offset in range(0, len(ranges), _RANGES_PER_QUERY):
+        chunk = ranges[offset:offset + _RANGES_PER_QUERY]
+        arms = []
+        params = []
+        for first, last, index in chunk:
+            arms.append("""
+                SELECT debit_account AS account_id, ? AS bucket, amount AS debit, 0 AS credit
+                FROM transactions
+                WHERE date BETWEEN ? AND ? AND debit_account IS NOT NULL
+                UNION ALL
+                SELECT credit_account, ?, 0, amount
+                FROM transactions
+                WHERE date BETWEEN ? AND ? AND credit_account IS NOT NULL
+                UNION ALL
+                SELECT e.account_id, ?, e.debit, e.credit
+                FROM transaction_entries e
+                JOIN transactions t ON t.id = e.transaction_id
+                WHERE t.date BETWEEN ? AND ?
+            """)
+            params.extend((index, first, last) * 3)
+        rows = execute_query(
+            f"""
+            SELECT account_id, bucket, SUM(debit) as debits, SUM(credit) as credits
+            FROM ({" UNION ALL ".join(arms)})
+            GROUP BY account_id, bucket
             """,
-            (account['id'], account['id'], account['id'], account['id'], start_date, end_date),
+            tuple(params),
             fetchall=True
         )
+        for row in rows:
+            totals.setdefault(row['bucket'], {})[row['account_id']] = (row['debits'], row['credits'])
+    return totals
+
+def _account_totals_by_period(periods):
+    """
+    (debits, credits) per account id for each of report_periods' columns
+    
+    The cost does not grow with the number of columns: whole months of
+    every column come from one grouped read of account_period_totals, and
+    all the partial months are bucketed in a single scan of transactions.
+    """
+    arrays = get_ledger_arrays()
+    if arrays is not None:
+        return arrays.totals_by_period([(period['start_date'], period['end_date']) for period in periods])
+    
+    month_columns = {}
+    edges = []
+    for index, period in enumerate(periods):
+        start = datetime.strptime(period['start_date'], '%Y-%m-%d').date()
+        end = datetime.strptime(period['end_date'], '%Y-%m-%d').date()
+        first_whole = start if start.day == 1 else _next_month_start(start)
+        end_is_month_end = _next_month_start(end) - timedelta(days=1) == end
+        after_whole = _next_month_start(end) if end_is_month_end else _month_start(end)
+        if first_whole >= after_whole:
+            edges.append((str(start), str(end), index))
+            continue
+        month = first_whole
+        while month < after_whole:
+            month_columns[month.strftime('%Y-%m')] = index
+            month = _next_month_start(month)
+        if start < first_whole:
+            edges.append((str(start), str(first_whole - timedelta(days=1)), index))
+        if after_whole <= end:
+            edges.append((str(after_whole), str(end), index))
+    
+    columns = [{} for _ in periods]
+    if month_columns:
+        # One row per account and month, so read plain tuples rather than dicts
+        rows = iter_query(
+            """
+            SELECT account_id, period, debits, credits
+            FROM account_period_totals
+            WHERE period BETWEEN ? AND ?
+            """,
+            (min(month_columns), max(month_columns)),
+            as_dict=False
+        )
+        for account_id, period, debits, credits in rows:
+            index = month_columns.get(period)
+            if index is None:
+                continue  # a month split between two columns; scanned as edges
+            column = columns[index]
+            if account_id in column:
+                total_debits, total_credits = column[account_id]
+                column[account_id] = (total_debits + debits, total_credits + credits)
+            else:
+                column[account_id] = (debits, credits)
+    if edges:
+        for index, totals in _account_totals_by_range(edges).items():
+            columns[index] = _merge_totals(columns[index], totals)
+    return [_to_cents(column) for column in columns]
+
+def _with_variance(values):
+    """Values per column with their total and the change from the previous column"""
+    variance = [None] + [current - previous for previous, current in zip(values, values[1:])]
+    variance_pct = [None] + [
+        round((current - previous) / abs(previous) * 100, 2) if previous else None
+        for previous, current in zip(values, values[1:])
+    ]
+    return {'amounts': values, 'total': sum(values), 'variance': variance, 'variance_pct': variance_pct}
+
+def generate_comparative_report(report_type, start_date, end_date, periods, format='json'):
+    """
+    Income statement or trial balance with one column per period
+    
+    Every account line and total carries 'amounts' (one per period),
+    'total', and 'variance' / 'variance_pct' against the previous period
+    (None for the first). Trial balance amounts are debits minus credits;
+    the debits and credits behind them are listed too.
+    
+    Args:
+        report_type: income_statement or trial_balance
+        start_date: Start date (YYYY-MM-DD)
+        end_date: End date (YYYY-MM-DD)
+        periods: 'monthly', 'quarterly' or boundary dates (see report_periods)
+        format: Output format, as for generate_report
+    """
+    if report_type not in COMPARATIVE_REPORT_TYPES:
+        raise ValueError(f"Periods are supported for {list(COMPARATIVE_REPORT_TYPES)}")
+    columns = report_periods(start_date, end_date, periods)
+    totals = _account_totals_by_period(columns)
+    
+    report = {
+        'start_date': start_date,
+        'end_date': end_date,
+        'periods': columns
+    }
+    
+    if report_type == 'income_statement':
+        sections = {'revenue': [], 'expenses': []}
+        for account in get_account_catalog().accounts(types=('Revenue', 'Expense')):
+            activity = [column.get(account['id'], (0, 0)) for column in totals]
+            if account['type'] == 'Revenue':
+                amounts = [credits - debits for debits, credits in activity]
+                sections['revenue'].append(_report_row(account, **_with_variance(amounts)))
+            else:
+                amounts = [debits - credits for debits, credits in activity]
+                sections['expenses'].append(_report_row(account, **_with_variance(amounts)))
         
-        if transactions:
-            # Calculate running balance
-            balance = 0
-            for txn in transactions:
-                balance += txn['debit'] - txn['credit']
-                txn['balance'] = balance
-            
-            ledger[account['id']] = {
-                'account': account,
-                'beginning_balance': 0,  # Would need to calculate from previous periods
-                'transactions': transactions,
-                'ending_balance': balance
+        revenue = [sum(column) for column in zip(*(row['amounts'] for row in sections['revenue']))] or [0] * len(columns)
+        expenses = [sum(column) for column in zip(*(row['amounts'] for row in sections['expenses']))] or [0] * len(columns)
+        report.update(sections)
+        report['totals'] = {
+            'revenue': _with_variance(revenue),
+            'expenses': _with_variance(expenses),
+            'net_income': _with_variance([r - e for r, e in zip(revenue, expenses)])
+        }
+    else:
+        accounts = []
+        for account in get_account_catalog().accounts(active_only=True):
+            activity = [column.get(account['id'], (0, 0)) for column in totals]
+            if any(debits or credits for debits, credits in activity):
+                accounts.append(_report_row(
+                    account,
+                    debits=[debits for debits, _ in activity],
+                    credits=[credits for _, credits in activity],
+                    **_with_variance([debits - credits for debits, credits in activity])
+                ))
+        debits = [sum(column) for column in zip(*(row['debits'] for row in accounts))] or [0] * len(columns)
+        credits = [sum(column) for column in zip(*(row['credits'] for row in accounts))] or [0] * len(columns)
+        report['accounts'] = accounts
+        report['totals'] = {
+            'debits': _with_variance(debits),
+            'credits': _with_variance(credits),
+            'difference': _with_variance([d - c for d, c in zip(debits, credits)])
+        }
+    
+    return report if format == 'json' else format_report(report, report_type, format)
+
+def iter_general_ledger(start_date, end_date):
+    """
+    Stream the general ledger as flat rows, account by account in code order
+    
+    Each account listed gets an 'opening' row carrying its balance brought
+    forward, one 'posting' row per line in the period (date, id order) with
+    the running balance, and a 'closing' row with the period's debit and
+    credit totals. Accounts with no activity and a zero opening balance are
+    left out. Opening balances come from one aggregate over earlier postings
+    and the period is read in a single ordered scan, so only one row is held
+    at a time.
+    """
+    opening = _account_totals_before(start_date)
+    
+    postings = iter_query(
+        """
+        SELECT 
+            p.account_id, a.code, a.name, a.type,
+            p.transaction_id, p.date, p.reference, p.description,
+            p.debit, p.credit, u.username
+        FROM (
+            SELECT debit_account AS account_id, id AS transaction_id, date, reference, description,
+                amount AS debit, 0 AS credit, created_by
+            FROM transactions
+            WHERE date BETWEEN ? AND ? AND debit_account IS NOT NULL
+            UNION ALL
+            SELECT credit_account, id, date, reference, description, 0, amount, created_by
+            FROM transactions
+            WHERE date BETWEEN ? AND ? AND credit_account IS NOT NULL
+            UNION ALL
+            SELECT e.account_id, t.id, t.date, t.reference, t.description, e.debit, e.credit, t.created_by
+            FROM transaction_entries e
+            JOIN transactions t ON t.id = e.transaction_id
+            WHERE t.date BETWEEN ? AND ?
+        ) p
+        JOIN accounts a ON a.id = p.account_id AND a.is_active = 1
+        LEFT JOIN users u ON u.id = p.created_by
+        ORDER BY a.code, p.date, p.transaction_id
+        """,
+        (start_date, end_date) * 3,
+        as_dict=False
+    )
+    
+    def section(account_id, code, name, type_, lines):
+        account = {'account_id': account_id, 'account_code': code, 'account_name': name, 'account_type': type_}
+        debits, credits = opening.get(account_id, (0, 0))
+        balance = debits - credits
+        yield {
+            **account, 'entry': 'opening', 'transaction_id': None, 'date': start_date,
+            'reference': None, 'description': 'Opening balance',
+            'debit': None, 'credit': None, 'balance': balance, 'created_by': None
+        }
+        
+        period_debits = period_credits = 0
+        for _, _, _, _, transaction_id, date, reference, description, debit, credit, username in lines:
+            balance += debit - credit
+            period_debits += debit
+            period_credits += credit
+            yield {
+                **account, 'entry': 'posting', 'transaction_id': transaction_id, 'date': date,
+                'reference': reference, 'description': description,
+                'debit': debit, 'credit': credit, 'balance': balance, 'created_by': username
+            }
+        
+        yield {
+            **account, 'entry': 'closing', 'transaction_id': None, 'date': end_date,
+            'reference': None, 'description': 'Closing balance',
+            'debit': period_debits, 'credit': period_credits, 'balance': balance, 'created_by': None
+        }
+    
+    # Accounts with an opening balance but nothing in the period are merged
+    # into the code order between the accounts the scan returns
+    idle = iter([
+        account for account in sorted(
+            get_account_catalog().accounts(active_only=True), key=lambda account: account['code']
+        )
+        if opening.get(account['id'], (0, 0))[0] != opening.get(account['id'], (0, 0))[1]
+    ])
+    next_idle = next(idle, None)
+    
+    for account_id, lines in groupby(postings, key=lambda row: row[0]):
+        first = next(lines)
+        while next_idle and next_idle['code'] < first[1]:
+            yield from section(next_idle['id'], next_idle['code'], next_idle['name'], next_idle['type'], ())
+            next_idle = next(idle, None)
+        if next_idle and next_idle['id'] == account_id:
+            next_idle = next(idle, None)
+        yield from section(account_id, first[1], first[2], first[3], chain((first,), lines))
+    
+    while next_idle:
+        yield from section(next_idle['id'], next_idle['code'], next_idle['name'], next_idle['type'], ())
+        next_idle = next(idle, None)
+
+def generate_general_ledger(start_date, end_date, format='json'):
+    """Generate a general ledger for a date range"""
+    if format != 'json':
+        return format_report(iter_general_ledger(start_date, end_date), 'general_ledger', format)
+    
+    ledger = {}
+    
+    for row in iter_general_ledger(start_date, end_date):
+        if row['entry'] == 'opening':
+            entry = ledger[row['account_id']] = {
+                'account': {
+                    'id': row['account_id'],
+                    'code': row['account_code'],
+                    'name': row['account_name'],
+                    'type': row['account_type']
+                },
+                'beginning_balance': row['balance'],
+                'transactions': []
             }
+        elif row['entry'] == 'posting':
+            entry['transactions'].append({
+                'id': row['transaction_id'],
+                'date': row['date'],
+                'reference': row['reference'],
+                'description': row['description'],
+                'debit': row['debit'],
+                'credit': row['credit'],
+                'created_by': row['created_by'],
+                'balance': row['balance']
+            })
+        else:
+            entry['ending_balance'] = row['balance']
     
     return {
         'start_date': start_date,
         'end_date': end_date,
         'accounts': ledger
-    } if format == 'json' else format_report(ledger, 'general_ledger')
+    }
 
-def get_cash_flows_by_activity(activity_type, start_date, end_date):
+def get_cash_flows_by_activity(activity_type, start_date, end_date, totals=None):
     """Helper function to get cash flows by activity type"""
     # This is a simplified example - in a real app, you'd need to properly classify accounts
     # into operating, investing, and financing activities
@@ -688,30 +2267,202 @@ def get_cash_flows_by_activity(activity_type, start_date, end_date):
     else:  # financing
         account_types = ['Liability', 'Equity']
     
-    placeholders = ','.join('?' * len(account_types))
+    if totals is None:
+        totals = _account_period_totals(start_date, end_date)
     
-    return execute_query(
+    flows = []
+    for account in get_account_catalog().accounts(types=account_types):
+        if account['id'] in totals:
+            debits, credits = totals[account['id']]
+            if debits - credits != 0:
+                flows.append(_report_row(account, amount=debits - credits))
+    return flows
+
+# (key, last day overdue); anything older than the last falls in days_over_90
+AGING_BUCKETS = [('current', 0), ('days_1_30', 30), ('days_31_60', 60), ('days_61_90', 90)]
+AGING_COLUMNS = [key for key, _ in AGING_BUCKETS] + ['days_over_90']
+
+def generate_ar_aging(as_of_date, format='json'):
+    """
+    Generate an accounts-receivable aging report as of a date
+
+    An invoice is outstanding if it was issued (not draft or cancelled) on
+    or before as_of_date and its total exceeds its completed payments dated
+    on or before as_of_date; what is left is aged by days past its due date
+    (its issue date when it has none). One query buckets every open invoice
+    and sums them per client.
+
+    Balances come from the maintained invoices.balance_due, read from the
+    partial index of open invoices. Payments dated after as_of_date are added
+    back for the few invoices that have them, so past dates stay exact.
+    """
+    try:
+        as_of = datetime.strptime(as_of_date or '', '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError("as_of_date is required as YYYY-MM-DD")
+
+    # Bucket n holds invoices due on or after cutoff n and before cutoff n - 1
+    params = {'as_of': as_of_date}
+    conditions = []
+    for number, (_, last) in enumerate(AGING_BUCKETS):
+        params[f'cutoff{number}'] = (as_of - timedelta(days=last)).isoformat()
+        conditions.append(f"due >= :cutoff{number}" + (f" AND due < :cutoff{number - 1}" if number else ""))
+    conditions.append(f"due < :cutoff{len(AGING_BUCKETS) - 1}")
+    # Plain range tests rather than a bucket number, which the planner would
+    # copy into every sum when it flattens the subquery
+    sums = ", ".join(
+        f"SUM(CASE WHEN {condition} THEN balance ELSE 0 END) AS {key}"
+        for condition, key in zip(conditions, AGING_COLUMNS)
+    )
+
+    # Invoices paid after as_of_date are aged from balance_due plus those
+    # payments; every other open invoice straight from the partial index,
+    # which is in client order so its sums stream without sorting
+    rows = execute_query(
         f"""
-        SELECT 
-            a.id, a.code, a.name, a.type,
-            SUM(CASE WHEN t.debit_account = a.id THEN t.amount ELSE -t.amount END) as amount
-        FROM accounts a
-        JOIN transactions t ON (t.debit_account = a.id OR t.credit_account = a.id)
-        WHERE a.type IN ({placeholders})
-            AND t.date BETWEEN ? AND ?
-        GROUP BY a.id, a.code, a.name, a.type
-        HAVING amount != 0
-        ORDER BY a.type, a.code
+        WITH later AS (
+            SELECT invoice_id, SUM(amount) AS amount FROM payments
+            WHERE status = 'completed' AND date > :as_of
+            GROUP BY invoice_id
+        )
+        SELECT o.client_id, c.name AS client_name, SUM(o.invoices) AS invoices,
+               {', '.join(f'ROUND(SUM(o.{key}), 2) AS {key}' for key in AGING_COLUMNS)}
+        FROM (
+            SELECT client_id, COUNT(*) AS invoices, {sums}
+            FROM (
+                SELECT client_id, COALESCE(due_date, date) AS due, balance_due AS balance
+                FROM invoices
+                WHERE status IN ('sent', 'overdue', 'paid') AND date <= :as_of
+                  AND balance_due > 0.005
+                  AND id NOT IN (SELECT invoice_id FROM later)
+            )
+            GROUP BY client_id
+            UNION ALL
+            SELECT client_id, COUNT(*), {sums}
+            FROM (
+                SELECT i.client_id, COALESCE(i.due_date, i.date) AS due, i.balance_due + l.amount AS balance
+                FROM later l
+                JOIN invoices i ON i.id = l.invoice_id
+                WHERE i.status IN ('sent', 'overdue', 'paid') AND i.date <= :as_of
+                  AND i.balance_due + l.amount > 0.005
+            )
+            GROUP BY client_id
+        ) o
+        LEFT JOIN clients c ON c.id = o.client_id
+        GROUP BY o.client_id
+        ORDER BY c.name, o.client_id
         """,
-        (*account_types, start_date, end_date),
+        params,
         fetchall=True
     )
 
-def format_report(report, report_type):
-    """Format report in the requested format (CSV, PDF, etc.)"""
-    # This is a placeholder - in a real app, you'd implement proper formatting
-    # for different output formats (CSV, PDF, Excel, etc.)
-    return str(report)  # Default to string representation
+    totals = dict.fromkeys(['invoices', *AGING_COLUMNS, 'total'], 0)
+    clients = []
+    for row in rows:
+        row['total'] = round(sum(row[key] for key in AGING_COLUMNS), 2)
+        for key in totals:
+            totals[key] += row[key]
+        clients.append(row)
+    totals.update((key, round(value, 2)) for key, value in totals.items())
+
+    report = {
+        'as_of_date': as_of_date,
+        'clients': clients,
+        'totals': totals
+    }
+    return report if format == 'json' else format_report(report, 'ar_aging', format)
+
+_ACCOUNT_COLUMNS = ['id', 'code', 'name', 'type']
+
+GENERAL_LEDGER_COLUMNS = [
+    'account_id', 'account_code', 'account_name', 'account_type', 'entry', 'transaction_id',
+    'date', 'reference', 'description', 'debit', 'credit', 'balance', 'created_by'
+]
+
+def _summary_rows(label_column, value_column, label, values):
+    """Rows for a report's totals, e.g. {'section': 'total', 'name': 'assets', 'balance': ...}"""
+    return [{label_column: label, 'name': name, value_column: value} for name, value in values.items()]
+
+def _balance_sheet_table(report):
+    rows = [
+        {'section': section, **account}
+        for section in ('assets', 'liabilities', 'equity')
+        for account in report[section]
+    ]
+    return ['section', *_ACCOUNT_COLUMNS, 'balance'], rows + _summary_rows('section', 'balance', 'total', report['totals'])
+
+def _income_statement_table(report):
+    rows = [
+        {'section': section, **account}
+        for section in ('revenue', 'expenses')
+        for account in report[section]
+    ]
+    columns = ['section', *_ACCOUNT_COLUMNS, 'debits', 'credits', 'amount']
+    return columns, rows + _summary_rows('section', 'amount', 'total', report['totals'])
+
+def _cash_flow_table(report):
+    rows = [
+        {'activity': activity, **flow}
+        for activity, flows in report['cash_flows'].items()
+        for flow in flows
+    ]
+    summary = {name: report[name] for name in ('beginning_cash', 'net_cash_flow', 'ending_cash')}
+    return ['activity', *_ACCOUNT_COLUMNS, 'amount'], rows + _summary_rows('activity', 'amount', 'summary', summary)
+
+def _trial_balance_table(report):
+    total = {'name': 'Total', 'debits': report['totals']['debits'], 'credits': report['totals']['credits']}
+    return [*_ACCOUNT_COLUMNS, 'debits', 'credits'], report['accounts'] + [total]
+
+def _ar_aging_table(report):
+    total = {'client_name': 'Total', **report['totals']}
+    return ['client_id', 'client_name', 'invoices', *AGING_COLUMNS, 'total'], report['clients'] + [total]
+
+_REPORT_TABLES = {
+    'balance_sheet': _balance_sheet_table,
+    'income_statement': _income_statement_table,
+    'cash_flow': _cash_flow_table,
+    'trial_balance': _trial_balance_table,
+    'ar_aging': _ar_aging_table,
+    # Already flat: the rows of iter_general_ledger, passed through as they stream
+    'general_ledger': lambda rows: (GENERAL_LEDGER_COLUMNS, rows),
+}
+
+def _comparative_table(report, report_type):
+    labels = [period['label'] for period in report['periods']]
+    columns = ['section', *_ACCOUNT_COLUMNS, *labels, 'total', *[f"{label} variance" for label in labels[1:]]]
+    
+    def row(section, line, **account):
+        values = dict(zip(labels, line['amounts']))
+        values.update((f"{label} variance", value) for label, value in zip(labels[1:], line['variance'][1:]))
+        return {'section': section, **account, **values, 'total': line['total']}
+    
+    sections = ('revenue', 'expenses') if report_type == 'income_statement' else ('accounts',)
+    rows = [
+        row(section, line, **{column: line[column] for column in _ACCOUNT_COLUMNS})
+        for section in sections
+        for line in report[section]
+    ]
+    rows += [row('total', line, name=name) for name, line in report['totals'].items()]
+    return columns, rows
+
+def format_report(report, report_type, format='csv'):
+    """
+    Render a report as CSV, NDJSON or XLSX
+    
+    The report is flattened to one row per line (with its totals as trailing
+    rows) and rendered lazily; see utils.exporters.render_rows. For the
+    general ledger, report is the row stream of iter_general_ledger, so the
+    export never holds more than one chunk of it. Comparative reports get a
+    column per period, a total and a variance column per period after the first.
+    
+    Returns:
+        Generator of str (csv, ndjson) or bytes (xlsx) chunks
+    """
+    if isinstance(report, dict) and 'periods' in report:
+        columns, rows = _comparative_table(report, report_type)
+    else:
+        columns, rows = _REPORT_TABLES[report_type](report)
+    return render_rows(columns, rows, format, sheet_name=report_type.replace('_', ' ').title())
 
 # User model
 def create_user(username, password, email):
@@ -0,0 +1,164 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, TimeoutError
+from database import DATABASE_PATH, open_connection
+
+# Group commit configuration
+POSTING_BATCH_SIZE = int(os.getenv('POSTING_BATCH_SIZE', '64'))
+POSTING_BATCH_WAIT_MS = float(os.getenv('POSTING_BATCH_WAIT_MS', '2'))
+POSTING_TIMEOUT = float(os.getenv('POSTING_TIMEOUT', '30'))
+
+class PostingWriter:
+    """
+    Single writer thread that commits queued postings in groups
+
+    Each posting is a callable ``fn(cursor, *args)`` run inside its own
+    SAVEPOINT, so a failing posting is rolled back on its own while the
+    rest of its group still commits. A group is closed after
+    ``max_batch`` postings or ``max_wait_ms`` milliseconds, whichever
+    comes first, and is committed with a single COMMIT.
+    """
+
+    def __init__(self, path=None, max_batch=POSTING_BATCH_SIZE, max_wait_ms=POSTING_BATCH_WAIT_MS):
+        self.path = path or DATABASE_PATH
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        # The thread does not survive a fork, so each worker starts its own
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='posting-writer', daemon=True)
+            self._thread.start()
+
+    def submit(self, fn, *args):
+        """Queue a posting and return a Future for its result"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((fn, args, future))
+        return future
+
+    def post(self, fn, *args, timeout=POSTING_TIMEOUT):
+        """
+        Queue a posting and block until its group has been committed
+
+        On timeout the posting is cancelled if the writer has not picked it
+        up yet; once it has, the outcome is awaited instead, so a caller
+        never reports a failure for a posting that later commits.
+        """
+        future = self.submit(fn, *args)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            if future.cancel():
+                raise
+            return future.result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        conn = open_connection(self.path)
+        conn.isolation_level = None  # explicit BEGIN/COMMIT below
+        while True:
+            batch = self._collect()
+            try:
+                self._commit_group(conn, batch)
+            except Exception as e:
+                for _, _, future in batch:
+                    _set_exception(future, e)
+            finally:
+                # Never carry an open transaction into the next group
+                if conn.in_transaction:
+                    try:
+                        conn.execute("ROLLBACK")
+                    except sqlite3.Error:
+                        pass
+
+    def _commit_group(self, conn, batch):
+        cursor = conn.cursor()
+        try:
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+            except sqlite3.Error as e:
+                for _, _, future in batch:
+                    _set_exception(future, e)
+                return
+
+            applied = []
+            for fn, args, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                cursor.execute("SAVEPOINT posting")
+                try:
+                    result = fn(cursor, *args)
+                    cursor.execute("RELEASE SAVEPOINT posting")
+                    applied.append((future, result))
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT posting")
+                    cursor.execute("RELEASE SAVEPOINT posting")
+                    _set_exception(future, e)
+
+            try:
+                cursor.execute("COMMIT")
+            except sqlite3.Error as e:
+                for future, _ in applied:
+                    _set_exception(future, e)
+                return
+
+            for future, result in applied:
+                _set_result(future, result)
+        finally:
+            if conn.in_transaction:
+                cursor.execute("ROLLBACK")
+            cursor.close()
+
+def _set_result(future, result):
+    try:
+        future.set_result(result)
+    except InvalidStateError:
+        pass  # already failed by an earlier step
+
+def _set_exception(future, error):
+    try:
+        future.set_exception(error)
+    except InvalidStateError:
+        pass  # already settled or cancelled
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+def get_posting_writer(path=None):
+    """Get the posting writer for a database file (DATABASE_PATH by default)"""
+    path = os.path.abspath(path or DATABASE_PATH)
+    writer = _writers.get(path)
+    if writer is None:
+        with _writers_lock:
+            writer = _writers.get(path)
+            if writer is None:
+                writer = _writers[path] = PostingWriter(path)
+    return writer
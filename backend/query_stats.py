@@ -0,0 +1,264 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+
+# Instrumentation configuration
+QUERY_STATS_ENABLED = os.getenv('QUERY_STATS_ENABLED', '1') == '1'
+QUERY_STATS_SAMPLE_RATE = float(os.getenv('QUERY_STATS_SAMPLE_RATE', '0.1'))
+QUERY_STATS_SAMPLES = int(os.getenv('QUERY_STATS_SAMPLES', '1024'))
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '200'))
+SLOW_QUERY_LOG_SIZE = int(os.getenv('SLOW_QUERY_LOG_SIZE', '100'))
+QUERY_STATS_DIR = os.getenv('QUERY_STATS_DIR', '')
+QUERY_STATS_FLUSH_SECONDS = float(os.getenv('QUERY_STATS_FLUSH_SECONDS', '30'))
+
+logger = logging.getLogger('slow_query')
+flush_logger = logging.getLogger(__name__)
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\bIN\s*\((?:\s*\?\s*,?)+\)", re.IGNORECASE)
+_SPACE_RE = re.compile(r"\s+")
+
+_fingerprints = {}
+
+def fingerprint(query):
+    """Normalize a query so calls differing only in literals share one entry"""
+    fp = _fingerprints.get(query)
+    if fp is None:
+        fp = _STRING_RE.sub('?', query)
+        fp = _NUMBER_RE.sub('?', fp)
+        fp = _IN_LIST_RE.sub('IN (...)', fp)
+        fp = _SPACE_RE.sub(' ', fp).strip()
+        if len(_fingerprints) < 10000:
+            _fingerprints[query] = fp
+    return fp
+
+class QueryStat:
+    """Counters for one query fingerprint, owned by a single thread"""
+
+    __slots__ = ('calls', 'total_time', 'max_time', 'rows', 'samples')
+
+    def __init__(self):
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.rows = 0
+        self.samples = deque(maxlen=QUERY_STATS_SAMPLES)
+
+# Each thread records into its own dict so the hot path never takes a lock;
+# snapshot() merges them on read
+_local = threading.local()
+_thread_stats = []
+_registry_lock = threading.Lock()
+_slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+_last_flush = [time.monotonic()]
+_flush_lock = threading.Lock()
+
+def _stats_for_thread():
+    stats = getattr(_local, 'stats', None)
+    if stats is None:
+        stats = _local.stats = {}
+        with _registry_lock:
+            _thread_stats.append(stats)
+    return stats
+
+def record(query, args, elapsed, rows=0, conn=None):
+    """Record one execution of query that took elapsed seconds"""
+    if not QUERY_STATS_ENABLED:
+        return
+    fp = fingerprint(query)
+    stats = _stats_for_thread()
+    stat = stats.get(fp)
+    if stat is None:
+        stat = stats[fp] = QueryStat()
+    stat.calls += 1
+    stat.total_time += elapsed
+    stat.rows += rows or 0
+    if elapsed > stat.max_time:
+        stat.max_time = elapsed
+    if random.random() < QUERY_STATS_SAMPLE_RATE:
+        stat.samples.append(elapsed)
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        _log_slow_query(fp, query, args, elapsed, rows, conn)
+
+    if QUERY_STATS_DIR and time.monotonic() - _last_flush[0] >= QUERY_STATS_FLUSH_SECONDS:
+        # One thread writes the dump; the others carry on rather than queue for it
+        if _flush_lock.acquire(blocking=False):
+            try:
+                _write_dump()
+            finally:
+                _flush_lock.release()
+
+def _log_slow_query(fp, query, args, elapsed, rows, conn):
+    plan = None
+    if conn is not None and query.lstrip().upper().startswith(('SELECT', 'WITH')):
+        try:
+            # EXPLAIN output is fixed when the statement is prepared, so key the
+            # (statement-cached) text on the schema version to see new indexes
+            schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+            plan = [
+                row[-1] for row in
+                conn.execute(f"EXPLAIN QUERY PLAN /* schema {schema_version} */ {query}", args).fetchall()
+            ]
+        except Exception as e:
+            plan = [f"EXPLAIN failed: {str(e)}"]
+    entry = {
+        'fingerprint': fp,
+        'duration_ms': round(elapsed * 1000, 3),
+        'rows': rows,
+        'plan': plan,
+        'at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'pid': os.getpid()
+    }
+    _slow_queries.append(entry)
+    logger.warning("Slow query (%.1f ms): %s | plan: %s", entry['duration_ms'], fp, plan)
+
+def _percentile(sorted_samples, pct):
+    if not sorted_samples:
+        return None
+    index = min(len(sorted_samples) - 1, int(round(pct / 100 * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+def _summarize(merged):
+    result = []
+    for fp, stat in merged.items():
+        samples = sorted(stat['samples'])
+        result.append({
+            'fingerprint': fp,
+            'calls': stat['calls'],
+            'total_ms': round(stat['total_time'] * 1000, 3),
+            'mean_ms': round(stat['total_time'] * 1000 / stat['calls'], 3),
+            'max_ms': round(stat['max_time'] * 1000, 3),
+            'p50_ms': _ms(_percentile(samples, 50)),
+            'p95_ms': _ms(_percentile(samples, 95)),
+            'p99_ms': _ms(_percentile(samples, 99)),
+            'rows': stat['rows']
+        })
+    result.sort(key=lambda s: s['total_ms'], reverse=True)
+    return result
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+def _merge_into(merged, fp, calls, total_time, max_time, rows, samples):
+    entry = merged.get(fp)
+    if entry is None:
+        entry = merged[fp] = {'calls': 0, 'total_time': 0.0, 'max_time': 0.0, 'rows': 0, 'samples': []}
+    entry['calls'] += calls
+    entry['total_time'] += total_time
+    entry['max_time'] = max(entry['max_time'], max_time)
+    entry['rows'] += rows
+    entry['samples'].extend(samples)
+
+def _raw_snapshot():
+    merged = {}
+    with _registry_lock:
+        thread_stats = list(_thread_stats)
+    for stats in thread_stats:
+        for fp, stat in list(stats.items()):
+            _merge_into(merged, fp, stat.calls, stat.total_time, stat.max_time, stat.rows, list(stat.samples))
+    return merged
+
+def snapshot():
+    """Per-fingerprint statistics and recent slow queries for this worker"""
+    return {
+        'pid': os.getpid(),
+        'sample_rate': QUERY_STATS_SAMPLE_RATE,
+        'slow_query_ms': SLOW_QUERY_MS,
+        'queries': _summarize(_raw_snapshot()),
+        'slow_queries': list(_slow_queries)
+    }
+
+def reset():
+    """Clear all counters and the slow-query log for this worker"""
+    with _registry_lock:
+        for stats in _thread_stats:
+            stats.clear()
+    _slow_queries.clear()
+
+def flush():
+    """Write this worker's raw counters to QUERY_STATS_DIR for the CLI dump; returns whether it was written"""
+    with _flush_lock:
+        return _write_dump()
+
+def _write_dump():
+    """
+    Replace this worker's dump file (the caller holds _flush_lock)
+
+    The dump is written to a uniquely named temporary file in the same
+    directory and renamed over the old one. Failures are logged and not
+    raised: this runs on the query path, after the query has succeeded.
+    """
+    _last_flush[0] = time.monotonic()
+    if not QUERY_STATS_DIR:
+        return False
+    path = os.path.join(QUERY_STATS_DIR, f'{os.getpid()}.json')
+    tmp_path = None
+    try:
+        os.makedirs(QUERY_STATS_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=QUERY_STATS_DIR, prefix=f'{os.getpid()}.', suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'raw': _raw_snapshot(), 'slow_queries': list(_slow_queries)}, f)
+        os.replace(tmp_path, path)
+        return True
+    except (OSError, ValueError) as e:
+        flush_logger.warning("Could not write query stats to %s: %s", path, e)
+        if tmp_path is not None:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        return False
+
+atexit.register(lambda: QUERY_STATS_DIR and flush())
+
+def load_dumps(directory=QUERY_STATS_DIR):
+    """Merge the per-worker dumps written by flush()"""
+    merged = {}
+    slow = []
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for fp, stat in data.get('raw', {}).items():
+            _merge_into(merged, fp, stat['calls'], stat['total_time'], stat['max_time'], stat['rows'], stat['samples'])
+        slow.extend(data.get('slow_queries', []))
+    slow.sort(key=lambda s: s['at'])
+    return {'queries': _summarize(merged), 'slow_queries': slow}
+
+def print_report(stats, limit=20):
+    """Print a query statistics summary as a table"""
+    print(f"{'calls':>8} {'total ms':>11} {'p50':>8} {'p95':>8} {'p99':>8} {'rows':>9}  query")
+    for q in stats['queries'][:limit]:
+        print(
+            f"{q['calls']:>8} {q['total_ms']:>11.1f} "
+            f"{q['p50_ms'] or 0:>8.2f} {q['p95_ms'] or 0:>8.2f} {q['p99_ms'] or 0:>8.2f} "
+            f"{q['rows']:>9}  {q['fingerprint'][:100]}"
+        )
+    if stats['slow_queries']:
+        print(f"\n=== Slow queries (>= {SLOW_QUERY_MS} ms) ===")
+        for s in stats['slow_queries'][-limit:]:
+            print(f"\n[{s['at']}] {s['duration_ms']} ms, {s['rows']} rows")
+            print(f"  {s['fingerprint']}")
+            for step in s.get('plan') or []:
+                print(f"    {step}")
+
+if __name__ == "__main__":
+    directory = sys.argv[1] if len(sys.argv) > 1 else QUERY_STATS_DIR
+    if not directory:
+        print("Set QUERY_STATS_DIR (or pass a directory) to read worker dumps")
+        sys.exit(1)
+    print("=== Query Statistics ===\n")
+    print_report(load_dumps(directory))
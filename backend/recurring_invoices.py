@@ -0,0 +1,275 @@
+import json
+import multiprocessing
+import os
+import sys
+import time
+from calendar import monthrange
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from database import execute_query, iter_query
+from posting import get_posting_writer
+import models
+
+# Processes building invoices, each for its own ranges of clients (writes stay in one writer)
+RECURRING_INVOICE_WORKERS = int(os.getenv('RECURRING_INVOICE_WORKERS', str(min(4, os.cpu_count() or 1))))
+# Invoices written per posting-writer transaction; ~0.1s each, well under the busy timeout
+RECURRING_INVOICE_CHUNK = int(os.getenv('RECURRING_INVOICE_CHUNK', '500'))
+# Client ranges per building process, so no process holds a large share of the run in memory
+RANGES_PER_WORKER = 4
+
+# schedule: months between invoices
+SCHEDULES = {'monthly': 1, 'quarterly': 3, 'yearly': 12}
+TEMPLATE_STATUSES = ('draft', 'sent')
+
+_DUE_TEMPLATES = """
+    WHERE is_active = 1 AND next_run_date <= ? AND (end_date IS NULL OR next_run_date <= end_date)
+"""
+
+def _parse_date(value, field):
+    try:
+        return datetime.strptime(value or '', '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} is required as YYYY-MM-DD")
+
+def _advance(day, months, anchor_day):
+    """day moved on by months, on anchor_day or the last day of a shorter month"""
+    index = day.year * 12 + day.month - 1 + months
+    year, month = index // 12, index % 12 + 1
+    return date(year, month, min(anchor_day, monthrange(year, month)[1]))
+
+def period_label(schedule, day):
+    """The period an invoice dated day bills for: YYYY-MM, YYYY-Qn or YYYY"""
+    if schedule == 'monthly':
+        return f"{day.year}-{day.month:02d}"
+    if schedule == 'quarterly':
+        return f"{day.year}-Q{(day.month - 1) // 3 + 1}"
+    return str(day.year)
+
+def _insert_template(cursor, values):
+    cursor.execute(
+        """
+        INSERT INTO recurring_invoices
+        (client_id, schedule, start_date, end_date, next_run_date, due_days, items,
+         tax_rate, discount, notes, invoice_status, created_by)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        values
+    )
+    return cursor.lastrowid
+
+def create_recurring_invoice(client_id, schedule, start_date, items, tax_rate=0, discount=0,
+                             notes=None, due_days=30, end_date=None, invoice_status='sent',
+                             created_by=None):
+    """
+    Create a recurring invoice template
+    
+    Args:
+        client_id: ID of the client billed
+        schedule: monthly, quarterly or yearly
+        start_date: Date of the first invoice (YYYY-MM-DD); later ones fall
+            on the same day of the month, or the month's last day
+        items: List of dictionaries with 'description', 'quantity', 'unit_price', 'taxable'
+        tax_rate: Tax rate as decimal (e.g., 0.15 for 15%)
+        discount: Discount amount per invoice
+        notes: Optional notes copied to every invoice
+        due_days: Days from invoice date to due date
+        end_date: Optional date after which no more invoices are made
+        invoice_status: Status of generated invoices (draft or sent)
+        created_by: ID of the user creating the template
+    """
+    if schedule not in SCHEDULES:
+        raise ValueError(f"Invalid schedule. Must be one of {list(SCHEDULES)}")
+    if invoice_status not in TEMPLATE_STATUSES:
+        raise ValueError(f"Invalid invoice_status. Must be one of {list(TEMPLATE_STATUSES)}")
+    start = _parse_date(start_date, 'start_date')
+    if end_date is not None and _parse_date(end_date, 'end_date') < start:
+        raise ValueError("end_date must not be before start_date")
+    if not client_id or execute_query("SELECT 1 AS found FROM clients WHERE id = ?", (client_id,), fetchone=True) is None:
+        raise ValueError("Client not found")
+    try:
+        due_days = int(due_days)
+    except (TypeError, ValueError):
+        raise ValueError("due_days must be a whole number of days")
+    lines = models.validate_invoice_items(items)
+    tax_rate, discount = models._validate_invoice_terms(tax_rate, discount)
+    
+    try:
+        return get_posting_writer().post(_insert_template, (
+            client_id, schedule, start_date, end_date, start_date, due_days, json.dumps(lines),
+            tax_rate, discount, notes, invoice_status, created_by
+        ))
+    except Exception as e:
+        raise ValueError(f"Failed to create recurring invoice: {str(e)}")
+
+def get_recurring_invoices(client_id=None, active_only=False):
+    """Recurring invoice templates with their items, by client and id"""
+    params = []
+    where_clauses = ["1=1"]
+    if client_id:
+        where_clauses.append("r.client_id = ?")
+        params.append(client_id)
+    if active_only:
+        where_clauses.append("r.is_active = 1")
+    templates = execute_query(
+        f"""
+        SELECT r.*, c.name AS client_name
+        FROM recurring_invoices r
+        LEFT JOIN clients c ON c.id = r.client_id
+        WHERE {' AND '.join(where_clauses)}
+        ORDER BY r.client_id, r.id
+        """,
+        tuple(params),
+        fetchall=True
+    )
+    for template in templates:
+        template['items'] = json.loads(template['items'])
+    return templates
+
+def _template_invoices(template, run_date):
+    """
+    Invoices a template owes up to run_date, oldest first, and its next run date
+    
+    A template that missed runs catches up with one invoice per period.
+    """
+    schedule = template['schedule']
+    anchor_day = int(template['start_date'][8:10])
+    end = template['end_date']
+    items = json.loads(template['items'])
+    day = datetime.strptime(template['next_run_date'], '%Y-%m-%d').date()
+    invoices = []
+    while day <= run_date and (end is None or day.isoformat() <= end):
+        period = period_label(schedule, day)
+        invoices.append({
+            # Deterministic, so a rerun finds the invoice it already made
+            'invoice_number': f"REC-{template['id']}-{period}",
+            'client_id': template['client_id'],
+            'date': day.isoformat(),
+            'due_date': (day + timedelta(days=template['due_days'])).isoformat(),
+            'items': items,
+            'tax_rate': template['tax_rate'],
+            'discount': template['discount'],
+            'notes': template['notes'],
+            'status': template['invoice_status'],
+            'recurring_id': template['id'],
+            'period': period,
+        })
+        day = _advance(day, SCHEDULES[schedule], anchor_day)
+    return invoices, day
+
+def _post_recurring_chunk(cursor, invoices, advances, created_by):
+    """Write one chunk of generated invoices and move their templates on (runs on the posting writer)"""
+    results = models._post_invoice_batch(cursor, list(enumerate(invoices)), created_by, True)
+    cursor.executemany(
+        "UPDATE recurring_invoices SET next_run_date = ?, last_period = ? WHERE id = ?",
+        advances
+    )
+    created = sum(1 for _, result in results if isinstance(result, int))
+    return created, len(results) - created
+
+def _build_chunks(run_date, low, high, chunk_size):
+    """
+    (invoices, advances) chunks due by run_date for templates of clients low..high
+    
+    advances holds (next_run_date, last_period, id) for each template in the
+    chunk; a template's invoices never straddle two chunks.
+    """
+    run_day = _parse_date(run_date, 'run_date')
+    invoices = []
+    advances = []
+    for template in iter_query(
+        f"""
+        SELECT * FROM recurring_invoices
+        {_DUE_TEMPLATES} AND client_id BETWEEN ? AND ?
+        ORDER BY client_id, id
+        """,
+        (run_date, low, high)
+    ):
+        owed, next_run = _template_invoices(template, run_day)
+        invoices.extend(owed)
+        advances.append((next_run.isoformat(), owed[-1]['period'] if owed else template['last_period'], template['id']))
+        if len(invoices) >= chunk_size:
+            yield invoices, advances
+            invoices, advances = [], []
+    if advances:
+        yield invoices, advances
+
+def build_client_range(run_date, low, high, chunk_size=RECURRING_INVOICE_CHUNK):
+    """All chunks for clients low..high, as a list (runs in a building worker process)"""
+    return list(_build_chunks(run_date, low, high, chunk_size))
+
+def _client_ranges(run_date, parts):
+    """Split the clients with due templates into up to parts contiguous id ranges of similar size"""
+    clients = [
+        row[0] for row in iter_query(
+            f"SELECT DISTINCT client_id FROM recurring_invoices {_DUE_TEMPLATES} ORDER BY client_id",
+            (run_date,),
+            as_dict=False
+        )
+    ]
+    if not clients:
+        return []
+    size = -(-len(clients) // max(parts, 1))
+    return [(clients[start], clients[min(start + size, len(clients)) - 1]) for start in range(0, len(clients), size)]
+
+def generate_recurring_invoices(run_date=None, created_by=None, workers=RECURRING_INVOICE_WORKERS,
+                                chunk_size=RECURRING_INVOICE_CHUNK):
+    """
+    Generate every recurring invoice due on or before run_date
+    
+    With more than one worker, clients with due templates are split into
+    contiguous id ranges that spawned processes turn into invoices in
+    memory. Every chunk is written by this process's posting writer, in
+    one transaction together with its templates' next run dates, so the
+    processes never compete for the write lock. With one worker (as from
+    the API) chunks are built and written as the templates are read.
+    Generated invoices carry their template and period, and a period
+    already invoiced is skipped, so running again for the same date (or
+    after a failed run) is safe.
+    
+    Args:
+        run_date: Date to generate for (YYYY-MM-DD), today by default
+        created_by: ID of the user recorded on the invoices
+        workers: Number of building processes; 1 builds in this process
+        chunk_size: Invoices per write transaction
+    
+    Returns:
+        {'run_date', 'templates', 'created', 'skipped', 'workers', 'seconds',
+        'invoices_per_second'}
+    """
+    run_date = run_date or date.today().isoformat()
+    _parse_date(run_date, 'run_date')
+    
+    started = time.perf_counter()
+    writer = get_posting_writer()
+    templates = created = skipped = 0
+    
+    def write(chunks):
+        nonlocal templates, created, skipped
+        for invoices, advances in chunks:
+            made, existing = writer.post(_post_recurring_chunk, invoices, advances, created_by)
+            templates += len(advances)
+            created += made
+            skipped += existing
+    
+    if workers <= 1:
+        write(_build_chunks(run_date, 0, sys.maxsize, chunk_size))
+    else:
+        ranges = _client_ranges(run_date, workers * RANGES_PER_WORKER)
+        # spawn rather than fork: the parent may be running writer and job threads
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            for chunks in pool.map(
+                build_client_range,
+                *zip(*[(run_date, low, high, chunk_size) for low, high in ranges])
+            ):
+                write(chunks)
+    elapsed = time.perf_counter() - started
+    
+    return {
+        'run_date': run_date,
+        'templates': templates,
+        'created': created,
+        'skipped': skipped,
+        'workers': max(workers, 1),
+        'seconds': round(elapsed, 2),
+        'invoices_per_second': round(created / elapsed) if elapsed else created
+    }
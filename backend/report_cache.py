@@ -0,0 +1,174 @@
+import glob
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from database import execute_query
+
+# Reports kept in memory per worker (0 disables the cache)
+REPORT_CACHE_SIZE = int(os.getenv('REPORT_CACHE_SIZE', '128'))
+# Optional directory shared by all workers on the host; empty keeps it per worker
+REPORT_CACHE_DIR = os.getenv('REPORT_CACHE_DIR', '')
+# Reports kept on disk before the oldest are removed
+REPORT_CACHE_DISK_SIZE = int(os.getenv('REPORT_CACHE_DISK_SIZE', '1024'))
+
+def _dumps(value):
+    return json.dumps(value, default=str, separators=(',', ':'))
+
+class ReportCache:
+    """
+    Bounded LRU of generated reports, keyed on the request and the ledger version
+
+    The ledger version is the sum of the 'ledger' and 'accounts' counters in
+    cache_versions. Triggers bump them on any write to transactions, entries,
+    invoices, payments or the chart of accounts, so a report cached before a
+    write is never served after it, and nothing needs explicit invalidation.
+    Reports are stored serialized and decoded on every hit, so callers get
+    their own copy to modify.
+
+    With REPORT_CACHE_DIR set, misses also check a directory of JSON files
+    that every worker reads and writes, and entries for older ledger
+    versions are removed from it as soon as the version moves.
+    """
+
+    def __init__(self, max_entries=REPORT_CACHE_SIZE, directory=REPORT_CACHE_DIR,
+                 max_disk_entries=REPORT_CACHE_DISK_SIZE):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_disk_entries = max_disk_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._disk_version = None
+        self._stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0, 'disk_writes': 0}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def ledger_version(self):
+        row = execute_query(
+            "SELECT SUM(version) AS version FROM cache_versions WHERE name IN ('ledger', 'accounts')",
+            fetchone=True
+        )
+        return row['version'] or 0
+
+    def get_or_compute(self, key, compute):
+        """Cached result for key (a tuple of JSON-able values), calling compute() on a miss"""
+        if self.max_entries <= 0:
+            return compute()
+
+        version = self.ledger_version()
+        full_key = (*key, version)
+
+        with self._lock:
+            payload = self._entries.get(full_key)
+            if payload is not None:
+                self._entries.move_to_end(full_key)
+                self._stats['hits'] += 1
+                return json.loads(payload)
+
+        payload = self._read_disk(full_key, version)
+        if payload is not None:
+            with self._lock:
+                self._stats['disk_hits'] += 1
+        else:
+            payload = _dumps(compute())
+            with self._lock:
+                self._stats['misses'] += 1
+            self._write_disk(full_key, version, payload)
+
+        self._store(full_key, payload)
+        return json.loads(payload)
+
+    def _store(self, full_key, payload):
+        with self._lock:
+            self._entries[full_key] = payload
+            self._entries.move_to_end(full_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def _disk_path(self, full_key, version):
+        digest = hashlib.sha256(_dumps(full_key).encode('utf-8')).hexdigest()[:32]
+        return os.path.join(self.directory, f"{version}-{digest}.json")
+
+    def _read_disk(self, full_key, version):
+        if not self.directory:
+            return None
+        try:
+            with open(self._disk_path(full_key, version), encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_disk(self, full_key, version, payload):
+        if not self.directory:
+            return
+        path = self._disk_path(full_key, version)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(temp_path, path)  # atomic, so readers never see a partial file
+            with self._lock:
+                self._stats['disk_writes'] += 1
+            self._prune_disk(version)
+        except OSError:
+            pass
+
+    def _prune_disk(self, version):
+        """Drop files for other ledger versions, then the oldest beyond the size limit"""
+        moved = self._disk_version != version
+        self._disk_version = version
+        files = glob.glob(os.path.join(self.directory, '*.json'))
+        if not moved and len(files) <= self.max_disk_entries:
+            return
+
+        current = []
+        for path in files:
+            if os.path.basename(path).startswith(f"{version}-"):
+                current.append(path)
+            else:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass  # another worker got there first
+
+        if len(current) > self.max_disk_entries:
+            current.sort(key=lambda path: os.path.getmtime(path) if os.path.exists(path) else 0)
+            for path in current[:len(current) - self.max_disk_entries]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def clear(self):
+        """Drop every cached report, in memory and on disk"""
+        with self._lock:
+            self._entries.clear()
+        if self.directory:
+            for path in glob.glob(os.path.join(self.directory, '*.json')):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0.0
+        stats['max_entries'] = self.max_entries
+        stats['directory'] = self.directory or None
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            for name in self._stats:
+                self._stats[name] = 0
+
+_cache = ReportCache()
+
+def get_report_cache():
+    """The worker's shared report cache"""
+    return _cache
@@ -0,0 +1,242 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from database import execute_query, use_read_only_connections
+from posting import get_posting_writer
+import models
+
+# Reports computed at the same time per worker
+REPORT_JOB_WORKERS = int(os.getenv('REPORT_JOB_WORKERS', '2'))
+# How often idle workers look for jobs queued by other processes
+REPORT_JOB_POLL_SECONDS = float(os.getenv('REPORT_JOB_POLL_SECONDS', '5'))
+# A job still running after this long is assumed lost with its process and requeued
+REPORT_JOB_TIMEOUT = int(os.getenv('REPORT_JOB_TIMEOUT', '600'))
+
+REPORT_JOB_FORMATS = ('json',)
+
+_JOB_COLUMNS = """
+    id, report_type, start_date, end_date, format, periods, status, requested_by,
+    result_size, etag, error, generated_at AS requested_at, started_at, finished_at
+"""
+
+logger = logging.getLogger(__name__)
+
+def _request_key(report_type, start_date, end_date, format, periods):
+    return f"{report_type}|{start_date}|{end_date}|{format}|{periods or ''}"
+
+def _enqueue(cursor, report_type, start_date, end_date, format, periods, requested_by):
+    """Insert a queued job, or return the pending one for the same request"""
+    key = _request_key(report_type, start_date, end_date, format, periods)
+    cursor.execute(
+        "SELECT id FROM reports WHERE request_key = ? AND status IN ('queued', 'running')",
+        (key,)
+    )
+    pending = cursor.fetchone()
+    if pending:
+        return pending['id'], True
+    cursor.execute(
+        """
+        INSERT INTO reports
+        (report_type, start_date, end_date, format, periods, status, request_key, requested_by)
+        VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)
+        """,
+        (report_type, start_date, end_date, format, periods, key, requested_by)
+    )
+    return cursor.lastrowid, False
+
+def _claim_next(cursor, stale_after):
+    """Mark the oldest queued job as running and return it, or None"""
+    cursor.execute(
+        """
+        UPDATE reports SET status = 'queued', started_at = NULL
+        WHERE status = 'running' AND started_at < datetime('now', ?)
+        """,
+        (f"-{int(stale_after)} seconds",)
+    )
+    cursor.execute(
+        """
+        SELECT id, report_type, start_date, end_date, format, periods FROM reports
+        WHERE status = 'queued' ORDER BY id LIMIT 1
+        """
+    )
+    job = cursor.fetchone()
+    if job is None:
+        return None
+    cursor.execute(
+        "UPDATE reports SET status = 'running', started_at = CURRENT_TIMESTAMP WHERE id = ?",
+        (job['id'],)
+    )
+    return dict(job)
+
+def _finish(cursor, job_id, result, etag, size):
+    cursor.execute(
+        """
+        UPDATE reports
+        SET status = 'done', result = ?, etag = ?, result_size = ?, error = NULL,
+            finished_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+        """,
+        (result, etag, size, job_id)
+    )
+
+def _fail(cursor, job_id, error):
+    cursor.execute(
+        """
+        UPDATE reports SET status = 'failed', error = ?, finished_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+        """,
+        (error, job_id)
+    )
+
+class ReportJobQueue:
+    """
+    Background report generation backed by the reports table
+
+    submit() records a queued row (through the posting writer) and wakes one
+    of a few worker threads. Each worker claims the oldest queued row in a
+    write transaction, so a job runs once even when every gunicorn worker
+    polls the same table, and idle workers pick up jobs queued by other
+    processes within REPORT_JOB_POLL_SECONDS. Reports are read on the
+    read-only connection pool and stored as gzipped JSON with their ETag.
+
+    A request identical to one still queued or running joins that job
+    instead of adding another (backed by a partial unique index).
+    """
+
+    def __init__(self, workers=REPORT_JOB_WORKERS, poll_seconds=REPORT_JOB_POLL_SECONDS,
+                 stale_after=REPORT_JOB_TIMEOUT):
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.stale_after = stale_after
+        self._lock = threading.Lock()
+        self._wake = threading.Condition()
+        self._pid = None
+        self._threads = []
+
+    def _ensure_started(self):
+        # Threads do not survive a fork, so each worker process starts its own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._wake = threading.Condition()
+            self._threads = [
+                threading.Thread(target=self._work, name=f'report-job-{i}', daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            self._pid = os.getpid()
+
+    def submit(self, report_type, start_date, end_date, requested_by=None, format='json', periods=None):
+        """
+        Queue a report and return its job
+
+        Returns:
+            The job dict (see get); 'coalesced' is True when the request
+            joined a job that was already pending
+        """
+        if report_type not in models.REPORT_TYPES:
+            raise ValueError(f"Invalid report type. Must be one of {models.REPORT_TYPES}")
+        if format not in REPORT_JOB_FORMATS:
+            raise ValueError(f"Invalid format. Must be one of {list(REPORT_JOB_FORMATS)}")
+        for value in (start_date, end_date):
+            try:
+                datetime.strptime(value or '', '%Y-%m-%d')
+            except ValueError:
+                raise ValueError("start_date and end_date are required as YYYY-MM-DD")
+        if start_date > end_date:
+            raise ValueError("start_date must not be after end_date")
+        if periods is not None:
+            if report_type not in models.COMPARATIVE_REPORT_TYPES:
+                raise ValueError(f"Periods are supported for {list(models.COMPARATIVE_REPORT_TYPES)}")
+            models.report_periods(start_date, end_date, periods)  # validates them
+            periods = json.dumps(periods)
+
+        self._ensure_started()
+        try:
+            job_id, coalesced = get_posting_writer().post(
+                _enqueue, report_type, start_date, end_date, format, periods, requested_by
+            )
+        except Exception as e:
+            raise Exception(f"Failed to queue report: {str(e)}")
+        if not coalesced:
+            with self._wake:
+                self._wake.notify()
+        job = self.get(job_id)
+        job['coalesced'] = coalesced
+        return job
+
+    def get(self, job_id):
+        """Job status without the result, or None"""
+        self._ensure_started()
+        job = execute_query(f"SELECT {_JOB_COLUMNS} FROM reports WHERE id = ?", (job_id,), fetchone=True)
+        if job and job['periods']:
+            job['periods'] = json.loads(job['periods'])
+        return job
+
+    def result(self, job_id):
+        """(status, etag, gzipped JSON) for a job, or None if it does not exist"""
+        row = execute_query(
+            "SELECT status, etag, result FROM reports WHERE id = ?", (job_id,), fetchone=True
+        )
+        if row is None:
+            return None
+        return row['status'], row['etag'], row['result']
+
+    def _has_work(self):
+        return execute_query(
+            """
+            SELECT 1 AS found FROM reports
+            WHERE status = 'queued'
+               OR (status = 'running' AND started_at < datetime('now', ?))
+            LIMIT 1
+            """,
+            (f"-{int(self.stale_after)} seconds",),
+            fetchone=True
+        ) is not None
+
+    def _work(self):
+        use_read_only_connections()
+        writer = get_posting_writer()
+        while True:
+            job = None
+            try:
+                # Checked on a read connection first so idle polls never take the write lock
+                if self._has_work():
+                    job = writer.post(_claim_next, self.stale_after)
+            except Exception:
+                logger.exception("Failed to claim a report job")
+            if job is None:
+                with self._wake:
+                    self._wake.wait(self.poll_seconds)
+                continue
+            self._run(writer, job)
+
+    def _run(self, writer, job):
+        try:
+            report = models.generate_report(
+                job['report_type'], job['start_date'], job['end_date'], job['format'],
+                periods=json.loads(job['periods']) if job['periods'] else None
+            )
+            payload = json.dumps(report, default=str, separators=(',', ':')).encode('utf-8')
+            etag = hashlib.sha256(payload).hexdigest()[:32]
+            # mtime=0 keeps the bytes identical for identical reports
+            writer.post(_finish, job['id'], gzip.compress(payload, mtime=0), etag, len(payload))
+        except Exception as e:
+            logger.exception(f"Report job {job['id']} failed")
+            try:
+                writer.post(_fail, job['id'], str(e))
+            except Exception:
+                logger.exception(f"Failed to record the failure of report job {job['id']}")
+
+_queue = ReportJobQueue()
+
+def get_report_job_queue():
+    """The worker's report job queue"""
+    return _queue
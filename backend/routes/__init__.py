@@ -4,6 +4,7 @@ from .auth import auth_bp
 from .report import reports_bp as report_bp
 from .transaction import transactions_bp as transaction_bp
 from .invoices import invoices_bp
+from .admin import admin_bp
 
 # Export blueprints
-__all__ = ['account_bp', 'auth_bp', 'report_bp', 'transaction_bp', 'invoices_bp']
\ No newline at end of file
+__all__ = ['account_bp', 'auth_bp', 'report_bp', 'transaction_bp', 'invoices_bp', 'admin_bp']
\ No newline at end of file
@@ -0,0 +1,37 @@
+from flask import Blueprint, jsonify, request
+import query_stats
+from report_cache import get_report_cache
+from routes.auth import token_required
+
+admin_bp = Blueprint('admin', __name__)
+
+@admin_bp.route('/query-stats', methods=['GET'])
+@token_required
+def get_query_stats_route(current_user):
+    try:
+        stats = query_stats.snapshot()
+        limit = request.args.get('limit', type=int)
+        if limit:
+            stats['queries'] = stats['queries'][:limit]
+        return jsonify(stats), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to read query statistics: {str(e)}"}), 500
+
+@admin_bp.route('/query-stats/reset', methods=['POST'])
+@token_required
+def reset_query_stats_route(current_user):
+    query_stats.reset()
+    return jsonify({"message": "Query statistics reset"}), 200
+
+@admin_bp.route('/report-cache', methods=['GET'])
+@token_required
+def get_report_cache_route(current_user):
+    return jsonify(get_report_cache().stats()), 200
+
+@admin_bp.route('/report-cache/clear', methods=['POST'])
+@token_required
+def clear_report_cache_route(current_user):
+    cache = get_report_cache()
+    cache.clear()
+    cache.reset_stats()
+    return jsonify({"message": "Report cache cleared"}), 200
@@ -1,26 +1,52 @@
 from flask import Blueprint, jsonify, request
 import datetime
-from models import get_invoices, create_invoice
+from models import (get_invoices, iter_invoices, create_invoice, create_invoices_batch, search_invoices,
+                    mark_overdue_invoices)
 from routes.auth import token_required
+from utils.error_handlers import handle_api_error
+from recurring_invoices import create_recurring_invoice, get_recurring_invoices, generate_recurring_invoices
+from utils.streaming import stream_json_response
 
 invoices_bp = Blueprint('invoices', __name__)
 
+MAX_PAGE_SIZE = 500
+
 @invoices_bp.route('/invoices', methods=['GET'])
 @token_required
 def get_invoices_route(current_user):
     try:
-        invoices = get_invoices()
-        return jsonify([{
+        invoices = iter_invoices()
+        return stream_json_response(({
             'id': invoice['id'],
             'invoice_number': invoice['invoice_number'],
-            'client': invoice['client'],
+            'client': invoice['client_name'],
             'date': invoice['date'],
-            'amount': invoice['amount'],
+            'amount': invoice['total'],
             'status': invoice['status']
-        } for invoice in invoices]), 200
+        } for invoice in invoices), key=None)
     except Exception as e:
         return jsonify({"error": f"Failed to fetch invoices: {str(e)}"}), 500
 
+@invoices_bp.route('/invoices/search', methods=['GET'])
+@token_required
+@handle_api_error
+def search_invoices_route(current_user):
+    """One page of invoices with facet counts; pass next_cursor back as ?cursor="""
+    limit = request.args.get('limit', 50, type=int)
+    result = search_invoices(
+        status=request.args.get('status'),
+        client_id=request.args.get('client_id', type=int),
+        start_date=request.args.get('start_date'),
+        end_date=request.args.get('end_date'),
+        min_total=request.args.get('min_total', type=float),
+        max_total=request.args.get('max_total', type=float),
+        sort=request.args.get('sort', 'date'),
+        order=request.args.get('order', 'desc'),
+        limit=max(1, min(limit, MAX_PAGE_SIZE)),
+        cursor=request.args.get('cursor')
+    )
+    return jsonify({'success': True, **result})
+
 @invoices_bp.route('/invoices', methods=['POST'])
 @token_required
 def create_invoice_route(current_user):
@@ -58,3 +84,97 @@ def create_invoice_route(current_user):
         if "UNIQUE constraint failed" in str(e):
             return jsonify({"error": "Invoice number already exists"}), 400
         return jsonify({"error": f"Failed to create invoice: {str(e)}"}), 500
+
+@invoices_bp.route('/invoices/batch', methods=['POST'])
+@token_required
+@handle_api_error
+def create_invoices_batch_route(current_user):
+    data = request.get_json()
+    
+    # Accept either a bare array or {"invoices": [...], "mode": "..."}
+    if isinstance(data, list):
+        invoices, mode = data, request.args.get('mode', 'atomic')
+    elif isinstance(data, dict):
+        invoices, mode = data.get('invoices'), data.get('mode', 'atomic')
+    else:
+        invoices = None
+    
+    if not invoices:
+        return jsonify({
+            'success': False,
+            'error': 'Invalid Request',
+            'message': 'No invoices provided',
+            'status': 400
+        }), 400
+    
+    result = create_invoices_batch(invoices, created_by=current_user['id'], mode=mode)
+    created = sum(1 for invoice_id in result['ids'] if invoice_id is not None)
+    
+    if result['errors'] and not created:
+        status = 400
+    elif result['errors']:
+        status = 207  # partial mode: some invoices were rejected
+    else:
+        status = 201
+    
+    return jsonify({
+        'success': not result['errors'],
+        'mode': mode,
+        'created': created,
+        'ids': result['ids'],
+        'errors': result['errors'],
+        'status': status
+    }), status
+
+@invoices_bp.route('/invoices/mark-overdue', methods=['POST'])
+@token_required
+@handle_api_error
+def mark_overdue_invoices_route(current_user):
+    """Move sent invoices due before {"date": "YYYY-MM-DD"} (today by default) to overdue"""
+    data = request.get_json(silent=True) or {}
+    changed = mark_overdue_invoices(as_of_date=data.get('date'), changed_by=current_user['id'])
+    return jsonify({'success': True, 'changed': changed})
+
+@invoices_bp.route('/invoices/recurring', methods=['GET'])
+@token_required
+@handle_api_error
+def get_recurring_invoices_route(current_user):
+    templates = get_recurring_invoices(
+        client_id=request.args.get('client_id', type=int),
+        active_only=request.args.get('active') == 'true'
+    )
+    return jsonify({'success': True, 'data': templates})
+
+@invoices_bp.route('/invoices/recurring', methods=['POST'])
+@token_required
+@handle_api_error
+def create_recurring_invoice_route(current_user):
+    data = request.get_json()
+    required_fields = ['client_id', 'schedule', 'start_date', 'items']
+    if not isinstance(data, dict) or any(field not in data for field in required_fields):
+        raise ValueError(f"Missing required fields: {', '.join(required_fields)}")
+    
+    template_id = create_recurring_invoice(
+        client_id=data['client_id'],
+        schedule=data['schedule'],
+        start_date=data['start_date'],
+        items=data['items'],
+        tax_rate=data.get('tax_rate', 0),
+        discount=data.get('discount', 0),
+        notes=data.get('notes'),
+        due_days=data.get('due_days', 30),
+        end_date=data.get('end_date'),
+        invoice_status=data.get('invoice_status', 'sent'),
+        created_by=current_user['id']
+    )
+    return jsonify({'success': True, 'id': template_id, 'message': 'Recurring invoice created'}), 201
+
+@invoices_bp.route('/invoices/recurring/run', methods=['POST'])
+@token_required
+@handle_api_error
+def run_recurring_invoices_route(current_user):
+    """Generate the invoices due by {"date": "YYYY-MM-DD"} (today by default)"""
+    data = request.get_json(silent=True) or {}
+    # Built in this worker; multi-process runs are for maintenance.py generate-recurring-invoices
+    result = generate_recurring_invoices(run_date=data.get('date'), created_by=current_user['id'], workers=1)
+    return jsonify({'success': True, **result})
@@ -1,7 +1,12 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, url_for
 import datetime
-from models import generate_report
+import gzip
+from models import generate_report as build_report, generate_report_bundle, iter_general_ledger, BUNDLE_REPORT_TYPES
+from report_jobs import get_report_job_queue
 from routes.auth import token_required
+from utils.error_handlers import handle_api_error
+from utils.exporters import EXPORT_FORMATS
+from utils.streaming import stream_json_response, stream_export_response
 
 reports_bp = Blueprint('reports', __name__)
 
@@ -14,26 +19,135 @@ def generate_report_route(current_user):
         return jsonify({"error": "Missing required fields: report_type, start_date, end_date"}), 400
     
     try:
-        # Validate date format
-        datetime.datetime.strptime(data['start_date'], '%Y-%m-%d')
-        datetime.datetime.strptime(data['end_date'], '%Y-%m-%d')
-        
-        # Validate report type
-        valid_report_types = ['balance_sheet', 'income_statement', 'cash_flow']
-        if data['report_type'] not in valid_report_types:
-            return jsonify({"error": f"Invalid report type. Must be one of {valid_report_types}"}), 400
-        
-        report_id = generate_report(
+        # Generated in the background; poll the job or fetch its result
+        job = get_report_job_queue().submit(
             report_type=data['report_type'],
             start_date=data['start_date'],
-            end_date=data['end_date']
+            end_date=data['end_date'],
+            requested_by=current_user['id'],
+            periods=data.get('periods')
         )
-        return jsonify({"id": report_id, "message": "Report generated successfully"}), 201
+        job['status_url'] = url_for('reports.report_job_route', job_id=job['id'])
+        job['result_url'] = url_for('reports.report_job_result_route', job_id=job['id'])
+        response = jsonify({**job, "message": "Report queued"})
+        response.headers['Location'] = job['status_url']
+        return response, 202
     except ValueError as e:
         return jsonify({"error": f"Invalid data format: {str(e)}"}), 400
     except Exception as e:
         return jsonify({"error": f"Failed to generate report: {str(e)}"}), 500
 
+@reports_bp.route('/reports/<int:job_id>', methods=['GET'])
+@token_required
+@handle_api_error
+def report_job_route(current_user, job_id):
+    job = get_report_job_queue().get(job_id)
+    if not job:
+        return jsonify({"error": "Report not found"}), 404
+    return jsonify(job), 200
+
+@reports_bp.route('/reports/<int:job_id>/result', methods=['GET'])
+@token_required
+@handle_api_error
+def report_job_result_route(current_user, job_id):
+    found = get_report_job_queue().result(job_id)
+    if found is None:
+        return jsonify({"error": "Report not found"}), 404
+    status, etag, result = found
+    if status != 'done':
+        # 202 while still pending, so clients can keep polling the same URL
+        return jsonify({"id": job_id, "status": status}), 202 if status in ('queued', 'running') else 409
+    
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    elif 'gzip' in request.accept_encodings:
+        # Stored gzipped, so most clients get the bytes straight from the row
+        response = Response(result, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(gzip.decompress(result), mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@reports_bp.route('/reports/general-ledger', methods=['GET'])
+@token_required
+@handle_api_error
+def general_ledger_route(current_user):
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    try:
+        datetime.datetime.strptime(start_date or '', '%Y-%m-%d')
+        datetime.datetime.strptime(end_date or '', '%Y-%m-%d')
+    except ValueError:
+        raise ValueError("start_date and end_date are required as YYYY-MM-DD")
+    
+    # Streamed row by row; see models.iter_general_ledger for the row layout
+    return stream_json_response(
+        iter_general_ledger(start_date, end_date),
+        envelope={'success': True, 'start_date': start_date, 'end_date': end_date},
+        key='rows'
+    )
+
+@reports_bp.route('/reports/export', methods=['GET'])
+@token_required
+@handle_api_error
+def export_report_route(current_user):
+    """Any report as a CSV, NDJSON or XLSX download, streamed as it is generated"""
+    report_type = request.args.get('report_type')
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    export_format = request.args.get('format', 'csv')
+    try:
+        datetime.datetime.strptime(start_date or '', '%Y-%m-%d')
+        datetime.datetime.strptime(end_date or '', '%Y-%m-%d')
+    except ValueError:
+        raise ValueError("start_date and end_date are required as YYYY-MM-DD")
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Invalid format. Must be one of {list(EXPORT_FORMATS)}")
+    # periods=monthly, periods=quarterly or periods=2024-04-01,2024-07-01
+    periods = request.args.get('periods')
+    if periods and periods not in ('monthly', 'quarterly'):
+        periods = periods.split(',')
+    
+    return stream_export_response(
+        build_report(report_type, start_date, end_date, format=export_format, periods=periods or None),
+        export_format,
+        f"{report_type}_{start_date}_{end_date}"
+    )
+
+@reports_bp.route('/bundle', methods=['POST'])
+@token_required
+@handle_api_error
+def report_bundle_route(current_user):
+    """
+    Several reports for one period in a single payload, generated concurrently
+
+    Served at /api/reports/bundle (the other report routes carry a second
+    /reports of their own).
+    """
+    data = request.get_json(silent=True) or {}
+    start_date = data.get('start_date')
+    end_date = data.get('end_date')
+    try:
+        datetime.datetime.strptime(start_date or '', '%Y-%m-%d')
+        datetime.datetime.strptime(end_date or '', '%Y-%m-%d')
+    except ValueError:
+        raise ValueError("start_date and end_date are required as YYYY-MM-DD")
+    
+    report_types = data.get('report_types') or list(BUNDLE_REPORT_TYPES)
+    if not isinstance(report_types, list):
+        raise ValueError("report_types must be a list")
+    
+    reports = generate_report_bundle(report_types, start_date, end_date)
+    return jsonify({
+        'success': True,
+        'start_date': start_date,
+        'end_date': end_date,
+        'reports': reports
+    }), 200
+
 @reports_bp.route('/reports/generate', methods=['POST'])
 def generate_report():
     try:
@@ -1,29 +1,108 @@
+import json
 from flask import Blueprint, jsonify, request, current_app
 from datetime import datetime
-from models import get_transactions, create_transaction, get_account, get_db_connection
+from models import (get_transactions, get_transactions_page, iter_transactions, search_transactions, create_transaction, create_compound_transaction,
+                    create_transactions_batch, get_account, get_db_connection)
+from routes.auth import token_required
 from utils.error_handlers import handle_api_error
+from utils.exporters import EXPORT_FORMATS
+from utils.streaming import stream_json_response, stream_export_rows
+from bank_import import ImportRules, import_statement, open_statement, detect_format
 
 transactions_bp = Blueprint('transactions', __name__)
 
+MAX_PAGE_SIZE = 1000
+
+def _transaction_json(t):
+    return {
+        'id': t['id'],
+        'date': t['date'],
+        'description': t['description'],
+        'debit_account': t['debit_account'],
+        'credit_account': t['credit_account'],
+        'amount': float(t['amount']),
+        'status': t['status'],
+        'debit_account_name': t.get('debit_account_name', ''),
+        'credit_account_name': t.get('credit_account_name', '')
+    }
+
+TRANSACTION_EXPORT_COLUMNS = [
+    'id', 'date', 'description', 'debit_account', 'debit_account_name',
+    'credit_account', 'credit_account_name', 'amount', 'status'
+]
+
 @transactions_bp.route('/transactions', methods=['GET'])
 @handle_api_error
 def get_transactions_route():
-    transactions = get_transactions()
-    return jsonify({
-        'success': True,
-        'data': [{
-            'id': t['id'],
-            'date': t['date'],
-            'description': t['description'],
-            'debit_account': t['debit_account'],
-            'credit_account': t['credit_account'],
-            'amount': float(t['amount']),
-            'status': t['status'],
-            'debit_account_name': t.get('debit_account_name', ''),
-            'credit_account_name': t.get('credit_account_name', '')
-        } for t in transactions],
-        'count': len(transactions)
-    })
+    account_id = request.args.get('account_id', type=int)
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    limit = request.args.get('limit', 100, type=int)
+    export_format = request.args.get('format', 'json')
+    
+    # format=csv|ndjson|xlsx downloads every matching transaction
+    if export_format != 'json':
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Invalid format. Must be one of {['json', *EXPORT_FORMATS]}")
+        transactions = iter_transactions(account_id=account_id, start_date=start_date, end_date=end_date)
+        return stream_export_rows(
+            (_transaction_json(t) for t in transactions),
+            TRANSACTION_EXPORT_COLUMNS,
+            export_format,
+            'transactions'
+        )
+    
+    # limit=0 streams every matching transaction in one response
+    if limit <= 0:
+        transactions = iter_transactions(account_id=account_id, start_date=start_date, end_date=end_date)
+        return stream_json_response(
+            (_transaction_json(t) for t in transactions),
+            envelope={'success': True}
+        )
+    
+    # Otherwise one page; pass next_cursor back as ?cursor= for the next one
+    page = get_transactions_page(
+        account_id=account_id,
+        start_date=start_date,
+        end_date=end_date,
+        limit=min(limit, MAX_PAGE_SIZE),
+        cursor=request.args.get('cursor')
+    )
+    return stream_json_response(
+        (_transaction_json(t) for t in page['data']),
+        envelope={'success': True, 'next_cursor': page['next_cursor']}
+    )
+
+@transactions_bp.route('/search', methods=['GET'])
+@handle_api_error
+def search_transactions_route():
+    text = request.args.get('q', '').strip()
+    if not text:
+        return jsonify({
+            'success': False,
+            'error': 'Invalid Request',
+            'message': 'Query parameter q is required',
+            'status': 400
+        }), 400
+    
+    results = search_transactions(
+        text,
+        account_id=request.args.get('account_id', type=int),
+        start_date=request.args.get('start_date'),
+        end_date=request.args.get('end_date'),
+        limit=min(max(request.args.get('limit', 50, type=int), 1), MAX_PAGE_SIZE),
+        offset=max(request.args.get('offset', 0, type=int), 0)
+    )
+    return stream_json_response(
+        ({
+            **_transaction_json(t),
+            'reference': t['reference'],
+            'snippet': t['snippet'],
+            'reference_snippet': t['reference_snippet'],
+            'rank': t['rank']
+        } for t in results),
+        envelope={'success': True, 'query': text}
+    )
 
 @transactions_bp.route('/transactions', methods=['POST'])
 @handle_api_error
@@ -50,7 +129,7 @@ def create_transaction_route():
         return jsonify({
             'success': False,
             'error': 'Validation Error',
-            'message': f'Missing required fields: {', '.join(missing_fields)}',
+            'message': f"Missing required fields: {', '.join(missing_fields)}",
             'status': 400
         }), 400
         
@@ -87,104 +166,87 @@ def create_transaction_route():
         print(f"Error creating transaction: {str(e)}")  # Debug log
         return jsonify({"error": f"Failed to create transaction: {str(e)}"}), 500
 
-def create_double_entry_transaction(data):
+@transactions_bp.route('/batch', methods=['POST'])
+@token_required
+@handle_api_error
+def create_transactions_batch_route(current_user):
+    data = request.get_json()
+    
+    # Accept either a bare array or {"transactions": [...], "mode": "..."}
+    if isinstance(data, list):
+        transactions, mode = data, request.args.get('mode', 'atomic')
+    elif isinstance(data, dict):
+        transactions, mode = data.get('transactions'), data.get('mode', 'atomic')
+    else:
+        transactions = None
+    
+    if not transactions:
+        return jsonify({
+            'success': False,
+            'error': 'Invalid Request',
+            'message': 'No transactions provided',
+            'status': 400
+        }), 400
+    
+    result = create_transactions_batch(transactions, created_by=current_user['id'], mode=mode)
+    created = sum(1 for transaction_id in result['ids'] if transaction_id is not None)
+    
+    if result['errors'] and not created:
+        status = 400
+    elif result['errors']:
+        status = 207  # partial mode: some items were rejected
+    else:
+        status = 201
+    
+    return jsonify({
+        'success': not result['errors'],
+        'mode': mode,
+        'created': created,
+        'ids': result['ids'],
+        'errors': result['errors'],
+        'status': status
+    }), status
+
+@transactions_bp.route('/import', methods=['POST'])
+@token_required
+@handle_api_error
+def import_statement_route(current_user):
+    """Multipart upload: 'file' (CSV or OFX), 'rules' (JSON mapping), optional 'format'"""
+    statement = request.files.get('file')
+    if not statement or not request.form.get('rules'):
+        return jsonify({
+            'success': False,
+            'error': 'Invalid Request',
+            'message': 'A statement file and mapping rules are required',
+            'status': 400
+        }), 400
+    
     try:
-        if not data.get('entries') or len(data['entries']) < 2:
-            return jsonify({'error': 'Transaction must have at least 2 entries'}), 400
-            
-        # Start transaction
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        try:
-            # Insert main transaction
-            cursor.execute("""
-                INSERT INTO transactions (date, reference, description, status)
-                VALUES (?, ?, ?, ?)
-            """, (
-                data.get('date', datetime.now().strftime('%Y-%m-%d')),
-                data.get('reference', ''),
-                data.get('description', ''),
-                data.get('status', 'posted')
-            ))
-            
-            transaction_id = cursor.lastrowid
-            
-            # Insert entries
-            for entry in data['entries']:
-                cursor.execute("""
-                    INSERT INTO transaction_entries 
-                    (transaction_id, account_id, debit, credit)
-                    VALUES (?, ?, ?, ?)
-                """, (
-                    transaction_id,
-                    entry['account_id'],
-                    entry.get('debit', 0),
-                    entry.get('credit', 0)
-                ))
-                
-            conn.commit()
-            return jsonify({'id': transaction_id, 'message': 'Transaction created successfully'}), 201
-            
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            cursor.close()
-            conn.close()
-            
-    except Exception as e:
-        print(f"Error in create_double_entry_transaction: {str(e)}")  # Debug log
-        return jsonify({'error': str(e)}), 500
+        rules = ImportRules(json.loads(request.form['rules']))
+    except json.JSONDecodeError:
+        raise ValueError("Rules must be valid JSON")
+    
+    stats = import_statement(
+        open_statement(statement.stream),
+        rules,
+        created_by=current_user['id'],
+        fmt=request.form.get('format') or detect_format(statement.filename or '')
+    )
+    return jsonify({'success': True, **stats, 'status': 200}), 200
 
-# This route is no longer needed as we've combined the functionality
-# into create_transaction_route
-def create_transaction():
+def create_double_entry_transaction(data):
     try:
-        data = request.get_json()
-        
-        if not data.get('entries') or len(data['entries']) < 2:
-            return jsonify({'error': 'Transaction must have at least 2 entries'}), 400
-            
-        # Start transaction
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        transaction_id = create_compound_transaction(
+            date=data.get('date', datetime.now().strftime('%Y-%m-%d')),
+            reference=data.get('reference', ''),
+            description=data.get('description', ''),
+            entries=data.get('entries'),
+            status=data.get('status', 'posted')
+        )
+        return jsonify({'id': transaction_id, 'message': 'Transaction created successfully'}), 201
         
-        try:
-            # Insert main transaction
-            cursor.execute("""
-                INSERT INTO transactions (date, reference, description)
-                VALUES (?, ?, ?)
-            """, (
-                data.get('date', datetime.now().strftime('%Y-%m-%d')),
-                data.get('reference', ''),
-                data.get('description', '')
-            ))
-            
-            transaction_id = cursor.lastrowid
-            
-            # Insert entries
-            for entry in data['entries']:
-                cursor.execute("""
-                    INSERT INTO transaction_entries 
-                    (transaction_id, account_id, debit, credit)
-                    VALUES (?, ?, ?, ?)
-                """, (
-                    transaction_id,
-                    entry['account_id'],
-                    entry.get('debit', 0),
-                    entry.get('credit', 0)
-                ))
-                
-            conn.commit()
-            return jsonify({'id': transaction_id, 'message': 'Transaction created successfully'}), 201
-            
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            cursor.close()
-            conn.close()
-            
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
+        print(f"Error in create_double_entry_transaction: {str(e)}")  # Debug log
         return jsonify({'error': str(e)}), 500
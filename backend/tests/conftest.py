@@ -0,0 +1,87 @@
+import datetime
+import os
+import sqlite3
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Set before the backend modules are imported; each test then gets its own file
+os.environ['DATABASE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='accounting-tests-'), 'unused.db')
+os.environ.setdefault('AUTO_MIGRATE', '0')
+os.environ.setdefault('SECRET_KEY', 'test-secret-of-at-least-thirty-two-bytes')
+
+import jwt
+import pytest
+import database
+import ledger_arrays
+import migrate
+import posting
+from account_catalog import get_account_catalog
+from app import app
+from report_cache import get_report_cache
+
+SEED = """
+INSERT INTO users (username, email, password_hash) VALUES ('admin', 'admin@example.com', 'x');
+INSERT INTO accounts (code, name, type) VALUES
+    ('1000', 'Cash', 'Asset'),
+    ('1100', 'Bank', 'Asset'),
+    ('2000', 'Loan', 'Liability'),
+    ('3000', 'Capital', 'Equity'),
+    ('4000', 'Sales', 'Revenue'),
+    ('5000', 'Rent', 'Expense');
+INSERT INTO clients (name, email) VALUES ('Acme', 'acme@example.com'), ('Globex', 'globex@example.com');
+"""
+
+# Ids of the seeded rows
+ADMIN = 1
+CASH, BANK, LOAN, CAPITAL, SALES, RENT = 1, 2, 3, 4, 5, 6
+ACME, GLOBEX = 1, 2
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Path of an empty database that every backend module uses by default"""
+    path = str(tmp_path / 'accounting.db')
+    for module in (database, posting, migrate):
+        monkeypatch.setattr(module, 'DATABASE_PATH', path)
+    # Per-process caches would otherwise carry state over from the previous test's file
+    monkeypatch.setattr(ledger_arrays, '_arrays', None)
+    get_account_catalog().invalidate()
+    get_report_cache().clear()
+    return path
+
+@pytest.fixture
+def db(db_path):
+    """Plain connection to a fully migrated database with a user, accounts and clients"""
+    migrate.migrate(db_path)
+    conn = sqlite3.connect(db_path, timeout=10)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SEED)
+    conn.commit()
+    yield conn
+    conn.close()
+
+@pytest.fixture
+def client(db, db_path, monkeypatch):
+    """Flask test client on the test database, signed in as the seeded admin"""
+    monkeypatch.setitem(app.config, 'DATABASE', db_path)
+    client = app.test_client()
+    token = jwt.encode(
+        {'username': 'admin', 'exp': datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)},
+        os.environ['SECRET_KEY'],
+        algorithm='HS256'
+    )
+    client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    return client
+
+def all_pages(fetch, limit):
+    """Every page a keyset-paginated fetch returns, following next_cursor to the end"""
+    pages = []
+    cursor = None
+    while True:
+        page = fetch(limit=limit, cursor=cursor)
+        pages.append(page['data'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return pages
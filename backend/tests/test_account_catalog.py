@@ -0,0 +1,46 @@
+import pytest
+import models
+from account_catalog import get_account_catalog
+from conftest import ADMIN, CASH, SALES
+
+def test_lookups_come_from_memory(db):
+    catalog = get_account_catalog()
+    assert catalog.get(CASH)['code'] == '1000'
+    assert catalog.get(str(CASH))['name'] == 'Cash'
+    assert catalog.by_code('4000')['type'] == 'Revenue'
+    assert catalog.get('not a number') is None
+    assert [a['code'] for a in catalog.accounts(types=('Asset',))] == ['1000', '1100']
+
+def test_account_added_elsewhere_is_found_at_once(db):
+    catalog = get_account_catalog()
+    catalog.get(CASH)  # loaded and freshly checked
+    # Another worker's insert: this catalog's throttled check would not see it yet
+    db.execute("INSERT INTO accounts (code, name, type) VALUES ('1200', 'Petty cash', 'Asset')")
+    db.commit()
+    assert catalog.by_code('1200')['name'] == 'Petty cash'
+
+def test_change_elsewhere_is_seen_after_max_age(db):
+    catalog = get_account_catalog()
+    catalog.get(CASH)
+    db.execute("UPDATE accounts SET name = 'Petty cash' WHERE id = ?", (CASH,))
+    db.commit()
+    assert catalog.ensure_fresh(max_age=0).get(CASH)['name'] == 'Petty cash'
+
+def test_create_account_writes_through(db):
+    catalog = get_account_catalog()
+    catalog.get(CASH)
+    models.create_account('6000', 'Travel', 'Expense')
+    assert [a['code'] for a in catalog.accounts(types=('Expense',))] == ['5000', '6000']
+
+def test_postings_see_an_account_deactivated_elsewhere_at_once(db):
+    catalog = get_account_catalog()
+    catalog.get(CASH)  # checked just now, so the throttled catalog would trust it
+    db.execute("UPDATE accounts SET is_active = 0 WHERE id = ?", (CASH,))
+    db.commit()
+    with pytest.raises(ValueError, match="inactive"):
+        models.create_transaction('2024-01-05', 'S1', 'Sale', CASH, SALES, 100, ADMIN)
+    result = models.create_transactions_batch([
+        {'date': '2024-01-05', 'reference': 'S2', 'description': 'Sale', 'debit_account': CASH,
+         'credit_account': SALES, 'amount': 10},
+    ], ADMIN)
+    assert result['errors'] == [{'index': 0, 'error': 'Cannot use inactive accounts'}]
@@ -0,0 +1,69 @@
+import io
+import pytest
+from bank_import import ImportRules, import_statement
+from conftest import ADMIN, BANK, RENT, SALES
+
+STATEMENT = """date,description,reference,amount
+2024-01-02,Card sales,D1,250.00
+2024-01-03,Landlord rent,R1,-1200.00
+2024-01-04,Card sales,D2,"1,010.50"
+2024-01-05,Broken line,X1,abc
+"""
+
+@pytest.fixture
+def rules(db):
+    return ImportRules({
+        'bank_account': '1100',
+        'default_account': '4000',
+        'rules': [{'pattern': '(?i)rent', 'account': '5000', 'direction': 'out'}],
+    })
+
+def _import(text, rules, batch_size=2):
+    return import_statement(io.StringIO(text), rules, ADMIN, batch_size=batch_size)
+
+def test_lines_are_mapped_and_posted(db, rules):
+    stats = _import(STATEMENT, rules)
+    assert (stats['read'], stats['imported'], stats['duplicates'], stats['rejected']) == (4, 3, 0, 1)
+    assert stats['errors'] == [{'line': 5, 'error': 'Invalid amount'}]
+    rows = db.execute(
+        "SELECT reference, debit_account, credit_account, amount FROM transactions ORDER BY date"
+    ).fetchall()
+    assert [tuple(row) for row in rows] == [
+        ('D1', BANK, SALES, 250.0), ('R1', RENT, BANK, 1200.0), ('D2', BANK, SALES, 1010.5),
+    ]
+
+def test_reimport_skips_every_known_line(db, rules):
+    _import(STATEMENT, rules)
+    stats = _import(STATEMENT, rules)
+    assert (stats['imported'], stats['duplicates']) == (0, 3)
+    assert db.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 3
+
+def test_overlapping_statement_adds_only_new_lines(db, rules):
+    _import(STATEMENT, rules)
+    later = "date,description,reference,amount\n2024-01-04,Card sales,D2,1010.50\n2024-01-06,Card sales,D3,80\n"
+    stats = _import(later, rules)
+    assert (stats['imported'], stats['duplicates']) == (1, 1)
+    assert db.execute("SELECT COUNT(*) FROM transactions WHERE reference = 'D3'").fetchone()[0] == 1
+
+def test_identical_lines_are_each_posted_once(db, rules):
+    # Two equal card payments on one day with no reference, the second in the next batch
+    text = (
+        "date,description,reference,amount\n"
+        "2024-01-02,Card sales,,250\n2024-01-02,Card sales,,250\n2024-01-03,Card sales,,250\n"
+        "2024-01-02,Card sales,,250\n"
+    )
+    for batch_size in (10, 1):
+        db.execute("DELETE FROM transactions")
+        db.commit()
+        stats = _import(text, rules, batch_size=batch_size)
+        assert (stats['imported'], stats['duplicates']) == (4, 0)
+        assert db.execute("SELECT COUNT(DISTINCT import_hash) FROM transactions").fetchone()[0] == 4
+        stats = _import(text, rules, batch_size=batch_size)
+        assert (stats['imported'], stats['duplicates']) == (0, 4)
+
+def test_statement_with_one_more_identical_line_adds_only_that_line(db, rules):
+    line = "2024-01-02,Card sales,,250\n"
+    _import("date,description,reference,amount\n" + line * 2, rules)
+    stats = _import("date,description,reference,amount\n" + line * 3, rules)
+    assert (stats['imported'], stats['duplicates']) == (1, 2)
+    assert db.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 3
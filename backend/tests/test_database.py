@@ -0,0 +1,166 @@
+import threading
+import pytest
+import database
+from database import ConnectionPool, execute_query, get_db_connection, iter_query
+
+def test_nested_acquire_shares_the_connection(db_path, db):
+    pool = ConnectionPool(db_path, size=2)
+    outer = pool.acquire()
+    inner = pool.acquire()
+    conn = outer._conn
+    assert inner._conn is conn
+    assert inner.nested and not outer.nested
+    assert pool._local.depth == 2
+
+    inner.close()
+    assert pool._local.depth == 1
+    assert pool._idle.qsize() == 0  # still held by the outer handle
+    outer.close()
+    assert pool._local.depth == 0
+    assert pool._idle.qsize() == 1
+
+    again = pool.acquire()
+    assert again._conn is conn  # reused, not reopened
+    again.close()
+
+def test_closed_handle_cannot_be_used(db_path, db):
+    pool = ConnectionPool(db_path)
+    handle = pool.acquire()
+    handle.close()
+    handle.close()  # idempotent
+    assert handle.closed
+    with pytest.raises(Exception, match="closed"):
+        handle.execute("SELECT 1")
+
+def test_release_rolls_back_an_unfinished_transaction(db_path, db):
+    pool = ConnectionPool(db_path)
+    conn = pool.acquire()
+    conn.execute("INSERT INTO clients (name) VALUES ('Uncommitted')")
+    assert conn.in_transaction
+    conn.close()
+
+    conn = pool.acquire()
+    assert not conn.in_transaction
+    assert conn.execute("SELECT COUNT(*) FROM clients WHERE name = 'Uncommitted'").fetchone()[0] == 0
+    conn.close()
+
+def test_exhausted_pool_times_out(db_path, db):
+    pool = ConnectionPool(db_path, size=1, timeout=0.1)
+    held = pool.acquire()
+    errors = []
+
+    def other_thread():
+        try:
+            pool.acquire().close()
+        except Exception as e:
+            errors.append(str(e))
+
+    thread = threading.Thread(target=other_thread)
+    thread.start()
+    thread.join()
+    held.close()
+    assert errors == ["Failed to connect to database: connection pool exhausted"]
+
+def test_read_only_pool_rejects_writes(db_path, db):
+    conn = database.get_pool(db_path, readonly=True).acquire()
+    try:
+        with pytest.raises(Exception, match="readonly"):
+            conn.execute("INSERT INTO clients (name) VALUES ('Nope')")
+    finally:
+        conn.close()
+
+def test_nested_execute_query_leaves_the_outer_transaction_alone(db_path, db):
+    outer = get_db_connection()
+    outer.execute("BEGIN")
+    outer.execute("INSERT INTO clients (name) VALUES ('Outer')")
+
+    execute_query("INSERT INTO clients (name) VALUES ('Inner')", commit=True)
+    assert outer.in_transaction  # commit=True did not commit the caller's work
+    with pytest.raises(Exception, match="no such table"):
+        execute_query("INSERT INTO missing_table VALUES (1)", commit=True)
+    assert outer.in_transaction  # the failure did not roll it back either
+
+    outer.rollback()
+    outer.close()
+    names = {row['name'] for row in execute_query("SELECT name FROM clients", fetchall=True)}
+    assert names == {'Acme', 'Globex'}
+
+def test_execute_query_commits_on_its_own_connection(db_path, db):
+    client_id = execute_query("INSERT INTO clients (name) VALUES ('Initech')", commit=True)
+    assert db.execute("SELECT name FROM clients WHERE id = ?", (client_id,)).fetchone()[0] == 'Initech'
+
+def test_iter_query_streams_in_batches(db_path, db):
+    db.executemany("INSERT INTO clients (name) VALUES (?)", [(f"Client {i}",) for i in range(25)])
+    db.commit()
+    rows = list(iter_query("SELECT id, name FROM clients ORDER BY id", batch_size=4))
+    assert len(rows) == 27
+    assert rows[0] == {'id': 1, 'name': 'Acme'}
+    assert list(iter_query("SELECT name FROM clients WHERE id = 2", as_dict=False, path=db_path)) == [('Globex',)]
+
+_COUNT_TO_25 = "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n WHERE x < 25) SELECT tick(x) AS x FROM n"
+
+def test_iter_query_reads_one_batch_at_a_time(db_path, db):
+    ticks = []
+    handle = get_db_connection()  # iter_query gets this thread's connection back
+    handle.create_function('tick', 1, lambda x: ticks.append(x) or x)
+    try:
+        rows = iter_query(_COUNT_TO_25, batch_size=10, as_dict=False)
+        assert ticks == []  # nothing runs until the first row is pulled
+        assert next(rows) == (1,)
+        # One batch, plus the row sqlite3 steps to ahead of fetchmany
+        assert len(ticks) == 11
+        for _ in range(9):
+            next(rows)
+        assert len(ticks) == 11  # the rest of the batch comes from memory
+        next(rows)
+        assert len(ticks) == 21
+        assert [x for x, in rows] == list(range(12, 26))
+    finally:
+        handle.close()
+
+def _acquire_elsewhere(pool):
+    """Whether another thread can check out a connection from pool"""
+    errors = []
+
+    def other_thread():
+        try:
+            pool.acquire().close()
+        except Exception as e:
+            errors.append(str(e))
+
+    thread = threading.Thread(target=other_thread)
+    thread.start()
+    thread.join()
+    return not errors
+
+def test_iter_query_returns_the_connection_when_closed_early(db_path, db, monkeypatch):
+    pool = ConnectionPool(db_path, size=1, timeout=0.1)
+    monkeypatch.setitem(database._pools, (db_path, False), pool)
+    db.executemany("INSERT INTO clients (name) VALUES (?)", [(f"Client {i}",) for i in range(25)])
+    db.commit()
+
+    rows = iter_query("SELECT name FROM clients", batch_size=4, path=db_path)
+    assert next(rows) == {'name': 'Acme'}
+    assert not _acquire_elsewhere(pool)  # held while the generator is open
+    rows.close()
+    assert pool._local.depth == 0
+    assert _acquire_elsewhere(pool)
+
+    # A consumer that stops at the first row and drops the generator
+    for row in iter_query("SELECT name FROM clients", batch_size=4, path=db_path):
+        break
+    assert _acquire_elsewhere(pool)
+
+    with pytest.raises(Exception, match="no such table"):
+        next(iter_query("SELECT * FROM missing_table", path=db_path))
+    assert _acquire_elsewhere(pool)
+
+def test_iter_query_path_reads_that_file(db_path, db, tmp_path):
+    other = str(tmp_path / 'other.db')
+    conn = database.open_connection(other)
+    conn.executescript("CREATE TABLE clients (name TEXT); INSERT INTO clients VALUES ('Only in other');")
+    conn.close()
+
+    assert [row['name'] for row in iter_query("SELECT name FROM clients", path=other)] == ['Only in other']
+    assert [row['name'] for row in iter_query("SELECT name FROM clients ORDER BY id")] == ['Acme', 'Globex']
+    assert database.get_pool(other)._local.depth == 0
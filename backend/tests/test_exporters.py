@@ -0,0 +1,105 @@
+import csv
+import io
+import json
+import pytest
+import models
+from utils import exporters
+from conftest import ADMIN, BANK, CASH, RENT, SALES
+
+COLUMNS = ['id', 'name', 'amount', 'note']
+
+def _rows(n):
+    return [
+        {'id': i, 'name': f'Row {i}', 'amount': i + 0.5, 'note': None if i % 2 else 'a, "quoted"\nnote'}
+        for i in range(n)
+    ]
+
+class _Counted:
+    """Row iterator that records how many rows have been pulled"""
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.pulled = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = next(self.rows)
+        self.pulled += 1
+        return row
+
+def test_csv_values_and_chunks():
+    rows = _Counted(_rows(1201))
+    chunks = exporters.render_rows(COLUMNS, rows, 'csv')
+    first = next(chunks)
+    assert rows.pulled == exporters.EXPORT_CHUNK_ROWS  # nothing is read ahead of the chunk
+    chunks = [first, *chunks]
+    assert len(chunks) == 3
+
+    parsed = list(csv.reader(io.StringIO(''.join(chunks))))
+    assert parsed[0] == COLUMNS and len(parsed) == 1202
+    assert parsed[1] == ['0', 'Row 0', '0.50', 'a, "quoted"\nnote']
+    assert parsed[2] == ['1', 'Row 1', '1.50', '']
+
+    assert list(exporters.render_rows(COLUMNS, [], 'csv')) == ['id,name,amount,note\r\n']
+
+def test_ndjson_keeps_column_order():
+    lines = ''.join(exporters.render_rows(['note', 'id'], _rows(3), 'ndjson')).splitlines()
+    assert lines[1] == '{"note":null,"id":1}'
+    assert [json.loads(line) for line in lines] == [
+        {'note': row['note'], 'id': row['id']} for row in _rows(3)
+    ]
+
+def test_xlsx_workbook_opens_with_every_row():
+    openpyxl = pytest.importorskip('openpyxl')
+    rows = _rows(1201)
+    rows[3]['name'] = 'Bell\x07 & <tag>'  # not allowed in XML, even escaped
+    chunks = list(exporters.render_rows(COLUMNS, rows, 'xlsx', sheet_name='Trial "balance" sheet for the whole year'))
+    assert all(isinstance(chunk, bytes) for chunk in chunks)
+
+    workbook = openpyxl.load_workbook(io.BytesIO(b''.join(chunks)), read_only=True)
+    assert workbook.sheetnames == ['Trial "balance" sheet for the w']  # Excel's 31 character limit
+    values = list(workbook.active.iter_rows(values_only=True))
+    assert values[0] == tuple(COLUMNS) and len(values) == 1202
+    assert values[1] == (0, 'Row 0', 0.5, 'a, "quoted"\nnote')
+    assert values[2] == (1, 'Row 1', 1.5, None)
+    assert values[4][1] == 'Bell & <tag>'
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError, match="Invalid format"):
+        exporters.render_rows(COLUMNS, [], 'pdf')
+
+def _post_ledger():
+    models.create_transactions_batch([
+        {'date': '2024-01-01', 'reference': f'S{n}', 'description': f'Sale {n}',
+         'debit_account': (CASH, BANK)[n % 2], 'credit_account': SALES, 'amount': n + 0.25}
+        for n in range(700)
+    ], ADMIN)
+    models.create_transaction('2024-01-31', 'R1', 'Rent', RENT, CASH, 300, ADMIN)
+
+def test_streamed_export_equals_the_buffered_one(client):
+    _post_ledger()
+    url = '/api/reports/reports/export?report_type={}&start_date=2024-01-01&end_date=2024-01-31&format={}'
+    for report_type in ('general_ledger', 'trial_balance'):
+        for export_format in ('csv', 'ndjson'):
+            response = client.get(url.format(report_type, export_format))
+            assert response.status_code == 200
+            assert response.headers['Content-Disposition'] == \
+                f'attachment; filename="{report_type}_2024-01-01_2024-01-31.{export_format}"'
+            if report_type == 'general_ledger':
+                report = list(models.iter_general_ledger('2024-01-01', '2024-01-31'))
+            else:
+                report = models.generate_report(report_type, '2024-01-01', '2024-01-31')
+            # The whole report in memory, rendered as one chunk
+            buffered = ''.join(models.format_report(report, report_type, export_format))
+            assert response.get_data(as_text=True) == buffered
+
+    openpyxl = pytest.importorskip('openpyxl')
+    response = client.get(url.format('general_ledger', 'xlsx'))
+    values = list(openpyxl.load_workbook(io.BytesIO(response.data), read_only=True).active.iter_rows(values_only=True))
+    rows = list(models.iter_general_ledger('2024-01-01', '2024-01-31'))
+    assert len(values) == len(rows) + 1
+    assert [dict(zip(values[0], line)) for line in values[1:]] == [
+        {column: row[column] for column in models.GENERAL_LEDGER_COLUMNS} for row in rows
+    ]
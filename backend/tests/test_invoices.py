@@ -0,0 +1,200 @@
+import pytest
+import models
+from conftest import ACME, ADMIN, GLOBEX, all_pages
+
+def _invoice(number, client_id=ACME, status='draft', date='2024-01-10', due_date='2024-02-09', lines=1, price=100):
+    return {
+        'invoice_number': number, 'client_id': client_id, 'date': date, 'due_date': due_date,
+        'items': [
+            {'description': f'{number} line {n}', 'quantity': 1, 'unit_price': price, 'taxable': False}
+            for n in range(lines)
+        ],
+        'tax_rate': 0, 'discount': 0, 'notes': None, 'status': status,
+    }
+
+def _items_by_invoice(db):
+    rows = db.execute("SELECT invoice_id, description FROM invoice_items ORDER BY id")
+    return [(row['invoice_id'], row['description'].split()[0]) for row in rows]
+
+def test_batch_items_and_history_follow_their_invoice(db):
+    first = models.create_invoices_batch([_invoice(f'INV-{n}', lines=n + 1) for n in range(3)], ADMIN)
+    # A deleted last invoice must not have its id handed out again
+    db.execute("DELETE FROM invoices WHERE id = ?", (first['ids'][-1],))
+    db.commit()
+    second = models.create_invoices_batch([_invoice('INV-3'), _invoice('INV-4', lines=2)], ADMIN)
+
+    assert first['ids'] == [1, 2, 3] and second['ids'] == [4, 5]
+    numbers = dict(db.execute("SELECT id, invoice_number FROM invoices"))
+    assert all(numbers[invoice_id] == number for invoice_id, number in _items_by_invoice(db) if invoice_id in numbers)
+    history = db.execute("SELECT invoice_id FROM invoice_history WHERE invoice_id IN (4, 5) ORDER BY invoice_id")
+    assert [row[0] for row in history] == [4, 5]
+    assert [total for total, in db.execute("SELECT total FROM invoices WHERE id IN (4, 5) ORDER BY id")] == [100, 200]
+
+def test_batch_fails_whole_when_ids_are_not_consecutive(db):
+    models.create_invoices_batch([_invoice('INV-1'), _invoice('INV-2')], ADMIN)
+    # A sequence behind max(id) makes the computed first id wrong
+    db.execute("UPDATE sqlite_sequence SET seq = 0 WHERE name = 'invoices'")
+    db.commit()
+    with pytest.raises(ValueError, match="not allocated consecutively"):
+        models.create_invoices_batch([_invoice('INV-3', client_id=GLOBEX)], ADMIN)
+    assert db.execute("SELECT COUNT(*) FROM invoices").fetchone()[0] == 2
+    assert db.execute("SELECT COUNT(*) FROM invoice_items").fetchone()[0] == 2
+    assert db.execute("SELECT COUNT(*) FROM invoice_history").fetchone()[0] == 2
+
+def _balances(db):
+    rows = db.execute("SELECT id, ROUND(amount_paid, 2), ROUND(balance_due, 2), last_payment_date FROM invoices ORDER BY id")
+    return [tuple(row) for row in rows]
+
+def test_payment_triggers_keep_invoice_balances(db):
+    models.create_invoices_batch([_invoice('INV-1', price=250), _invoice('INV-2', price=80)], ADMIN)
+    db.executemany(
+        "INSERT INTO payments (invoice_id, date, amount, status) VALUES (?, ?, ?, ?)",
+        [(1, '2024-01-20', 100.1, 'completed'), (1, '2024-01-25', 50, 'completed'),
+         (1, '2024-01-30', 40, 'pending'), (2, '2024-01-22', 80, 'completed')]
+    )
+    db.commit()
+    assert _balances(db) == [(1, 150.1, 99.9, '2024-01-25'), (2, 80.0, 0.0, '2024-01-22')]
+
+    db.execute("UPDATE payments SET status = 'failed' WHERE invoice_id = 1 AND date = '2024-01-25'")
+    db.execute("UPDATE payments SET status = 'completed' WHERE status = 'pending'")
+    db.execute("UPDATE payments SET invoice_id = 1 WHERE invoice_id = 2")  # misapplied payment moved
+    db.execute("DELETE FROM payments WHERE amount = 100.1")
+    db.commit()
+    assert _balances(db) == [(1, 120.0, 130.0, '2024-01-30'), (2, 0.0, 80.0, None)]
+
+    assert models.check_invoice_balances()['mismatched'] == 0
+    maintained = _balances(db)
+    models.rebuild_invoice_balances()
+    assert _balances(db) == maintained
+
+@pytest.fixture
+def invoices(db):
+    # Dates, totals and due dates repeat, so pages must break ties on invoice_number
+    models.create_invoices_batch([
+        _invoice(
+            f'INV-{n:03d}', client_id=(ACME, GLOBEX)[n % 2], status=('draft', 'sent', 'paid')[n % 3],
+            date=f'2024-01-{n % 5 + 1:02d}', due_date=None if n % 4 == 0 else f'2024-02-{n % 3 + 1:02d}',
+            price=(50, 75, 50, 120)[n % 4]
+        )
+        for n in range(23)
+    ], ADMIN)
+    return db
+
+def _facet_rows(db):
+    maintained = db.execute(
+        "SELECT status, client_id, invoices FROM invoice_facet_counts WHERE invoices > 0 ORDER BY 1, 2"
+    )
+    grouped = db.execute("SELECT status, client_id, COUNT(*) FROM invoices GROUP BY 1, 2 ORDER BY 1, 2")
+    return [tuple(row) for row in maintained], [tuple(row) for row in grouped]
+
+def test_facet_counts_follow_inserts_updates_and_deletes(invoices):
+    maintained, grouped = _facet_rows(invoices)
+    assert maintained == grouped
+
+    models.update_invoice_status(1, 'cancelled', ADMIN)
+    models.update_invoice_status(2, 'sent', ADMIN)
+    invoices.execute("UPDATE invoices SET client_id = ? WHERE id IN (3, 4)", (GLOBEX,))
+    invoices.execute("DELETE FROM invoices WHERE id IN (5, 6, 7)")
+    invoices.commit()
+    maintained, grouped = _facet_rows(invoices)
+    assert maintained == grouped
+
+    facets = models.search_invoices(client_id=GLOBEX)['facets']
+    assert facets['total'] == invoices.execute("SELECT COUNT(*) FROM invoices WHERE client_id = ?", (GLOBEX,)).fetchone()[0]
+    assert facets['status']['cancelled'] == 0  # the cancelled invoice is Acme's
+
+def test_invoice_pages_cover_every_row_once_for_each_sort(invoices):
+    for sort in models.INVOICE_SORTS:
+        for order in ('asc', 'desc'):
+            fetch = lambda **kwargs: models.search_invoices(sort=sort, order=order, **kwargs)
+            seen = [row['invoice_number'] for page in all_pages(fetch, limit=4) for row in page]
+            expected = [row['invoice_number'] for row in fetch(limit=100)['data']]
+            assert seen == expected and len(set(seen)) == 23, (sort, order)
+
+def test_invoice_pages_keep_their_filters(invoices):
+    fetch = lambda **kwargs: models.search_invoices(status='sent', sort='total', order='asc', min_total=60, **kwargs)
+    rows = [row for page in all_pages(fetch, limit=2) for row in page]
+    assert rows and all(row['status'] == 'sent' and row['total'] >= 60 for row in rows)
+    assert [row['total'] for row in rows] == sorted(row['total'] for row in rows)
+    assert len(rows) == fetch(limit=2)['facets']['total']
+
+def test_overdue_sweep_moves_only_sent_past_due_invoices_with_a_balance(db):
+    models.create_invoices_batch(
+        [_invoice(f'LATE-{n}', status='sent', due_date='2024-02-01') for n in range(6)]
+        + [_invoice('LATE-6', status='sent', date='2024-01-31', due_date=None)]  # due on its issue date
+        + [
+            _invoice('DRAFT', status='draft', due_date='2024-02-01'),
+            _invoice('PAID', status='sent', due_date='2024-02-01'),
+            _invoice('DUE-TODAY', status='sent', due_date='2024-03-01'),
+            _invoice('NOT-DUE', status='sent', due_date='2024-03-02'),
+        ],
+        ADMIN
+    )
+    db.execute(
+        "INSERT INTO payments (invoice_id, date, amount)"
+        " SELECT id, '2024-02-01', total FROM invoices WHERE invoice_number = 'PAID'"
+    )
+    db.commit()
+
+    assert models.mark_overdue_invoices('2024-03-01', ADMIN, batch_size=3) == 7
+    overdue = db.execute("SELECT invoice_number FROM invoices WHERE status = 'overdue' ORDER BY id")
+    assert [row[0] for row in overdue] == [f'LATE-{n}' for n in range(7)]
+    history = db.execute(
+        "SELECT i.invoice_number FROM invoice_history h JOIN invoices i ON i.id = h.invoice_id"
+        " WHERE h.status = 'overdue' AND h.changed_by = ? ORDER BY h.invoice_id", (ADMIN,)
+    )
+    assert [row[0] for row in history] == [f'LATE-{n}' for n in range(7)]
+    maintained, grouped = _facet_rows(db)
+    assert maintained == grouped
+
+    assert models.mark_overdue_invoices('2024-03-01', ADMIN, batch_size=3) == 0
+    assert db.execute("SELECT COUNT(*) FROM invoice_history WHERE status = 'overdue'").fetchone()[0] == 7
+
+def _aging(as_of_date):
+    report = models.generate_ar_aging(as_of_date)
+    return {row['client_name']: {key: row[key] for key in ['invoices', *models.AGING_COLUMNS, 'total']}
+            for row in report['clients']}, report['totals']
+
+def _buckets(invoices, current=0, days_1_30=0, days_31_60=0, days_61_90=0, days_over_90=0):
+    total = current + days_1_30 + days_31_60 + days_61_90 + days_over_90
+    return {'invoices': invoices, 'current': current, 'days_1_30': days_1_30, 'days_31_60': days_31_60,
+            'days_61_90': days_61_90, 'days_over_90': days_over_90, 'total': total}
+
+def test_ar_aging_buckets_partial_payments_and_as_of_date(db):
+    # Days past due on 2024-06-30, at each side of the 0/30/60/90 day edges
+    edges = ['2024-07-15', '2024-06-30', '2024-06-29', '2024-05-31', '2024-05-30',
+             '2024-05-01', '2024-04-30', '2024-04-01', '2024-03-31']
+    models.create_invoices_batch([
+        _invoice(f'A{n}', status='sent', date='2024-01-01', due_date=due, price=2 ** n)
+        for n, due in enumerate(edges)
+    ] + [
+        _invoice('G0', GLOBEX, 'sent', due_date='2024-06-20'),
+        _invoice('G1', GLOBEX, 'sent', date='2024-02-01', due_date=None, price=200),  # aged from its issue date
+        _invoice('G2', GLOBEX, 'draft', due_date='2024-05-01', price=50),
+        _invoice('G3', GLOBEX, 'sent', date='2024-07-01', due_date='2024-07-31', price=60),
+        _invoice('G4', GLOBEX, 'sent', due_date='2024-06-01', price=40),
+        _invoice('G5', GLOBEX, 'cancelled', due_date='2024-01-01', price=500),
+    ], ADMIN)
+    ids = dict((number, invoice_id) for invoice_id, number in db.execute("SELECT id, invoice_number FROM invoices"))
+    db.executemany(
+        "INSERT INTO payments (invoice_id, date, amount, status) VALUES (?, ?, ?, ?)",
+        [(ids['G0'], '2024-06-10', 30, 'completed'), (ids['G0'], '2024-07-02', 20, 'completed'),
+         (ids['G1'], '2024-07-05', 200, 'completed'), (ids['G4'], '2024-06-15', 40, 'pending')]
+    )
+    db.commit()
+    models.update_invoice_status(ids['G1'], 'paid', ADMIN)
+
+    clients, totals = _aging('2024-06-30')
+    assert clients == {
+        'Acme': _buckets(9, current=1 + 2, days_1_30=4 + 8, days_31_60=16 + 32, days_61_90=64 + 128, days_over_90=256),
+        # G0 less the payment made by then, G4 whose payment is still pending, G1 paid only later
+        'Globex': _buckets(3, days_1_30=70 + 40, days_over_90=200),
+    }
+    assert totals == _buckets(12, current=3, days_1_30=122, days_31_60=48, days_61_90=192, days_over_90=456)
+
+    clients, _ = _aging('2024-07-05')
+    assert clients['Globex'] == _buckets(3, current=60, days_1_30=50, days_31_60=40)
+    assert clients['Acme']['days_1_30'] == 2 + 4  # due 06-30 and 06-29 are now 5 and 6 days late
+
+    with pytest.raises(ValueError, match="as_of_date is required"):
+        models.generate_ar_aging('30/06/2024')
@@ -0,0 +1,136 @@
+import sqlite3
+import migrate
+import models
+from account_catalog import get_account_catalog
+
+def _schema(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {
+            (row[0], row[1]) for row in conn.execute(
+                "SELECT type, name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'"
+            )
+        }
+    finally:
+        conn.close()
+
+def _version(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+def test_migrates_an_empty_database(db_path):
+    latest = migrate.load_migrations()[-1][0]
+    applied = migrate.migrate(db_path)
+    assert [version for version, _ in applied] == [version for version, _, _ in migrate.load_migrations()]
+    assert _version(db_path) == latest
+    assert migrate.migrate(db_path) == []  # nothing left to apply
+
+def test_migrates_a_baseline_database_with_data(db_path, tmp_path):
+    # The schema as it was before migrations (0001 is the former schema.sql), with legacy rows
+    migrate.migrate(db_path, target=1)
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        INSERT INTO users (username, email, password_hash) VALUES ('admin', 'admin@example.com', 'x');
+        INSERT INTO accounts (code, name, type, balance) VALUES
+            ('1000', 'Cash', 'Asset', 150), ('4000', 'Sales', 'Revenue', -150);
+        INSERT INTO transactions (date, description, debit_account, credit_account, amount, status) VALUES
+            ('2024-01-10', 'Sale', 1, 2, 100, 'completed'),
+            ('2024-02-10', 'Sale', 1, 2, 50, 'pending');
+        INSERT INTO invoices (invoice_number, client, date, amount, status) VALUES
+            ('INV-1', 'Acme', '2024-01-10', 100, 'pending'),
+            ('INV-2', 'Acme', '2024-02-10', 50, 'paid'),
+            ('INV-3', 'Globex', '2024-03-10', 75, 'overdue');
+    """)
+    conn.commit()
+    conn.close()
+
+    migrate.migrate(db_path)
+
+    fresh = str(tmp_path / 'fresh.db')
+    migrate.migrate(fresh)
+    assert _schema(db_path) == _schema(fresh)
+    assert _version(db_path) == _version(fresh)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        assert conn.execute("SELECT status FROM transactions ORDER BY id").fetchall() == [('posted',), ('draft',)]
+        assert conn.execute("SELECT code, name, balance FROM accounts ORDER BY id").fetchall() == [
+            ('1000', 'Cash', 150), ('4000', 'Sales', -150),
+        ]
+        invoices = conn.execute(
+            """
+            SELECT i.invoice_number, c.name, i.total, i.balance_due, i.status
+            FROM invoices i JOIN clients c ON c.id = i.client_id ORDER BY i.id
+            """
+        ).fetchall()
+        assert invoices == [
+            ('INV-1', 'Acme', 100, 100, 'sent'),
+            ('INV-2', 'Acme', 50, 50, 'paid'),
+            ('INV-3', 'Globex', 75, 75, 'overdue'),
+        ]
+        # Maintained tables are backfilled from the legacy rows
+        facets = set(conn.execute("SELECT status, client_id, invoices FROM invoice_facet_counts WHERE invoices > 0"))
+        assert facets == {('sent', 1, 1), ('paid', 1, 1), ('overdue', 2, 1)}
+        activity = conn.execute(
+            "SELECT account_id, transaction_count, total_debits, total_credits FROM account_activity ORDER BY account_id"
+        ).fetchall()
+        assert activity == [(1, 2, 150, 0), (2, 2, 0, 150)]
+    finally:
+        conn.close()
+
+# Layout written by the old reset_db.py (see accounting.db.backup): no account codes
+LEGACY_SCHEMA = """
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL UNIQUE,
+    email TEXT NOT NULL UNIQUE,
+    password_hash TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    is_active BOOLEAN DEFAULT 1
+);
+CREATE TABLE accounts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE,
+    type TEXT CHECK(type IN ('Asset', 'Liability', 'Equity', 'Revenue', 'Expense')) NOT NULL,
+    balance REAL DEFAULT 0.00,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    previous_balance REAL DEFAULT 0.00
+);
+CREATE TABLE transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date DATE NOT NULL,
+    description TEXT,
+    debit_account INTEGER NOT NULL,
+    credit_account INTEGER NOT NULL,
+    amount REAL NOT NULL,
+    status TEXT CHECK(status IN ('pending', 'completed')) DEFAULT 'pending',
+    FOREIGN KEY (debit_account) REFERENCES accounts(id),
+    FOREIGN KEY (credit_account) REFERENCES accounts(id)
+);
+INSERT INTO accounts (name, type, balance, updated_at) VALUES
+    ('Cash', 'Asset', 100, '2023-05-01 10:00:00'), ('Sales', 'Revenue', -100, '2023-05-01 10:00:00');
+INSERT INTO transactions (date, description, debit_account, credit_account, amount, status) VALUES
+    ('2024-01-10', 'Sale', 1, 2, 100, 'completed');
+"""
+
+def test_migrates_the_legacy_reset_db_layout(db_path, tmp_path):
+    conn = sqlite3.connect(db_path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.close()
+
+    migrate.migrate(db_path)
+
+    fresh = str(tmp_path / 'fresh.db')
+    migrate.migrate(fresh)
+    assert _schema(db_path) == _schema(fresh)
+
+    catalog = get_account_catalog()
+    assert catalog.get(1) == {
+        'id': 1, 'code': '1', 'name': 'Cash', 'type': 'Asset', 'description': None, 'is_active': 1,
+    }
+    assert catalog.by_code('2')['name'] == 'Sales'
+    assert [(a['code'], a['transaction_count']) for a in models.get_accounts()] == [('1', 1), ('2', 1)]
+    assert models.generate_report('trial_balance', '2024-01-01', '2024-01-31')['totals']['debits'] == 100
@@ -0,0 +1,39 @@
+import pytest
+import models
+from conftest import ADMIN, BANK, CASH, RENT, SALES, all_pages
+
+@pytest.fixture
+def ledger(db):
+    # Several postings share a date, so pages must break ties on id
+    models.create_transactions_batch([
+        {'date': f'2024-01-{day:02d}', 'reference': f'T{n}', 'description': 'Posting',
+         'debit_account': (CASH, BANK, RENT)[n % 3], 'credit_account': SALES, 'amount': n + 1}
+        for n, day in enumerate([1, 1, 1, 2, 2, 3, 5, 5, 5, 5, 8, 9, 9])
+    ], ADMIN)
+    return db
+
+def test_transaction_pages_cover_every_row_once(ledger):
+    expected = [row['id'] for row in models.get_transactions(limit=1000)]
+    pages = all_pages(models.get_transactions_page, limit=4)
+    assert [len(page) for page in pages] == [4, 4, 4, 1]
+    assert [row['id'] for page in pages for row in page] == expected
+
+def test_transaction_pages_filter_by_account_and_date(ledger):
+    fetch = lambda **kwargs: models.get_transactions_page(
+        account_id=CASH, start_date='2024-01-02', end_date='2024-01-09', **kwargs
+    )
+    rows = [row for page in all_pages(fetch, limit=2) for row in page]
+    expected = [
+        row['id'] for row in models.get_transactions(account_id=CASH, start_date='2024-01-02', end_date='2024-01-09')
+    ]
+    assert [row['id'] for row in rows] == expected
+    assert rows and all(CASH in (row['debit_account'], row['credit_account']) for row in rows)
+
+def test_last_page_has_no_cursor(ledger):
+    page = models.get_transactions_page(limit=100)
+    assert len(page['data']) == 13 and page['next_cursor'] is None
+
+def test_transaction_cursor_round_trip_and_validation(ledger):
+    assert models.decode_cursor(models.encode_cursor('2024-01-05', 42)) == ('2024-01-05', 42)
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        models.get_transactions_page(cursor='not-a-cursor')
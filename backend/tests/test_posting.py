@@ -0,0 +1,89 @@
+import time
+from concurrent.futures import Future, TimeoutError
+import pytest
+from database import open_connection
+from posting import PostingWriter
+
+def _insert_client(cursor, name):
+    cursor.execute("INSERT INTO clients (name) VALUES (?)", (name,))
+    return cursor.lastrowid
+
+def _insert_then_fail(cursor, name):
+    _insert_client(cursor, name)
+    raise ValueError("rejected")
+
+def _break_savepoint(cursor):
+    # Releasing the savepoint early makes the writer's ROLLBACK TO fail
+    cursor.execute("RELEASE SAVEPOINT posting")
+    raise ValueError("rejected")
+
+def _sleep(cursor, seconds):
+    time.sleep(seconds)
+    return 'done'
+
+def _client_names(db):
+    return {row[0] for row in db.execute("SELECT name FROM clients")}
+
+def test_group_is_committed_once(db_path, db):
+    writer = PostingWriter(db_path)
+    conn = open_connection(db_path)
+    conn.isolation_level = None
+    statements = []
+    conn.set_trace_callback(statements.append)
+    batch = [(_insert_client, (f"Client {i}",), Future()) for i in range(5)]
+
+    writer._commit_group(conn, batch)
+    conn.close()
+
+    assert [future.result() for _, _, future in batch] == [3, 4, 5, 6, 7]
+    assert statements.count("BEGIN IMMEDIATE") == 1
+    assert statements.count("COMMIT") == 1
+    assert statements.count("SAVEPOINT posting") == 5
+
+def test_failed_posting_is_rolled_back_alone(db_path, db):
+    writer = PostingWriter(db_path)
+    conn = open_connection(db_path)
+    conn.isolation_level = None
+    batch = [
+        (_insert_client, ("First",), Future()),
+        (_insert_then_fail, ("Failed",), Future()),
+        (_insert_client, ("Last",), Future()),
+    ]
+
+    writer._commit_group(conn, batch)
+    conn.close()
+
+    assert batch[0][2].result() and batch[2][2].result()
+    with pytest.raises(ValueError, match="rejected"):
+        batch[1][2].result()
+    assert _client_names(db) == {'Acme', 'Globex', 'First', 'Last'}
+
+def test_post_returns_the_result(db_path, db):
+    writer = PostingWriter(db_path)
+    client_id = writer.post(_insert_client, "Initech")
+    assert db.execute("SELECT name FROM clients WHERE id = ?", (client_id,)).fetchone()[0] == 'Initech'
+    with pytest.raises(ValueError, match="rejected"):
+        writer.post(_insert_then_fail, "Failed")
+    assert 'Failed' not in _client_names(db)
+
+def test_writer_recovers_from_a_broken_group(db_path, db):
+    writer = PostingWriter(db_path)
+    with pytest.raises(Exception, match="no such savepoint"):
+        writer.post(_break_savepoint)
+    # The transaction was rolled back, so the next group can begin its own
+    writer.post(_insert_client, "After")
+    assert 'After' in _client_names(db)
+
+def test_timed_out_posting_is_cancelled_while_queued(db_path, db):
+    writer = PostingWriter(db_path, max_wait_ms=0)
+    busy = writer.submit(_sleep, 0.5)
+    with pytest.raises(TimeoutError):
+        writer.post(_insert_client, "Too late", timeout=0.1)
+    assert busy.result() == 'done'
+    writer.post(_insert_client, "Next")  # runs after the cancelled posting would have
+    assert _client_names(db) == {'Acme', 'Globex', 'Next'}
+
+def test_timed_out_posting_already_running_is_awaited(db_path, db):
+    writer = PostingWriter(db_path)
+    writer.post(_sleep, 0)  # writer thread started and idle
+    assert writer.post(_sleep, 0.5, timeout=0.1) == 'done'
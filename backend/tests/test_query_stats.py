@@ -0,0 +1,90 @@
+import json
+import os
+import threading
+import pytest
+import database
+import query_stats
+
+@pytest.fixture
+def stats(monkeypatch):
+    monkeypatch.setattr(query_stats, 'QUERY_STATS_ENABLED', True)
+    monkeypatch.setattr(query_stats, 'QUERY_STATS_SAMPLE_RATE', 1.0)
+    monkeypatch.setattr(query_stats, 'SLOW_QUERY_MS', 10_000)
+    query_stats.reset()
+    yield query_stats
+    query_stats.reset()
+
+def _entry(fingerprint):
+    return next(q for q in query_stats.snapshot()['queries'] if q['fingerprint'] == fingerprint)
+
+def test_fingerprint_normalizes_literals_and_spacing():
+    fp = query_stats.fingerprint
+    assert fp("SELECT * FROM accounts WHERE code = '1000'  AND\n id = 7") == "SELECT * FROM accounts WHERE code = ? AND id = ?"
+    assert fp("SELECT name FROM clients WHERE name = 'O''Brien' AND total > 12.50") == \
+        "SELECT name FROM clients WHERE name = ? AND total > ?"
+    assert fp("SELECT * FROM invoices WHERE id IN (?, ?, ?)") == fp("SELECT * FROM invoices WHERE id in (?)")
+    assert fp("SELECT * FROM t1 WHERE x = 2") == "SELECT * FROM t1 WHERE x = ?"  # names keep their digits
+
+def test_calls_with_different_literals_share_one_entry(stats):
+    for n, elapsed in enumerate([0.002, 0.010, 0.004]):
+        stats.record(f"SELECT * FROM accounts WHERE id = {n}", (), elapsed, rows=2)
+    entry = _entry("SELECT * FROM accounts WHERE id = ?")
+    assert (entry['calls'], entry['rows'], entry['total_ms'], entry['max_ms']) == (3, 6, 16.0, 10.0)
+    assert (entry['p50_ms'], entry['p99_ms']) == (4.0, 10.0)
+
+def test_counters_from_every_thread_are_merged(stats):
+    def run():
+        for _ in range(100):
+            stats.record("SELECT 1", (), 0.001)
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert _entry("SELECT ?")['calls'] == 400
+
+def test_slow_queries_are_logged_with_their_plan(stats, db, monkeypatch):
+    monkeypatch.setattr(query_stats, 'SLOW_QUERY_MS', 0)
+    database.execute_query("SELECT * FROM accounts WHERE code = ?", ('1000',), fetchone=True)
+    slow = query_stats.snapshot()['slow_queries'][-1]
+    assert slow['fingerprint'] == "SELECT * FROM accounts WHERE code = ?"
+    assert slow['plan'] and 'accounts' in slow['plan'][0]
+
+def test_flush_writes_a_dump_the_cli_reads(stats, tmp_path, monkeypatch):
+    monkeypatch.setattr(query_stats, 'QUERY_STATS_DIR', str(tmp_path))
+    stats.record("SELECT * FROM accounts WHERE id = 1", (), 0.003, rows=1)
+    assert stats.flush()
+    assert os.listdir(tmp_path) == [f'{os.getpid()}.json']
+    with open(tmp_path / f'{os.getpid()}.json') as f:
+        assert json.load(f)['raw']["SELECT * FROM accounts WHERE id = ?"]['calls'] == 1
+    assert stats.load_dumps(str(tmp_path))['queries'][0]['calls'] == 1
+
+def test_concurrent_flushes_do_not_fail(stats, tmp_path, monkeypatch):
+    monkeypatch.setattr(query_stats, 'QUERY_STATS_DIR', str(tmp_path))
+    monkeypatch.setattr(query_stats, 'QUERY_STATS_FLUSH_SECONDS', 0)  # every record() tries to flush
+    errors = []
+
+    def run():
+        try:
+            for n in range(50):
+                stats.record(f"SELECT {n}", (), 0.001)
+                stats.flush()
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert os.listdir(tmp_path) == [f'{os.getpid()}.json']
+
+def test_flush_failure_does_not_reach_the_query(stats, db, tmp_path, monkeypatch, caplog):
+    blocker = tmp_path / 'not-a-directory'
+    blocker.write_text('')
+    monkeypatch.setattr(query_stats, 'QUERY_STATS_DIR', str(blocker / 'stats'))
+    monkeypatch.setattr(query_stats, 'QUERY_STATS_FLUSH_SECONDS', 0)
+    database.execute_query("UPDATE accounts SET name = 'Till' WHERE code = '1000'", commit=True)
+    assert db.execute("SELECT name FROM accounts WHERE code = '1000'").fetchone()[0] == 'Till'
+    assert "Could not write query stats" in caplog.text
+    assert not stats.flush()
@@ -0,0 +1,42 @@
+import pytest
+import recurring_invoices
+from conftest import ACME, ADMIN, GLOBEX
+
+ITEMS = [{'description': 'Support plan', 'quantity': 1, 'unit_price': 99.5, 'taxable': False}]
+
+@pytest.fixture
+def templates(db, db_path, monkeypatch):
+    # Spawned building processes open the database named in the environment
+    monkeypatch.setenv('DATABASE_PATH', db_path)
+    for n in range(12):
+        recurring_invoices.create_recurring_invoice(
+            (ACME, GLOBEX)[n % 2], ('monthly', 'quarterly')[n % 3 == 0], f'2024-01-{n % 28 + 1:02d}', ITEMS,
+            created_by=ADMIN
+        )
+    return db
+
+def _generated(db):
+    return db.execute("SELECT recurring_id, period, COUNT(*) FROM invoices GROUP BY 1, 2 ORDER BY 1, 2").fetchall()
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_rerun_for_the_same_date_creates_nothing(templates, workers):
+    first = recurring_invoices.generate_recurring_invoices('2024-06-30', ADMIN, workers=workers, chunk_size=5)
+    # 8 monthly templates owe 6 invoices each, 4 quarterly ones owe 2
+    assert (first['templates'], first['created'], first['skipped']) == (12, 56, 0)
+    generated = _generated(templates)
+    assert all(count == 1 for _, _, count in generated)
+
+    again = recurring_invoices.generate_recurring_invoices('2024-06-30', ADMIN, workers=workers, chunk_size=5)
+    assert (again['templates'], again['created']) == (0, 0)
+    assert _generated(templates) == generated
+
+def test_lost_advance_does_not_bill_a_period_twice(templates):
+    recurring_invoices.generate_recurring_invoices('2024-06-30', ADMIN, workers=1, chunk_size=5)
+    # As if a run wrote its invoices but the templates' next run dates were lost
+    templates.execute("UPDATE recurring_invoices SET next_run_date = start_date, last_period = NULL")
+    templates.commit()
+    rerun = recurring_invoices.generate_recurring_invoices('2024-07-31', ADMIN, workers=1, chunk_size=5)
+    assert (rerun['created'], rerun['skipped']) == (12, 56)  # July, for every template
+    assert all(count == 1 for _, _, count in _generated(templates))
+    last_periods = templates.execute("SELECT DISTINCT last_period FROM recurring_invoices WHERE schedule = 'monthly'")
+    assert [row[0] for row in last_periods] == ['2024-07']
@@ -0,0 +1,94 @@
+import gzip
+import json
+import pytest
+import models
+import report_jobs
+from posting import get_posting_writer
+from conftest import ADMIN, CASH, SALES
+
+@pytest.fixture
+def queue(db, monkeypatch):
+    """A queue without worker threads; tests run its jobs with _drain"""
+    queue = report_jobs.ReportJobQueue(workers=0)
+    monkeypatch.setattr(report_jobs, '_queue', queue)
+    return queue
+
+def _drain(queue):
+    writer = get_posting_writer()
+    ran = []
+    while (job := writer.post(report_jobs._claim_next, queue.stale_after)) is not None:
+        queue._run(writer, job)
+        ran.append(job['id'])
+    return ran
+
+def test_identical_pending_requests_share_one_job(queue, db):
+    models.create_transaction('2024-01-10', 'S1', 'Sale', CASH, SALES, 100, ADMIN)
+    first = queue.submit('trial_balance', '2024-01-01', '2024-01-31', ADMIN)
+    second = queue.submit('trial_balance', '2024-01-01', '2024-01-31', ADMIN)
+    other = queue.submit('trial_balance', '2024-01-01', '2024-02-29', ADMIN)
+    assert (first['coalesced'], second['coalesced'], other['coalesced']) == (False, True, False)
+    assert second['id'] == first['id'] != other['id']
+    assert first['status'] == 'queued'
+
+    assert _drain(queue) == [first['id'], other['id']]
+    assert queue.get(first['id'])['status'] == 'done'
+    status, etag, result = queue.result(first['id'])
+    report = json.loads(gzip.decompress(result))
+    assert report == json.loads(json.dumps(models.generate_report('trial_balance', '2024-01-01', '2024-01-31'), default=str))
+
+    # A finished job is not joined; the same request queues a fresh one
+    again = queue.submit('trial_balance', '2024-01-01', '2024-01-31', ADMIN)
+    assert not again['coalesced'] and again['id'] not in (first['id'], other['id'])
+    _drain(queue)
+    assert queue.result(again['id'])[1] == etag  # identical report, identical ETag
+
+def test_invalid_requests_are_not_queued(queue, db):
+    for args, message in [
+        (('profit', '2024-01-01', '2024-01-31'), "Invalid report type"),
+        (('trial_balance', '2024-01-31', '2024-01-01'), "must not be after"),
+        (('trial_balance', '2024-01-01', None), "required as YYYY-MM-DD"),
+    ]:
+        with pytest.raises(ValueError, match=message):
+            queue.submit(*args)
+    assert db.execute("SELECT COUNT(*) FROM reports").fetchone()[0] == 0
+
+def test_report_routes_queue_poll_and_serve_the_result(queue, client):
+    models.create_transaction('2024-01-10', 'S1', 'Sale', CASH, SALES, 100, ADMIN)
+    request = {'report_type': 'trial_balance', 'start_date': '2024-01-01', 'end_date': '2024-01-31'}
+    response = client.post('/api/reports/reports', json=request)
+    assert response.status_code == 202
+    job = response.get_json()
+    url = f"/api/reports/reports/{job['id']}"
+    assert response.headers['Location'] == url == job['status_url']
+    assert job['result_url'] == f'{url}/result' and job['coalesced'] is False
+    assert client.post('/api/reports/reports', json=request).get_json()['coalesced'] is True
+
+    pending = client.get(f'{url}/result')
+    assert (pending.status_code, pending.get_json()['status']) == (202, 'queued')
+    _drain(queue)
+    assert client.get(url).get_json()['status'] == 'done'
+
+    plain = client.get(f'{url}/result')
+    assert plain.status_code == 200 and 'Content-Encoding' not in plain.headers
+    etag = plain.headers['ETag']
+    zipped = client.get(f'{url}/result', headers={'Accept-Encoding': 'gzip, deflate'})
+    assert zipped.headers['Content-Encoding'] == 'gzip' and zipped.headers['ETag'] == etag
+    assert json.loads(gzip.decompress(zipped.data)) == plain.get_json()
+    assert plain.get_json()['totals']['debits'] == 100
+    assert plain.headers['Vary'] == 'Accept-Encoding'
+
+    cached = client.get(f'{url}/result', headers={'If-None-Match': etag})
+    assert (cached.status_code, cached.data, cached.headers['ETag']) == (304, b'', etag)
+    stale = client.get(f'{url}/result', headers={'If-None-Match': '"something-else"'})
+    assert stale.status_code == 200
+
+    assert client.get('/api/reports/reports/999/result').status_code == 404
+    assert client.post('/api/reports/reports', json={'report_type': 'trial_balance'}).status_code == 400
+
+def test_failed_job_result_is_a_conflict(queue, client, monkeypatch):
+    job = queue.submit('trial_balance', '2024-01-01', '2024-01-31', ADMIN)
+    monkeypatch.setattr(models, 'generate_report', lambda *args, **kwargs: 1 / 0)
+    _drain(queue)
+    response = client.get(f"/api/reports/reports/{job['id']}/result")
+    assert (response.status_code, response.get_json()['status']) == (409, 'failed')
+    assert queue.get(job['id'])['error'] == 'division by zero'
@@ -0,0 +1,292 @@
+import threading
+import time
+import pytest
+import database
+import ledger_arrays
+import models
+from conftest import ADMIN, BANK, CASH, LOAN, RENT, SALES
+from report_cache import get_report_cache
+
+def test_cached_report_is_replaced_when_the_ledger_moves(db):
+    cache = get_report_cache()
+    cache.reset_stats()
+    models.create_transaction('2024-01-05', 'S1', 'Sale', CASH, SALES, 100, ADMIN)
+
+    first = models.generate_report('trial_balance', '2024-01-01', '2024-01-31')
+    again = models.generate_report('trial_balance', '2024-01-01', '2024-01-31')
+    assert again == first
+    assert (cache.stats()['hits'], cache.stats()['misses']) == (1, 1)
+
+    models.create_transaction('2024-01-06', 'S2', 'Sale', CASH, SALES, 50, ADMIN)
+    after_posting = models.generate_report('trial_balance', '2024-01-01', '2024-01-31')
+    assert after_posting['totals']['debits'] == 150
+    assert cache.stats()['misses'] == 2
+
+def test_account_change_elsewhere_invalidates_cached_reports(db):
+    models.create_transaction('2024-01-05', 'S1', 'Sale', CASH, SALES, 100, ADMIN)
+    models.generate_report('trial_balance', '2024-01-01', '2024-01-31')
+    # Another worker renames the account; the accounts counter moves with it
+    db.execute("UPDATE accounts SET name = 'Till' WHERE id = ?", (CASH,))
+    db.commit()
+    report = models.generate_report('trial_balance', '2024-01-01', '2024-01-31')
+    assert report['accounts'][0]['name'] == 'Till'
+
+def test_cache_hands_out_copies(db):
+    report = models.generate_report('income_statement', '2024-01-01', '2024-01-31')
+    report['totals']['revenue'] = 'changed by the caller'
+    assert models.generate_report('income_statement', '2024-01-01', '2024-01-31')['totals']['revenue'] == 0
+
+def _post_cents_ledger():
+    for n in range(30):
+        models.create_transaction(
+            f'2024-{n % 6 + 1:02d}-{n % 28 + 1:02d}', f'S{n}', 'Sale', (CASH, BANK)[n % 2], SALES, 10.1 + n, ADMIN
+        )
+        models.create_transaction(f'2024-{n % 6 + 1:02d}-{(n * 7) % 28 + 1:02d}', f'R{n}', 'Rent', RENT, CASH, 3.3, ADMIN)
+    models.create_compound_transaction('2024-03-15', 'L1', 'Loan', [
+        {'account_id': CASH, 'debit': 0.7}, {'account_id': BANK, 'debit': 0.2}, {'account_id': LOAN, 'credit': 0.9},
+    ], ADMIN)
+
+REPORTS = [
+    ('balance_sheet', '2024-01-01', '2024-03-14', None),
+    ('income_statement', '2024-01-10', '2024-05-20', None),
+    ('trial_balance', '2024-02-01', '2024-04-30', None),
+    ('cash_flow', '2024-01-01', '2024-06-30', None),
+    ('income_statement', '2024-01-01', '2024-06-30', 'monthly'),
+    ('trial_balance', '2024-01-15', '2024-06-30', 'quarterly'),
+]
+
+def _all_reports():
+    return [
+        models._generate_report(report_type, start_date, end_date, 'json', periods)
+        for report_type, start_date, end_date, periods in REPORTS
+    ]
+
+def _with_engine(monkeypatch, engine):
+    monkeypatch.setattr(ledger_arrays, 'REPORT_ENGINE', engine)
+    return _all_reports()
+
+def test_numpy_engine_matches_sql(db, monkeypatch):
+    pytest.importorskip('numpy')
+    _post_cents_ledger()
+    from_sql = _with_engine(monkeypatch, 'sql')
+    assert _with_engine(monkeypatch, 'numpy') == from_sql
+
+    # Postings made after the arrays were loaded are picked up incrementally
+    models.create_transaction('2024-02-29', 'S99', 'Late sale', BANK, SALES, 99.99, ADMIN)
+    from_numpy = _with_engine(monkeypatch, 'numpy')
+    assert from_numpy == _with_engine(monkeypatch, 'sql')
+    assert from_numpy != from_sql
+
+def test_numpy_engine_follows_edits_and_deletes(db, monkeypatch):
+    pytest.importorskip('numpy')
+    _post_cents_ledger()
+    _with_engine(monkeypatch, 'numpy')  # arrays loaded
+
+    edits = [
+        "UPDATE transactions SET amount = 12.34 WHERE reference = 'S3'",
+        "UPDATE transactions SET date = '2024-05-05' WHERE reference = 'R4'",  # same count and total
+        "UPDATE transaction_entries SET account_id = 1 WHERE account_id = 2",
+        "DELETE FROM transactions WHERE reference = 'S7'",
+    ]
+    for edit in edits:
+        db.execute(edit)
+        db.commit()
+        # Hand edits leave the SQL path's monthly rollups behind until rebuilt; the arrays must notice alone
+        models.rebuild_period_totals()
+        assert _with_engine(monkeypatch, 'numpy') == _with_engine(monkeypatch, 'sql'), edit
+
+    # An edit and a new posting between two refreshes
+    db.execute("UPDATE transactions SET amount = 1 WHERE reference = 'S8'")
+    db.commit()
+    models.create_transaction('2024-03-03', 'S100', 'Sale', CASH, SALES, 0.01, ADMIN)
+    models.rebuild_period_totals()
+    assert _with_engine(monkeypatch, 'numpy') == _with_engine(monkeypatch, 'sql')
+
+def test_bundle_sections_run_in_parallel_on_read_only_connections(db, monkeypatch):
+    _post_cents_ledger()
+    expected = {
+        report_type: models.generate_report(report_type, '2024-01-01', '2024-06-30')
+        for report_type in models.BUNDLE_REPORT_TYPES
+    }
+    sections = []
+    generate = models.generate_report
+
+    def slow_generate(*args, **kwargs):
+        sections.append((threading.current_thread().name, database._scope.readonly))
+        time.sleep(0.3)
+        return generate(*args, **kwargs)
+    monkeypatch.setattr(models, 'generate_report', slow_generate)
+
+    started = time.perf_counter()
+    bundle = models.generate_report_bundle(list(models.BUNDLE_REPORT_TYPES), '2024-01-01', '2024-06-30')
+    assert time.perf_counter() - started < 0.3 * len(sections) - 0.2  # overlapped, not one after another
+    assert bundle == expected and list(bundle) == list(models.BUNDLE_REPORT_TYPES)
+    assert len(sections) == 4
+    assert all(name.startswith('report-bundle') and readonly for name, readonly in sections)
+
+def test_bundle_section_cannot_write(db):
+    def write():
+        database.execute_query("UPDATE accounts SET name = 'Till' WHERE id = ?", (CASH,), commit=True)
+    future = models._get_bundle_executor().submit(write)
+    with pytest.raises(Exception, match="readonly"):
+        future.result()
+
+def test_bundle_route(client):
+    models.create_transaction('2024-01-05', 'S1', 'Sale', CASH, SALES, 100, ADMIN)
+    response = client.post('/api/reports/bundle', json={
+        'start_date': '2024-01-01', 'end_date': '2024-01-31', 'report_types': ['trial_balance', 'income_statement'],
+    })
+    assert response.status_code == 200
+    reports = response.get_json()['reports']
+    assert set(reports) == {'trial_balance', 'income_statement'}
+    assert reports['income_statement']['totals']['revenue'] == 100
+
+    assert client.post('/api/reports/bundle', json={'start_date': 'soon'}).status_code == 400
+    assert client.post('/api/reports/reports/bundle', json={}).status_code in (404, 405)  # no longer served there
+
+def _post_ledger_across_the_boundary():
+    models.create_transaction('2024-01-10', 'O1', 'Opening sale', CASH, SALES, 100, ADMIN)
+    models.create_transaction('2024-02-14', 'O2', 'Day before the period', RENT, CASH, 30.5, ADMIN)
+    models.create_compound_transaction('2024-02-01', 'O3', 'Loan', [
+        {'account_id': BANK, 'debit': 500}, {'account_id': LOAN, 'credit': 500},
+    ], ADMIN)
+    models.create_transaction('2024-02-15', 'P1', 'First day', CASH, SALES, 20, ADMIN)
+    models.create_transaction('2024-02-20', 'P2', 'Rent', RENT, CASH, 12.25, ADMIN)
+    models.create_compound_transaction('2024-02-20', 'P3', 'Split', [
+        {'account_id': CASH, 'debit': 7}, {'account_id': BANK, 'debit': 3}, {'account_id': SALES, 'credit': 10},
+    ], ADMIN)
+    models.create_transaction('2024-03-15', 'P4', 'Last day', CASH, SALES, 1, ADMIN)
+    models.create_transaction('2024-03-16', 'A1', 'Day after the period', CASH, SALES, 1000, ADMIN)
+
+def test_general_ledger_opening_and_running_balances(db):
+    _post_ledger_across_the_boundary()
+    rows = list(models.iter_general_ledger('2024-02-15', '2024-03-15'))
+    cash = [(row['entry'], row['reference'], row['debit'], row['credit'], row['balance'])
+            for row in rows if row['account_code'] == '1000']
+    assert cash == [
+        ('opening', None, None, None, 69.5),  # 100 - 30.5, up to the day before
+        ('posting', 'P1', 20, 0, 89.5),
+        ('posting', 'P2', 0, 12.25, 77.25),
+        ('posting', 'P3', 7, 0, 84.25),
+        ('posting', 'P4', 1, 0, 85.25),
+        ('closing', None, 28, 12.25, 85.25),
+    ]
+    # Loan has an opening balance and no activity: opening and closing only, in code order
+    assert [(row['account_code'], row['entry']) for row in rows if row['entry'] != 'posting'] == [
+        ('1000', 'opening'), ('1000', 'closing'), ('1100', 'opening'), ('1100', 'closing'),
+        ('2000', 'opening'), ('2000', 'closing'), ('4000', 'opening'), ('4000', 'closing'),
+        ('5000', 'opening'), ('5000', 'closing'),
+    ]
+    loan = [row['balance'] for row in rows if row['account_code'] == '2000']
+    assert loan == [-500, -500]
+    # Closing balances match a plain scan of everything up to the end date
+    for row in rows:
+        if row['entry'] == 'closing':
+            debits, credits = models._account_totals("<= ?", ('2024-03-15',))[row['account_id']]
+            assert row['balance'] == pytest.approx(debits - credits)
+
+def test_general_ledger_streamed_equals_buffered(client):
+    _post_ledger_across_the_boundary()
+    rows = list(models.iter_general_ledger('2024-02-15', '2024-03-15'))
+    response = client.get('/api/reports/reports/general-ledger?start_date=2024-02-15&end_date=2024-03-15')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['rows'] == rows and body['count'] == len(rows)
+
+    ledger = models.generate_general_ledger('2024-02-15', '2024-03-15')['accounts']
+    for row in rows:
+        entry = ledger[row['account_id']]
+        if row['entry'] == 'opening':
+            assert entry['beginning_balance'] == row['balance']
+        elif row['entry'] == 'closing':
+            assert entry['ending_balance'] == row['balance']
+    assert sum(len(entry['transactions']) for entry in ledger.values()) == \
+        sum(row['entry'] == 'posting' for row in rows)
+
+def _periods(start_date, end_date, periods):
+    return [tuple(column.values()) for column in models.report_periods(start_date, end_date, periods)]
+
+def test_report_periods_clip_the_first_and_last_period():
+    assert _periods('2024-01-15', '2024-03-10', 'monthly') == [
+        ('2024-01', '2024-01-15', '2024-01-31'),
+        ('2024-02', '2024-02-01', '2024-02-29'),
+        ('2024-03', '2024-03-01', '2024-03-10'),
+    ]
+    assert _periods('2023-12-31', '2024-01-01', 'monthly') == [
+        ('2023-12', '2023-12-31', '2023-12-31'), ('2024-01', '2024-01-01', '2024-01-01'),
+    ]
+    assert _periods('2024-02-15', '2024-07-01', 'quarterly') == [
+        ('2024-Q1', '2024-02-15', '2024-03-31'),
+        ('2024-Q2', '2024-04-01', '2024-06-30'),
+        ('2024-Q3', '2024-07-01', '2024-07-01'),
+    ]
+    assert _periods('2023-10-01', '2024-03-31', 'quarterly') == [
+        ('2023-Q4', '2023-10-01', '2023-12-31'), ('2024-Q1', '2024-01-01', '2024-03-31'),
+    ]
+    assert _periods('2024-05-05', '2024-05-05', 'quarterly') == [('2024-Q2', '2024-05-05', '2024-05-05')]
+    assert _periods('2024-01-01', '2024-12-31', ['2024-07-01', '2024-04-01']) == [
+        ('2024-01-01', '2024-01-01', '2024-03-31'),
+        ('2024-04-01', '2024-04-01', '2024-06-30'),
+        ('2024-07-01', '2024-07-01', '2024-12-31'),
+    ]
+
+def test_report_periods_reject_bad_splits(monkeypatch):
+    for periods, message in [
+        ('weekly', "periods must be"),
+        (['2024-01-01'], "must fall after start_date"),
+        (['2025-01-01'], "must fall after start_date"),
+        (['2024-02-30'], "boundaries must be dates"),
+    ]:
+        with pytest.raises(ValueError, match=message):
+            models.report_periods('2024-01-01', '2024-12-31', periods)
+    monkeypatch.setattr(models, 'MAX_REPORT_PERIODS', 11)
+    with pytest.raises(ValueError, match="Too many periods"):
+        models.report_periods('2024-01-01', '2024-12-31', 'monthly')
+
+def _post_on_month_edges():
+    models.create_transaction('2024-01-14', 'S0', 'Before the range', CASH, SALES, 1000, ADMIN)
+    models.create_transaction('2024-01-31', 'S1', 'Sale', CASH, SALES, 100, ADMIN)
+    models.create_transaction('2024-02-01', 'S2', 'Sale', BANK, SALES, 40, ADMIN)
+    models.create_transaction('2024-02-29', 'R1', 'Rent', RENT, CASH, 50, ADMIN)
+    models.create_transaction('2024-03-31', 'S3', 'Sale', CASH, SALES, 150, ADMIN)
+    models.create_transaction('2024-04-01', 'S4', 'After the range', CASH, SALES, 1000, ADMIN)
+
+def _line(line):
+    return line['amounts'], line['total'], line['variance'], line['variance_pct']
+
+def test_comparative_income_statement_columns_and_variance(db):
+    _post_on_month_edges()
+    report = models.generate_report('income_statement', '2024-01-15', '2024-03-31', periods='monthly')
+    assert [column['label'] for column in report['periods']] == ['2024-01', '2024-02', '2024-03']
+    totals = report['totals']
+    assert _line(totals['revenue']) == ([100, 40, 150], 290, [None, -60, 110], [None, -60.0, 275.0])
+    # No change is reported as a percentage of a zero period
+    assert _line(totals['expenses']) == ([0, 50, 0], 50, [None, 50, -50], [None, None, -100.0])
+    assert _line(totals['net_income']) == ([100, -10, 150], 240, [None, -110, 160], [None, -110.0, 1600.0])
+    assert [(row['code'], row['amounts']) for row in report['revenue']] == [('4000', [100, 40, 150])]
+
+    # Each column is the plain report for that period
+    for column, amount in zip(report['periods'], totals['net_income']['amounts']):
+        plain = models.generate_report('income_statement', column['start_date'], column['end_date'])
+        assert plain['totals']['net_income'] == amount
+
+    exported = ''.join(models.generate_report(
+        'income_statement', '2024-01-15', '2024-03-31', format='csv', periods='monthly'
+    )).splitlines()
+    assert exported[0].endswith(',2024-01,2024-02,2024-03,total,2024-02 variance,2024-03 variance')
+    assert exported[1] == 'revenue,5,4000,Sales,Revenue,100.00,40.00,150.00,290.00,-60.00,110.00'
+
+def test_comparative_trial_balance_columns_and_variance(db):
+    _post_on_month_edges()
+    report = models.generate_report('trial_balance', '2024-01-15', '2024-04-30', periods='quarterly')
+    assert [tuple(column.values()) for column in report['periods']] == [
+        ('2024-Q1', '2024-01-15', '2024-03-31'), ('2024-Q2', '2024-04-01', '2024-04-30'),
+    ]
+    accounts = {row['code']: row for row in report['accounts']}
+    assert sorted(accounts) == ['1000', '1100', '4000', '5000']  # accounts without activity are left out
+    cash = accounts['1000']
+    assert (cash['debits'], cash['credits']) == ([250, 1000], [50, 0])
+    assert _line(cash) == ([200, 1000], 1200, [None, 800], [None, 400.0])
+    assert _line(accounts['4000'])[0] == [-290, -1000]
+    assert report['totals']['debits']['amounts'] == report['totals']['credits']['amounts'] == [340, 1000]
+    assert _line(report['totals']['difference']) == ([0, 0], 0, [None, 0], [None, None])
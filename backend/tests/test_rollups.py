@@ -0,0 +1,63 @@
+import models
+from conftest import ADMIN, BANK, CASH, LOAN, RENT, SALES
+
+def _post_mixed_ledger():
+    """Postings through every write path: single, compound and batch"""
+    models.create_transaction('2024-01-05', 'S1', 'Sale', CASH, SALES, 100, ADMIN)
+    models.create_transaction('2024-01-31', 'R1', 'Rent', RENT, BANK, 40, ADMIN)
+    models.create_transaction('2024-02-01', 'S2', 'Draft sale', BANK, SALES, 7.5, ADMIN, status='draft')
+    models.create_compound_transaction('2024-02-14', 'L1', 'Loan split', [
+        {'account_id': CASH, 'debit': 300},
+        {'account_id': BANK, 'debit': 200},
+        {'account_id': LOAN, 'credit': 500},
+    ], ADMIN)
+    models.create_transactions_batch([
+        {'date': '2024-03-01', 'reference': 'B1', 'description': 'Sale', 'debit_account': BANK,
+         'credit_account': SALES, 'amount': 60},
+        {'date': '2024-03-31', 'reference': 'B2', 'description': 'Repay', 'entries': [
+            {'account_id': LOAN, 'debit': 50}, {'account_id': CASH, 'credit': 50},
+        ]},
+    ], ADMIN)
+
+def _rows(db, query):
+    return [tuple(row) for row in db.execute(query)]
+
+def test_account_activity_matches_a_rebuild(db):
+    _post_mixed_ledger()
+    query = """
+        SELECT account_id, transaction_count, ROUND(total_debits, 2), ROUND(total_credits, 2), last_activity_date
+        FROM account_activity ORDER BY account_id
+    """
+    maintained = _rows(db, query)
+    models.rebuild_account_activity()
+    assert maintained == _rows(db, query)
+    assert maintained[0] == (CASH, 3, 400.0, 50.0, '2024-03-31')
+
+    account = models.get_account(CASH)
+    assert account['transaction_count'] == 3
+    assert account['current_balance'] == 350.0
+
+def test_account_period_totals_match_a_rebuild(db):
+    _post_mixed_ledger()
+    query = """
+        SELECT account_id, period, ROUND(debits, 2), ROUND(credits, 2)
+        FROM account_period_totals ORDER BY account_id, period
+    """
+    maintained = _rows(db, query)
+    models.rebuild_period_totals()
+    assert maintained == _rows(db, query)
+
+def test_period_totals_from_rollups_match_a_scan(db):
+    _post_mixed_ledger()
+    ranges = [
+        ('2024-01-01', '2024-03-31'),  # whole months only
+        ('2024-01-05', '2024-03-01'),  # partial months at both ends
+        ('2024-01-31', '2024-02-14'),
+        ('2024-02-02', '2024-02-27'),  # inside one month
+        ('2023-12-15', '2024-04-15'),
+    ]
+    for start_date, end_date in ranges:
+        scanned = models._account_totals("BETWEEN ? AND ?", (start_date, end_date))
+        assert models._account_period_totals(start_date, end_date) == scanned, (start_date, end_date)
+    for date in ('2024-01-01', '2024-02-14', '2024-03-31', '2024-05-01'):
+        assert models._account_totals_before(date) == models._account_totals("< ?", (date,)), date
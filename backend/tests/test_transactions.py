@@ -0,0 +1,177 @@
+import sqlite3
+import threading
+import time
+import pytest
+import models
+from conftest import ADMIN, BANK, CASH, LOAN, RENT, SALES
+
+def _single(reference, debit=CASH, credit=SALES, amount=10, **extra):
+    return {'date': '2024-01-05', 'reference': reference, 'description': 'Posting',
+            'debit_account': debit, 'credit_account': credit, 'amount': amount, **extra}
+
+def _compound(reference, amount=30):
+    return {'date': '2024-01-06', 'reference': reference, 'description': 'Split', 'entries': [
+        {'account_id': CASH, 'debit': amount}, {'account_id': LOAN, 'credit': amount},
+    ]}
+
+BATCH = [
+    _single('T0'),
+    _single('T1', debit=CASH, credit=CASH),
+    _compound('C2'),
+    _single('T3', amount=-5),
+    _single('T4', debit=RENT, credit=BANK, amount=4.5, status='draft'),
+    {'date': '2024-13-01', 'reference': 'T5'},
+]
+ERRORS = [
+    {'index': 1, 'error': 'Debit and credit accounts cannot be the same'},
+    {'index': 3, 'error': 'Invalid amount'},
+    {'index': 5, 'error': 'Invalid date, expected YYYY-MM-DD'},
+]
+
+def _balances(db):
+    return dict(db.execute("SELECT id, balance FROM accounts"))
+
+def _references(db):
+    return dict(db.execute("SELECT id, reference FROM transactions"))
+
+def test_atomic_batch_with_an_invalid_item_writes_nothing(db):
+    before = _balances(db)
+    result = models.create_transactions_batch(BATCH, ADMIN)
+    assert result == {'ids': [None] * 6, 'errors': ERRORS}
+    assert _references(db) == {}
+    assert _balances(db) == before
+
+def test_partial_batch_writes_the_valid_items(db):
+    result = models.create_transactions_batch(BATCH, ADMIN, mode='partial')
+    assert result['errors'] == ERRORS
+    ids = result['ids']
+    assert [ids[1], ids[3], ids[5]] == [None] * 3
+    references = _references(db)
+    assert {references[ids[index]] for index in (0, 2, 4)} == {'T0', 'C2', 'T4'}
+    entries = db.execute("SELECT account_id, debit, credit FROM transaction_entries WHERE transaction_id = ?", (ids[2],))
+    assert [tuple(row) for row in entries] == [(CASH, 30, 0), (LOAN, 0, 30)]
+    # Drafts are recorded but do not move balances
+    balances = _balances(db)
+    assert (balances[CASH], balances[SALES], balances[LOAN], balances[RENT]) == (40, -10, -30, 0)
+
+def test_invalid_mode_is_rejected(db):
+    with pytest.raises(ValueError, match="Invalid mode"):
+        models.create_transactions_batch(BATCH, ADMIN, mode='some')
+
+def test_batch_ids_stay_consecutive_beside_a_concurrent_writer(db, db_path):
+    stop = threading.Event()
+
+    def other_writer():
+        # Another process's connection inserting straight into the ledger
+        conn = sqlite3.connect(db_path, timeout=10)
+        n = 0
+        while not stop.is_set():
+            conn.execute(
+                "INSERT INTO transactions (date, reference, description, debit_account, credit_account, amount)"
+                " VALUES ('2024-02-01', ?, 'Other', ?, ?, 1)", (f'X{n}', BANK, SALES)
+            )
+            conn.commit()
+            n += 1
+            time.sleep(0.001)
+        conn.close()
+    thread = threading.Thread(target=other_writer)
+    thread.start()
+    try:
+        results = [
+            models.create_transactions_batch([_single(f'B{batch}-{n}') for n in range(50)], ADMIN)
+            for batch in range(10)
+        ]
+    finally:
+        stop.set()
+        thread.join()
+
+    references = _references(db)
+    assert any(reference.startswith('X') for reference in references.values())
+    for batch, result in enumerate(results):
+        ids = result['ids']
+        assert ids == list(range(ids[0], ids[0] + 50))
+        assert [references[transaction_id] for transaction_id in ids] == [f'B{batch}-{n}' for n in range(50)]
+
+def test_batch_fails_whole_when_ids_are_not_consecutive(db):
+    models.create_transactions_batch([_single('T0'), _single('T1')], ADMIN)
+    db.execute("UPDATE sqlite_sequence SET seq = 0 WHERE name = 'transactions'")
+    db.commit()
+    with pytest.raises(ValueError, match="not allocated consecutively"):
+        models.create_transactions_batch([_single('T2'), _compound('C3')], ADMIN)
+    assert sorted(_references(db).values()) == ['T0', 'T1']
+    assert _balances(db)[CASH] == 20
+
+def test_batch_route_status_and_payload(client):
+    response = client.post('/api/transactions/batch', json={'transactions': BATCH})
+    assert response.status_code == 400
+    body = response.get_json()
+    assert (body['success'], body['mode'], body['created'], body['errors']) == (False, 'atomic', 0, ERRORS)
+
+    response = client.post('/api/transactions/batch?mode=partial', json=BATCH)  # bare array
+    assert response.status_code == 207
+    body = response.get_json()
+    assert (body['mode'], body['created'], body['errors']) == ('partial', 3, ERRORS)
+
+    response = client.post('/api/transactions/batch', json={'transactions': [_single('T9'), _compound('C10')]})
+    assert response.status_code == 201
+    body = response.get_json()
+    assert (body['success'], body['created'], body['errors']) == (True, 2, [])
+
+    assert client.post('/api/transactions/batch', json={'transactions': []}).status_code == 400
+
+def _found(text, **filters):
+    return [row['reference'] for row in models.search_transactions(text, limit=100, **filters)]
+
+def _fts_integrity(db):
+    # Compares the external-content index against the transactions table
+    db.execute("INSERT INTO transactions_fts (transactions_fts, rank) VALUES ('integrity-check', 1)")
+
+def test_search_index_follows_inserts_updates_and_deletes(db):
+    models.create_transaction('2024-01-05', 'INV-100', 'Office rent January', RENT, BANK, 900, ADMIN)
+    models.create_transactions_batch([_single('CARD-7', debit=BANK, amount=5), _compound('LOAN-1')], ADMIN)
+    assert _found('rent') == ['INV-100']
+    assert _found('ren') == ['INV-100']  # prefix match
+    assert _found('card') == ['CARD-7'] and _found('split') == ['LOAN-1']
+
+    db.execute("UPDATE transactions SET description = 'Office lease January' WHERE reference = 'INV-100'")
+    db.execute("UPDATE transactions SET reference = 'CARD-8' WHERE reference = 'CARD-7'")
+    db.commit()
+    assert _found('rent') == [] and _found('lease') == ['INV-100']
+    assert _found('card') == ['CARD-8']
+    _fts_integrity(db)
+
+    db.execute("DELETE FROM transactions WHERE reference = 'INV-100'")
+    db.commit()
+    assert _found('lease') == []
+    _fts_integrity(db)
+
+def test_search_results_and_filters(db):
+    models.create_transaction('2024-01-05', 'R1', 'Office rent January', RENT, BANK, 900, ADMIN)
+    models.create_transaction('2024-02-05', 'R2', 'Office rent February', RENT, CASH, 900, ADMIN)
+    models.create_transaction('2024-02-06', 'rent-adj', 'Adjustment', RENT, CASH, 10, ADMIN)
+    # Description matches outrank reference matches
+    assert _found('rent')[-1] == 'rent-adj'
+    assert _found('rent', account_id=BANK) == ['R1']
+    assert sorted(_found('rent', start_date='2024-02-01', end_date='2024-02-05')) == ['R2']
+    row = models.search_transactions('janu')[0]
+    assert row['snippet'] == 'Office rent <mark>January</mark>'
+
+def test_search_pages_cover_every_match_once(db):
+    # Identical descriptions rank equally, so pages depend on the id tie-break
+    models.create_transactions_batch([_single(f'S{n}', amount=n + 1) for n in range(23)], ADMIN)
+    everything = _found('posting')
+    pages = [
+        [row['reference'] for row in models.search_transactions('posting', limit=5, offset=offset)]
+        for offset in range(0, 25, 5)
+    ]
+    assert [len(page) for page in pages] == [5, 5, 5, 5, 3]
+    assert [reference for page in pages for reference in page] == everything
+    assert sorted(everything) == sorted(f'S{n}' for n in range(23))
+
+def test_search_route(client):
+    models.create_transactions_batch([_single(f'S{n}') for n in range(3)], ADMIN)
+    response = client.get('/api/transactions/search?q=post&limit=2&offset=1')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['success'] and [row['reference'] for row in body['data']] == ['S1', 'S2']
+    assert client.get('/api/transactions/search?q=').status_code == 400
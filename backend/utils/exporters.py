@@ -0,0 +1,176 @@
+import csv
+import io
+import json
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+# Rows rendered into one chunk before it is handed to the server
+EXPORT_CHUNK_ROWS = 500
+
+# format: (mimetype, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+def _batches(rows, size=EXPORT_CHUNK_ROWS):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        return f"{value:.2f}"  # every float in a report is an amount
+    return value
+
+def iter_csv(columns, rows):
+    """CSV text with a header row, one chunk per EXPORT_CHUNK_ROWS rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for batch in _batches(rows):
+        for row in batch:
+            writer.writerow([_csv_value(row.get(column)) for column in columns])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()  # header only, for an empty export
+
+def iter_ndjson(columns, rows):
+    """One JSON object per line, keys in column order"""
+    for batch in _batches(rows):
+        yield ''.join(
+            json.dumps({column: row.get(column) for column in columns}, default=str, separators=(',', ':')) + '\n'
+            for row in batch
+        )
+
+# Characters XML 1.0 does not allow, even escaped
+_XML_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+_XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+def _xlsx_cell(value):
+    if value is None:
+        return '<c/>'
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c><v>{value!r}</v></c>'
+    text = escape(_XML_INVALID.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+def _xlsx_row(values):
+    return '<row>' + ''.join(_xlsx_cell(value) for value in values) + '</row>'
+
+class _ChunkSink:
+    """Write-only file object that collects what the zip writer produces"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def iter_xlsx(columns, rows, sheet_name='Report'):
+    """
+    A single-sheet XLSX workbook, produced as it is written
+
+    Cells use inline strings rather than the shared string table, so nothing
+    has to be held back until the end; the zip is written to a non-seekable
+    sink, which makes zipfile use data descriptors instead of seeking back.
+    Excel opens at most 1,048,576 rows of a sheet.
+    """
+    sink = _ChunkSink()
+    archive = zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED)
+    for name, content in _XLSX_PARTS.items():
+        archive.writestr(name, content)
+    archive.writestr('xl/workbook.xml', _WORKBOOK.format(name=escape(sheet_name[:31], {'"': '&quot;'})))
+
+    with archive.open('xl/worksheets/sheet1.xml', 'w') as sheet:
+        sheet.write((
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            + _xlsx_row(columns)
+        ).encode('utf-8'))
+        for batch in _batches(rows):
+            sheet.write(''.join(
+                _xlsx_row([row.get(column) for column in columns]) for row in batch
+            ).encode('utf-8'))
+            data = sink.drain()
+            if data:
+                yield data
+        sheet.write(b'</sheetData></worksheet>')
+    archive.close()
+    yield sink.drain()
+
+RENDERERS = {
+    'csv': iter_csv,
+    'ndjson': iter_ndjson,
+    'xlsx': iter_xlsx,
+}
+
+def render_rows(columns, rows, format, sheet_name='Report'):
+    """
+    Render dict rows in an export format, lazily
+
+    Returns a generator of chunks (str for csv and ndjson, bytes for xlsx);
+    rows are consumed EXPORT_CHUNK_ROWS at a time as the chunks are pulled.
+    """
+    if format not in RENDERERS:
+        raise ValueError(f"Invalid format. Must be one of {['json', *RENDERERS]}")
+    if format == 'xlsx':
+        return iter_xlsx(columns, rows, sheet_name)
+    return RENDERERS[format](columns, rows)
@@ -0,0 +1,81 @@
+import json
+from itertools import chain
+from flask import Response, stream_with_context
+from utils.exporters import EXPORT_FORMATS, render_rows
+
+# Rows serialized into one chunk before it is handed to the server
+STREAM_CHUNK_ROWS = 200
+
+def _dumps(value):
+    return json.dumps(value, default=str, separators=(',', ':'))
+
+def iter_json_array(rows, envelope=None, key='data', count_key='count'):
+    """
+    Serialize rows as JSON piece by piece
+
+    With key=None a bare array is produced; otherwise the array is wrapped
+    as {**envelope, key: [...], count_key: n}. Only STREAM_CHUNK_ROWS rows
+    are buffered at a time, and the count is written after the array since
+    it is only known once the rows are exhausted.
+    """
+    if key is None:
+        yield '['
+    else:
+        head = _dumps(envelope or {})[:-1]
+        yield f'{head}{"," if len(head) > 1 else ""}{_dumps(key)}:['
+
+    count = 0
+    buffer = []
+    for row in rows:
+        buffer.append(_dumps(row))
+        if len(buffer) >= STREAM_CHUNK_ROWS:
+            yield (',' if count else '') + ','.join(buffer)
+            count += len(buffer)
+            buffer = []
+    if buffer:
+        yield (',' if count else '') + ','.join(buffer)
+        count += len(buffer)
+
+    if key is None:
+        yield ']'
+    elif count_key:
+        yield f'],{_dumps(count_key)}:{count}}}'
+    else:
+        yield ']}'
+
+def stream_json_response(rows, envelope=None, key='data', count_key='count', status=200):
+    """Return a chunked JSON response wrapping a row iterator (see iter_json_array)"""
+    # Pull the first row now so query errors surface before the response starts
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is not None:
+        rows = chain((first,), rows)
+    return Response(
+        stream_with_context(iter_json_array(rows, envelope, key, count_key)),
+        status=status,
+        mimetype='application/json'
+    )
+
+def stream_export_response(chunks, format, filename):
+    """
+    Return a chunked download of export chunks (see utils.exporters)
+
+    filename is given without an extension; the format adds it.
+    """
+    mimetype, extension = EXPORT_FORMATS[format]
+    # As with JSON, produce the first chunk now so errors surface as a normal response
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is not None:
+        chunks = chain((first,), chunks)
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}.{extension}"'
+    return response
+
+def stream_export_rows(rows, columns, format, filename):
+    """Render dict rows with the given columns and return them as a chunked download"""
+    return stream_export_response(
+        render_rows(columns, rows, format, sheet_name=filename),
+        format,
+        filename
+    )